@@ -0,0 +1,77 @@
+"""レスポンスJSONエンコードのマイクロベンチマーク
+
+従来の json.dumps(..., cls=DecimalEncoder) と encode_json を比較する。
+
+    python benchmarks/bench_json_encoding.py [件数 ...]
+"""
+
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared"))
+
+from models import encode_json, orjson  # noqa: E402
+
+DEFAULT_SIZES = (5, 100, 1000, 10000)
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """従来の実装: DynamoDBのDecimal型をJSONシリアライズ可能にするエンコーダー"""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj) if obj % 1 == 0 else float(obj)
+        return super().default(obj)
+
+
+def make_body(count: int, decimals: bool) -> dict:
+    """GET /weather 相当のレスポンスボディを生成"""
+    number = Decimal if decimals else int
+    data = [
+        {
+            "CityId": number(city_id),
+            "CityName": f"都市{city_id}",
+            "WeatherId": number(city_id % 3 + 1),
+            "WeatherName": ("晴れ", "くもり", "雨")[city_id % 3],
+            "RainfallProbability": number(city_id % 101),
+            "timestamp": "2024-01-01T12:00:00",
+            "ttl": number(1704153600),
+        }
+        for city_id in range(count)
+    ]
+    return {"success": True, "data": data, "count": count}
+
+
+def legacy_encode(body: dict) -> str:
+    return json.dumps(body, ensure_ascii=False, cls=DecimalEncoder)
+
+
+def bench(func, body: dict) -> float:
+    """1回あたりの平均時間（マイクロ秒）"""
+    timer = timeit.Timer(lambda: func(body))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def main(sizes) -> None:
+    backend = "orjson" if orjson is not None else "json"
+    print(f"backend: {backend}")
+    print(f"{'rows':>7} {'decimals':>8} {'legacy(us)':>12} {'fast(us)':>12} {'speedup':>8}")
+    for count in sizes:
+        for decimals in (False, True):
+            body = make_body(count, decimals)
+            assert json.loads(legacy_encode(body)) == json.loads(encode_json(body))
+            legacy = bench(legacy_encode, body)
+            fast = bench(encode_json, body)
+            print(
+                f"{count:>7} {str(decimals):>8} {legacy:>12.1f} {fast:>12.1f} "
+                f"{legacy / fast:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
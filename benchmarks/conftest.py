@@ -0,0 +1,158 @@
+"""ベンチマーク設定とフィクスチャ
+
+計測結果は baseline.json と比較し、許容範囲を超えて遅くなった場合に失敗させる。
+マシンの速さの違いを打ち消すため、同じ実行の中で固定の較正ループを計測し、
+その時間に対する比（較正ループ何回分か）で記録・比較する。
+ベースラインに登録されていない計測は比較できないため、警告（BenchBaselineMissing）を出す。
+
+    make bench                      # ベースラインと比較
+    make bench-baseline             # ベースラインを更新
+    BENCH_FULL=1 make bench         # 100万行のCSVも計測
+
+環境変数:
+    BENCH_TOLERANCE         許容する劣化率（既定 0.5 = 50%）
+    BENCH_UPDATE_BASELINE   1 の場合は比較せずにベースラインを書き換える
+    BENCH_FULL              1 の場合は大きなデータサイズも計測する
+"""
+
+import json
+import os
+import statistics
+import time
+import warnings
+from contextlib import contextmanager
+
+import pytest
+
+# tests/ のフィクスチャ（moto のテーブル、Lambdaコンテキストなど）を再利用
+pytest_plugins = ['tests.conftest']
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+BENCH_TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', '0.5'))
+BENCH_UPDATE_BASELINE = os.environ.get('BENCH_UPDATE_BASELINE') == '1'
+BENCH_FULL = os.environ.get('BENCH_FULL') == '1'
+
+# 較正ループの反復回数と、ベンチマークごとに追加で計測する回数
+CALIBRATION_ITERATIONS = 20_000
+CALIBRATION_ROUNDS = 5
+
+_results: dict[str, float] = {}
+_calibration_samples: list[float] = []
+
+
+def _load_baseline() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _calibration_loop() -> int:
+    """較正用の固定処理（辞書・文字列・整数演算を含むインタプリタ中心の処理）"""
+    values: dict[int, str] = {}
+    total = 0
+    for i in range(CALIBRATION_ITERATIONS):
+        values[i % 1000] = str(i)
+        total += len(values[i % 1000]) * (i & 7)
+    return total
+
+
+def calibrate() -> float:
+    """較正ループ1回の所要時間（秒）
+
+    ベンチマークごとに計測を追加し、実行全体の中央値を返す（一時的な揺れに左右されない）。
+    """
+    for _ in range(CALIBRATION_ROUNDS):
+        start = time.perf_counter()
+        _calibration_loop()
+        _calibration_samples.append(time.perf_counter() - start)
+    return statistics.median(_calibration_samples)
+
+
+class BenchBaselineMissing(UserWarning):
+    """baseline.json に計測名が登録されていない（劣化を検出できない）"""
+
+
+class Bench:
+    """関数を繰り返し実行して中央値を計測し、較正ループに対する比をベースラインと比較する"""
+
+    def __init__(self, baseline: dict):
+        self.baseline = baseline
+
+    def __call__(self, name: str, func, rounds: int = 5, warmup: int = 1, setup=None) -> float:
+        for _ in range(warmup):
+            if setup:
+                setup()
+            func()
+
+        samples = []
+        for _ in range(rounds):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+
+        median = statistics.median(samples)
+        calibration = calibrate()
+        ratio = median / calibration
+        _results[name] = ratio
+        print(
+            f'\n[bench] {name}: {median * 1000:.3f} ms (median of {rounds}), '
+            f'{ratio:.2f}x calibration ({calibration * 1000:.3f} ms)'
+        )
+
+        expected = self.baseline.get(name)
+        if BENCH_UPDATE_BASELINE:
+            return median
+        if expected is None:
+            # 比較できないまま通さないよう、ベースライン未登録を警告として残す
+            warnings.warn(
+                f'{name} has no baseline in {os.path.basename(BASELINE_PATH)}; '
+                'run with BENCH_UPDATE_BASELINE=1 to record it',
+                BenchBaselineMissing,
+                stacklevel=2,
+            )
+        else:
+            limit = expected * (1 + BENCH_TOLERANCE)
+            assert ratio <= limit, (
+                f'{name} regressed: {ratio:.2f}x > {limit:.2f}x calibration '
+                f'(baseline {expected:.2f}x, {median * 1000:.3f} ms)'
+            )
+        return median
+
+
+@pytest.fixture(scope='session')
+def bench():
+    """ベンチマーク計測フィクスチャ"""
+    return Bench(_load_baseline())
+
+
+@pytest.fixture
+def city_master():
+    """都市マスターを一時的に差し替えるコンテキストマネージャー"""
+    from city_registry import City
+    from models import CITIES
+
+    original = CITIES.cities()
+
+    @contextmanager
+    def replace(count: int):
+        CITIES.replace(City(city_id, f'都市{city_id}') for city_id in range(1, count + 1))
+        try:
+            yield CITIES
+        finally:
+            CITIES.replace(original)
+
+    return replace
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """BENCH_UPDATE_BASELINE=1 の場合は計測結果をベースラインに保存"""
+    if not BENCH_UPDATE_BASELINE or not _results:
+        return
+    baseline = _load_baseline()
+    baseline.update({name: float(f'{value:.4g}') for name, value in _results.items()})
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2, ensure_ascii=False)
+        f.write('\n')
@@ -0,0 +1,93 @@
+"""合成天気データの一括生成ツール（負荷試験・耐久試験用のテーブルやCSVの準備）
+
+都市×時刻の観測値を weather_generator でバッチ単位に生成し、DynamoDB へ BatchWriteItem で
+書き込むか、csv_ingest の形式のCSVファイルに書き出す。
+
+    python benchmarks/datagen.py --cities 1000 --hours 168 --seed 1 --csv build/synthetic
+    python benchmarks/datagen.py --hours 24 --table     # TABLE_NAME のテーブルに書き込む
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared"))
+
+DEFAULT_HOURS = 24
+DEFAULT_TTL_HOURS = 24
+
+
+def build_cities(count: Optional[int] = None) -> dict:
+    """生成対象の都市（count 指定時は都市ID 1..count。未登録の都市は仮の名前にする）"""
+    from models import CITIES
+
+    if not count:
+        return dict(CITIES.items())
+    return {city_id: CITIES.get(city_id, f"都市{city_id}") for city_id in range(1, count + 1)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="合成天気データの一括生成")
+    parser.add_argument("--cities", type=int, default=None, help="都市数（省略時は都市マスター）")
+    parser.add_argument("--hours", type=int, default=DEFAULT_HOURS, help="生成する時刻数")
+    parser.add_argument("--interval-minutes", type=int, default=60, help="時刻の間隔（分）")
+    parser.add_argument("--start", default=None, help="最初の時刻（ISO 8601。省略時は現在から遡る）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数シード")
+    parser.add_argument("--batch-rows", type=int, default=None, help="1バッチの最大行数")
+    parser.add_argument("--ttl-hours", type=int, default=DEFAULT_TTL_HOURS, help="ttl（現在からの時間）")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--csv", metavar="DIR", help="CSVファイルの出力先ディレクトリ")
+    output.add_argument("--table", action="store_true", help="TABLE_NAME のテーブルに書き込む")
+    parser.add_argument("--rows-per-file", type=int, default=None, help="CSV1ファイルあたりの行数")
+    parser.add_argument("--no-aggregates", action="store_true", help="集計項目を更新しない")
+    args = parser.parse_args(argv)
+
+    from weather_generator import (
+        DEFAULT_BATCH_ROWS,
+        DEFAULT_CSV_ROWS_PER_FILE,
+        WeatherGenerator,
+        write_batches,
+        write_csv_files,
+    )
+
+    interval = timedelta(minutes=args.interval_minutes)
+    now = datetime.utcnow()
+    start = datetime.fromisoformat(args.start) if args.start else now - interval * args.hours
+    cities = build_cities(args.cities)
+    batches = WeatherGenerator(seed=args.seed).iter_batches(
+        cities,
+        start,
+        args.hours,
+        interval=interval,
+        ttl=int((now + timedelta(hours=args.ttl_hours)).timestamp()),
+        batch_rows=args.batch_rows or DEFAULT_BATCH_ROWS,
+    )
+
+    began = time.perf_counter()
+    if args.csv:
+        paths = write_csv_files(
+            batches, args.csv, rows_per_file=args.rows_per_file or DEFAULT_CSV_ROWS_PER_FILE
+        )
+        result = {"files": len(paths), "rows": len(cities) * args.hours, "errors": 0}
+    else:
+        from database import WeatherDatabase
+
+        success, errors = write_batches(
+            batches, WeatherDatabase(), update_aggregates=not args.no_aggregates
+        )
+        result = {"rows": success, "errors": errors}
+    elapsed = time.perf_counter() - began
+
+    result["elapsed_seconds"] = round(elapsed, 3)
+    result["rows_per_second"] = round(result["rows"] / elapsed, 1) if elapsed else 0.0
+    print(json.dumps(result, ensure_ascii=False))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
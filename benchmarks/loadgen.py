@@ -0,0 +1,460 @@
+"""合成 API Gateway イベントを再生するプロセス内負荷生成ツール
+
+weather_handler.lambda_handler に REST API / HTTP API 形式のイベント（Cognito クレーム付き）を
+指定した並列度で投入し、ルート別のスループット、レイテンシ（p50/p95/p99）、エラー率を集計する。
+DynamoDB は moto（既定）か、AWS_ENDPOINT_URL_DYNAMODB で指定したローカルの代替環境を使う。
+
+    python benchmarks/loadgen.py --requests 2000 --concurrency 8
+    python benchmarks/loadgen.py --mode process --concurrency 4 --api http
+    python benchmarks/loadgen.py --cache-ttl 0 --read-concurrency 4 --json
+    python benchmarks/loadgen.py --backend local     # テーブルは作成済みであること
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared"))
+
+# 負荷試験時の既定値（既に設定されている環境変数は上書きしない）
+LOADGEN_DEFAULT_ENV = {
+    "TABLE_NAME": "loadtest-weather-table",
+    "AWS_DEFAULT_REGION": "ap-northeast-1",
+    "COGNITO_USER_POOL_ID": "ap-northeast-1_LoadTest",
+    "COGNITO_CLIENT_ID": "loadtest-client-id",
+    "METRICS_ENABLED": "false",
+}
+for _name, _value in LOADGEN_DEFAULT_ENV.items():
+    os.environ.setdefault(_name, _value)
+
+# 負荷の構成（ルート名, メソッド, リソースパス, 認証要否, 重み）
+ROUTE_MIX = [
+    ("get_weather", "GET", "/weather", True, 40),
+    ("get_weather_by_city", "GET", "/weather/{city_id}", True, 25),
+    ("statistics", "GET", "/weather/statistics", True, 10),
+    ("forecast", "GET", "/weather/forecast", True, 10),
+    ("types", "GET", "/weather/types", False, 5),
+    ("options", "OPTIONS", "/weather", False, 5),
+    ("health", "GET", "/health", False, 3),
+    ("generate", "POST", "/weather/generate", False, 1),
+    ("not_found", "GET", "/weather/unknown/path", False, 1),
+]
+
+DEFAULT_REQUESTS = 1000
+DEFAULT_CONCURRENCY = 8
+DEFAULT_USERS = 50
+PERCENTILES = (50, 95, 99)
+
+
+def make_claims(user_index: int) -> dict:
+    """Cognito ユーザープールの ID トークン相当のクレーム"""
+    pool_id = os.environ["COGNITO_USER_POOL_ID"]
+    region = pool_id.split("_", 1)[0]
+    return {
+        "sub": f"00000000-0000-4000-8000-{user_index:012d}",
+        "email": f"loadtest-user-{user_index}@example.com",
+        "email_verified": "true",
+        "cognito:username": f"loadtest-user-{user_index}",
+        "token_use": "id",
+        "aud": os.environ["COGNITO_CLIENT_ID"],
+        "iss": f"https://cognito-idp.{region}.amazonaws.com/{pool_id}",
+    }
+
+
+def _headers(claims: Optional[dict]) -> dict:
+    headers = {
+        "accept": "application/json",
+        "accept-encoding": "gzip, deflate, br",
+        "host": "api.example.com",
+        "origin": "https://app.example.com",
+        "user-agent": "weather-loadgen/1.0",
+    }
+    if claims:
+        headers["authorization"] = "Bearer loadtest-token"
+    return headers
+
+
+def build_rest_event(
+    method: str,
+    path: str,
+    resource: Optional[str] = None,
+    claims: Optional[dict] = None,
+    path_parameters: Optional[dict] = None,
+    stage: str = "dev",
+) -> dict:
+    """REST API（Lambda プロキシ統合）のイベント"""
+    headers = _headers(claims)
+    request_context = {
+        "resourcePath": resource or path,
+        "httpMethod": method,
+        "path": f"/{stage}{path}",
+        "stage": stage,
+        "requestId": str(uuid.uuid4()),
+        "requestTimeEpoch": int(time.time() * 1000),
+        "protocol": "HTTP/1.1",
+        "identity": {"sourceIp": "203.0.113.10", "userAgent": headers["user-agent"]},
+    }
+    if claims:
+        request_context["authorizer"] = {"claims": claims}
+
+    return {
+        "resource": resource or path,
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {name: [value] for name, value in headers.items()},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": path_parameters,
+        "stageVariables": None,
+        "requestContext": request_context,
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def build_http_event(
+    method: str,
+    path: str,
+    resource: Optional[str] = None,
+    claims: Optional[dict] = None,
+    path_parameters: Optional[dict] = None,
+) -> dict:
+    """HTTP API（ペイロード形式 2.0）のイベント"""
+    headers = _headers(claims)
+    route_key = f"{method} {resource or path}"
+    request_context = {
+        "routeKey": route_key,
+        "stage": "$default",
+        "requestId": str(uuid.uuid4()),
+        "timeEpoch": int(time.time() * 1000),
+        "http": {
+            "method": method,
+            "path": path,
+            "protocol": "HTTP/1.1",
+            "sourceIp": "203.0.113.10",
+            "userAgent": headers["user-agent"],
+        },
+    }
+    if claims:
+        request_context["authorizer"] = {"jwt": {"claims": claims, "scopes": None}}
+
+    event = {
+        "version": "2.0",
+        "routeKey": route_key,
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": headers,
+        "requestContext": request_context,
+        "isBase64Encoded": False,
+    }
+    if path_parameters:
+        event["pathParameters"] = path_parameters
+    return event
+
+
+def generate_events(
+    count: int,
+    api: str = "rest",
+    seed: Optional[int] = None,
+    city_ids: Optional[list] = None,
+    users: int = DEFAULT_USERS,
+    mix: Optional[list] = None,
+) -> list[tuple[str, dict]]:
+    """重み付きでルートを選び (ルート名, イベント) のリストを生成"""
+    from models import CITIES
+
+    rng = random.Random(seed)
+    mix = mix or ROUTE_MIX
+    city_ids = city_ids or list(CITIES)
+    build = build_http_event if api == "http" else build_rest_event
+
+    chosen = rng.choices(mix, weights=[entry[4] for entry in mix], k=count)
+    events = []
+    for name, method, resource, auth, _weight in chosen:
+        path, path_parameters = resource, None
+        if "{city_id}" in resource:
+            city_id = str(rng.choice(city_ids))
+            path = resource.replace("{city_id}", city_id)
+            path_parameters = {"city_id": city_id}
+        claims = make_claims(rng.randrange(users)) if auth else None
+        events.append(
+            (
+                name,
+                build(method, path, resource=resource, claims=claims, path_parameters=path_parameters),
+            )
+        )
+    return events
+
+
+class _LoadContext:
+    """Lambda コンテキストの代替"""
+
+    function_name = "loadgen"
+    memory_limit_in_mb = 128
+    invoked_function_arn = "arn:aws:lambda:ap-northeast-1:000000000000:function:loadgen"
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+@dataclass
+class RouteStats:
+    """1ルート分の計測値"""
+
+    latencies_ms: list = field(default_factory=list)
+    client_errors: int = 0
+    server_errors: int = 0
+
+    def record(self, status: int, latency_ms: float) -> None:
+        self.latencies_ms.append(latency_ms)
+        if status >= 500:
+            self.server_errors += 1
+        elif status >= 400:
+            self.client_errors += 1
+
+    def merge(self, other: "RouteStats") -> None:
+        self.latencies_ms.extend(other.latencies_ms)
+        self.client_errors += other.client_errors
+        self.server_errors += other.server_errors
+
+    def summary(self, elapsed_seconds: float) -> dict:
+        count = len(self.latencies_ms)
+        ordered = sorted(self.latencies_ms)
+        result = {
+            "requests": count,
+            "throughput_rps": round(count / elapsed_seconds, 1) if elapsed_seconds else 0.0,
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent}_ms"] = round(_percentile(ordered, percent), 3)
+        result["max_ms"] = round(ordered[-1], 3) if ordered else 0.0
+        result["client_error_rate"] = round(self.client_errors / count, 4) if count else 0.0
+        result["error_rate"] = round(self.server_errors / count, 4) if count else 0.0
+        return result
+
+
+@dataclass
+class LoadReport:
+    """負荷試験の結果"""
+
+    mode: str
+    api: str
+    concurrency: int
+    elapsed_seconds: float = 0.0
+    routes: dict = field(default_factory=dict)
+
+    def record(self, route: str, status: int, latency_ms: float) -> None:
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats()
+        stats.record(status, latency_ms)
+
+    def total(self) -> RouteStats:
+        combined = RouteStats()
+        for stats in self.routes.values():
+            combined.merge(stats)
+        return combined
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode,
+            "api": self.api,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "routes": {
+                route: stats.summary(self.elapsed_seconds)
+                for route, stats in sorted(self.routes.items())
+            },
+            "total": self.total().summary(self.elapsed_seconds),
+        }
+
+    def format_table(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"mode={self.mode} api={self.api} concurrency={self.concurrency} "
+            f"elapsed={summary['elapsed_seconds']}s",
+            f"{'route':<22} {'reqs':>6} {'rps':>8} {'p50(ms)':>9} {'p95(ms)':>9} "
+            f"{'p99(ms)':>9} {'4xx':>7} {'5xx':>7}",
+        ]
+        rows = list(summary["routes"].items()) + [("TOTAL", summary["total"])]
+        for route, row in rows:
+            lines.append(
+                f"{route:<22} {row['requests']:>6} {row['throughput_rps']:>8} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+                f"{row['client_error_rate']:>7.2%} {row['error_rate']:>7.2%}"
+            )
+        return "\n".join(lines)
+
+
+def _invoke(handler, route: str, event: dict) -> tuple[str, int, float]:
+    """1リクエストを処理して (ルート名, ステータス, 所要時間ms) を返す"""
+    start = time.perf_counter()
+    try:
+        status = handler(event, _LoadContext())["statusCode"]
+    except Exception:
+        status = 599
+    return route, status, (time.perf_counter() - start) * 1000
+
+
+def _create_table(table_name: str) -> None:
+    """moto 上にテーブルを作成"""
+    from aws_clients import get_resource
+
+    table = get_resource("dynamodb").create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "CityId", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "CityId", "AttributeType": "N"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.wait_until_exists()
+
+
+def start_backend(backend: str):
+    """バックエンドを準備してハンドラーを返す（moto の場合は戻り値のモックを stop で終了）"""
+    mock = None
+    if backend == "moto":
+        for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+            os.environ.setdefault(name, "testing")
+        from moto import mock_aws
+
+        import aws_clients
+
+        mock = mock_aws()
+        mock.start()
+        aws_clients.reset()
+        _create_table(os.environ["TABLE_NAME"])
+
+    import weather_handler
+
+    # 初回リクエストで生成が走らないよう、データを投入しておく
+    weather_handler.weather_service.generate_weather_data()
+    return weather_handler.lambda_handler, mock
+
+
+_worker_handler = None
+
+
+def _init_worker(backend: str) -> None:
+    """ワーカープロセスの初期化（環境変数は親プロセスから引き継ぐ）"""
+    global _worker_handler
+    _worker_handler, _ = start_backend(backend)
+
+
+def _run_chunk(events: list) -> tuple[float, float, list]:
+    """ワーカープロセスで events を順に処理"""
+    started = time.time()
+    samples = [_invoke(_worker_handler, route, event) for route, event in events]
+    return started, time.time(), samples
+
+
+def _ready_barrier(_index: int) -> bool:
+    """ワーカーの初期化完了を待つためのダミータスク"""
+    time.sleep(0.05)
+    return True
+
+
+def run_load(
+    events: list[tuple[str, dict]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    mode: str = "thread",
+    backend: str = "moto",
+    api: str = "rest",
+) -> LoadReport:
+    """イベントを指定の並列度で処理して結果を集計"""
+    report = LoadReport(mode=mode, api=api, concurrency=concurrency)
+
+    if mode == "process":
+        # moto はプロセス内のモックのため、ワーカーごとにテーブルを作成する
+        chunks = [events[index::concurrency] for index in range(concurrency)]
+        with ProcessPoolExecutor(
+            max_workers=concurrency,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend,),
+        ) as executor:
+            # 全ワーカーの初期化を済ませてから計測する
+            list(executor.map(_ready_barrier, range(concurrency)))
+            results = list(executor.map(_run_chunk, chunks))
+        report.elapsed_seconds = max(r[1] for r in results) - min(r[0] for r in results)
+        for _start, _end, samples in results:
+            for route, status, latency_ms in samples:
+                report.record(route, status, latency_ms)
+        return report
+
+    handler, mock = start_backend(backend)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            samples = list(
+                executor.map(lambda item: _invoke(handler, *item), events)
+            )
+            report.elapsed_seconds = time.perf_counter() - started
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    for route, status, latency_ms in samples:
+        report.record(route, status, latency_ms)
+    return report
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="weather_handler の負荷試験")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="総リクエスト数")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="並列度")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--api", choices=("rest", "http"), default="rest")
+    parser.add_argument("--backend", choices=("moto", "local"), default="moto")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="クレームを生成するユーザー数")
+    parser.add_argument("--seed", type=int, default=None, help="ルート選択の乱数シード")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="CACHE_TTL_SECONDS（0で無効）")
+    parser.add_argument("--read-concurrency", type=int, default=None, help="DB_READ_CONCURRENCY")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = parser.parse_args(argv)
+
+    if args.cache_ttl is not None:
+        os.environ["CACHE_TTL_SECONDS"] = str(args.cache_ttl)
+    if args.read_concurrency is not None:
+        os.environ["DB_READ_CONCURRENCY"] = str(args.read_concurrency)
+
+    events = generate_events(args.requests, api=args.api, seed=args.seed, users=args.users)
+    report = run_load(
+        events,
+        concurrency=args.concurrency,
+        mode=args.mode,
+        backend=args.backend,
+        api=args.api,
+    )
+
+    if args.json:
+        print(json.dumps(report.summary(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format_table())
+    return 1 if report.total().server_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""CSV取り込みのベンチマーク"""
+
+import csv
+import io
+
+import boto3
+import pytest
+
+import app as csv_ingest
+from benchmarks.conftest import BENCH_FULL
+
+TIMESTAMP = '2024-01-01T00:00:00'
+TTL = 1704067200
+
+PARSE_ROWS = [10_000, 100_000, 1_000_000]
+PROCESS_ROWS = [10_000] + ([100_000, 1_000_000] if BENCH_FULL else [])
+
+# 生成するCSVの都市数
+CSV_CITY_COUNT = 100
+
+
+def make_csv(rows: int) -> str:
+    """csv_ingest 形式のCSVを生成（1000行に1行は不正な行）"""
+    lines = []
+    for index in range(rows):
+        if index % 1000 == 999:
+            lines.append('invalid,row')
+        else:
+            city_id = index % CSV_CITY_COUNT + 1
+            lines.append(f'{city_id},都市{city_id},1,晴れ,{index % 101}')
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.mark.parametrize('rows', PARSE_ROWS)
+def test_parse_csv_row(bench, rows):
+    """parse_csv_row の行単位解析"""
+    parsed = list(csv.reader(io.StringIO(make_csv(rows))))
+
+    bench(
+        f'csv.parse_csv_row.{rows}',
+        lambda: [csv_ingest.parse_csv_row(row, TIMESTAMP, TTL) for row in parsed],
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize('rows', PARSE_ROWS)
+def test_parse_csv_block(bench, rows):
+    """parse_csv_block の列単位解析（DynamoDB項目への変換込み）"""
+    parsed = list(csv.reader(io.StringIO(make_csv(rows))))
+
+    bench(
+        f'csv.parse_csv_block.{rows}',
+        lambda: csv_ingest.parse_csv_block(parsed, TIMESTAMP, TTL).to_items(),
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize('rows', PROCESS_ROWS)
+def test_process_csv_file(bench, mock_dynamodb, rows, monkeypatch):
+    """S3からの読み込み・解析・書き込みまでの全体"""
+    known_city_ids = frozenset(range(1, CSV_CITY_COUNT + 1))
+    monkeypatch.setattr(csv_ingest, 'load_known_city_ids', lambda: known_city_ids)
+    monkeypatch.setattr(csv_ingest, '_known_city_ids', None)
+    s3 = boto3.client('s3', region_name='ap-northeast-1')
+    s3.create_bucket(
+        Bucket='bench-bucket',
+        CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-1'},
+    )
+    s3.put_object(Bucket='bench-bucket', Key='data.csv', Body=make_csv(rows).encode('utf-8'))
+
+    bench(
+        f'csv.process_csv_file.{rows}',
+        lambda: csv_ingest.process_csv_file('bench-bucket', 'data.csv'),
+        rounds=1,
+        warmup=0,
+    )
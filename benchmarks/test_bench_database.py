@@ -0,0 +1,94 @@
+"""WeatherDatabase の読み書きベンチマーク"""
+
+from datetime import datetime, timedelta
+import itertools
+
+import pytest
+
+from database import WeatherDatabase
+from models import WeatherData, CITIES
+
+CITY_COUNTS = [5, 100, 1000]
+
+# 集計の更新は 2 × (都市数 + 1) 回の UpdateItem になり、moto 上では1000都市で数十秒かかる
+AGGREGATE_CITY_COUNTS = [5, 100]
+
+
+def _rounds(count: int) -> dict:
+    """都市数が多い場合は計測回数を減らす（moto上では1000都市で数秒かかる）"""
+    return {'rounds': 3, 'warmup': 1} if count < 1000 else {'rounds': 1, 'warmup': 0}
+
+
+def _weather_list(timestamp: str) -> list[WeatherData]:
+    return [
+        WeatherData(
+            city_id=city_id,
+            city_name=name,
+            weather_id=city_id % 3 + 1,
+            weather_name='晴れ',
+            rainfall_probability=city_id % 101,
+            timestamp=timestamp,
+            ttl=4102444800,
+        )
+        for city_id, name in CITIES.items()
+    ]
+
+
+@pytest.mark.parametrize('count', CITY_COUNTS)
+def test_save_multiple(bench, mock_dynamodb, city_master, count):
+    """全都市分の一括保存"""
+    with city_master(count):
+        db = WeatherDatabase()
+        weather_list = _weather_list('2024-01-01T00:00:00')
+
+        bench(
+            f'db.save_multiple.{count}',
+            lambda: db.save_multiple_weather_data(weather_list),
+            **_rounds(count),
+        )
+
+
+@pytest.mark.parametrize('count', CITY_COUNTS)
+def test_get_all_cities_latest(bench, mock_dynamodb, city_master, count):
+    """都市ごとのクエリによる全都市取得"""
+    with city_master(count):
+        db = WeatherDatabase()
+        db.save_multiple_weather_data(_weather_list('2024-01-01T00:00:00'))
+
+        bench(
+            f'db.get_all_cities_latest.{count}',
+            db.get_all_cities_latest_weather,
+            **_rounds(count),
+        )
+
+
+@pytest.mark.parametrize('count', CITY_COUNTS)
+def test_snapshot_round_trip(bench, mock_dynamodb, city_master, count):
+    """スナップショットの更新と取得"""
+    with city_master(count):
+        db = WeatherDatabase()
+        weather_list = _weather_list('2024-01-01T00:00:00')
+
+        bench(
+            f'db.update_snapshot.{count}',
+            lambda: db.update_latest_snapshot(weather_list),
+            **_rounds(count),
+        )
+        bench(f'db.get_snapshot.{count}', db.get_latest_snapshot, **_rounds(count))
+
+
+@pytest.mark.parametrize('count', AGGREGATE_CITY_COUNTS)
+def test_update_aggregates(bench, mock_dynamodb, city_master, count):
+    """全都市分の観測値の時間・日単位の集計への加算（1回ごとに別の時刻）"""
+    with city_master(count):
+        db = WeatherDatabase()
+        # 同じ観測値の再加算は書き込みIDで省かれるため、毎回別の時刻にする
+        timestamps = (
+            (datetime(2024, 1, 1) + timedelta(hours=hour)).isoformat() for hour in itertools.count()
+        )
+
+        bench(
+            f'db.update_aggregates.{count}',
+            lambda: db.update_aggregates(_weather_list(next(timestamps))),
+            **_rounds(count),
+        )
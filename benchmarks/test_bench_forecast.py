@@ -0,0 +1,47 @@
+"""forecast_engine のベンチマーク"""
+
+import random
+
+import pytest
+
+import forecast_engine
+from forecast_engine import ForecastEngine
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not forecast_engine.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+CITY_COUNT = 1700
+HISTORY_HOURS = 24
+HORIZONS = [24, 168]
+
+
+def _engine(use_numpy: bool) -> ForecastEngine:
+    rng = random.Random(0)
+    engine = ForecastEngine(use_numpy=use_numpy)
+    for city_id in range(1, CITY_COUNT + 1):
+        for hour in range(HISTORY_HOURS):
+            timestamp = f'2024-01-01T{hour:02d}:00:00'
+            engine.observe(city_id, timestamp, rng.randrange(3), rng.randrange(101))
+    return engine
+
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+@pytest.mark.parametrize('hours', HORIZONS)
+def test_forecast_all_cities(bench, hours, use_numpy):
+    """1700都市の予報（遷移行列は作成済み）"""
+    engine = _engine(use_numpy)
+    current = {city_id: city_id % 3 for city_id in range(1, CITY_COUNT + 1)}
+    engine.forecast(current, 1)
+    name = 'numpy' if use_numpy else 'python'
+
+    bench(
+        f'forecast.{name}.{CITY_COUNT}x{hours}',
+        lambda: engine.forecast(current, hours),
+        rounds=3,
+    )
@@ -0,0 +1,34 @@
+"""weather_generator のベンチマーク"""
+
+from datetime import datetime
+
+import pytest
+
+import weather_generator
+from weather_generator import WeatherGenerator
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not weather_generator.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+CITY_COUNT = 1700
+HOURS = 24
+
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_generate_batches(bench, use_numpy):
+    """1700都市×24時刻の観測値生成"""
+    cities = {city_id: f'都市{city_id}' for city_id in range(1, CITY_COUNT + 1)}
+    generator = WeatherGenerator(seed=0, use_numpy=use_numpy)
+    engine = 'numpy' if use_numpy else 'python'
+
+    bench(
+        f'generator.iter_batches.{engine}.{CITY_COUNT * HOURS}',
+        lambda: sum(map(len, generator.iter_batches(cities, datetime(2024, 1, 1), HOURS))),
+        rounds=3,
+    )
@@ -0,0 +1,77 @@
+"""lambda_handler のルート別ベンチマーク"""
+
+import pytest
+
+import weather_handler
+from weather_handler import lambda_handler
+
+# (ベンチマーク名, メソッド, パス, 認証要否)
+ROUTES = [
+    ('health', 'GET', '/health', False),
+    ('get_weather', 'GET', '/weather', True),
+    ('get_weather_by_city', 'GET', '/weather/13', True),
+    ('generate', 'POST', '/weather/generate', False),
+    ('forecast', 'GET', '/weather/forecast', True),
+    ('statistics', 'GET', '/weather/statistics', True),
+    ('types', 'GET', '/weather/types', False),
+    ('options', 'OPTIONS', '/weather', False),
+    ('not_found', 'GET', '/unknown', False),
+]
+
+
+@pytest.mark.parametrize('name, method, path, auth', ROUTES, ids=[r[0] for r in ROUTES])
+def test_handler_route(
+    bench, mock_dynamodb, authenticated_event, lambda_context, name, method, path, auth
+):
+    """各ルートの1リクエストあたりの処理時間（読み取りキャッシュなし）"""
+    service = weather_handler.weather_service
+    service.cache.clear()
+    service.generate_weather_data()
+
+    event = {**(authenticated_event if auth else {}), 'httpMethod': method, 'path': path}
+
+    bench(
+        f'handler.{name}',
+        lambda: lambda_handler(event, lambda_context),
+        rounds=20,
+        setup=service.cache.clear,
+    )
+
+
+def test_handler_not_modified(bench, mock_dynamodb, authenticated_event, lambda_context):
+    """If-None-Match が一致する場合（304）の1リクエストあたりの処理時間"""
+    service = weather_handler.weather_service
+    service.cache.clear()
+    service.generate_weather_data()
+
+    etag = lambda_handler(authenticated_event, lambda_context)['headers']['ETag']
+    event = {**authenticated_event, 'headers': {'If-None-Match': etag}}
+    assert lambda_handler(event, lambda_context)['statusCode'] == 304
+
+    bench(
+        'handler.get_weather.not_modified',
+        lambda: lambda_handler(event, lambda_context),
+        rounds=20,
+        setup=service.cache.clear,
+    )
+
+
+def test_handler_compressed(bench, mock_dynamodb, authenticated_event, lambda_context):
+    """gzip で圧縮して返す場合の1リクエストあたりの処理時間（予報）"""
+    service = weather_handler.weather_service
+    service.cache.clear()
+    service.generate_weather_data()
+
+    event = {
+        **authenticated_event,
+        'path': '/weather/forecast',
+        'headers': {'Accept': 'application/json', 'Accept-Encoding': 'gzip'},
+    }
+    assert lambda_handler(event, lambda_context)['headers']['Content-Encoding'] == 'gzip'
+
+    bench(
+        'handler.forecast.gzip',
+        lambda: lambda_handler(event, lambda_context),
+        rounds=20,
+        setup=service.cache.clear,
+    )
@@ -0,0 +1,44 @@
+"""statistics_engine のベンチマーク"""
+
+import random
+from array import array
+
+import pytest
+
+import statistics_engine
+from statistics_engine import WeatherColumns, compute_statistics
+
+SIZES = [10_000, 1_000_000]
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not statistics_engine.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+
+def _columns(count: int) -> WeatherColumns:
+    rng = random.Random(0)
+    return WeatherColumns(
+        city_ids=array('i', (rng.randrange(1, 1701) for _ in range(count))),
+        weather_codes=array('h', (rng.randrange(3) for _ in range(count))),
+        rainfall_probabilities=array('h', (rng.randrange(101) for _ in range(count))),
+        labels=['晴れ', 'くもり', '雨'],
+    )
+
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+@pytest.mark.parametrize('count', SIZES)
+def test_compute_statistics(bench, count, use_numpy):
+    """全体と都市別（1700都市）の統計計算"""
+    columns = _columns(count)
+    engine = 'numpy' if use_numpy else 'python'
+
+    bench(
+        f'statistics.compute.{engine}.{count}',
+        lambda: compute_statistics(columns, use_numpy=use_numpy),
+        rounds=3,
+    )
@@ -2,21 +2,55 @@
 
 import os
 import csv
+import time
+import threading
 import logging
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
 from datetime import datetime, timedelta
 from decimal import Decimal
 from urllib.parse import unquote_plus
 
 import boto3
+from botocore.config import Config
+
+import structured_logging
+from metrics import Metrics
+# 都市マスター・スナップショット・集計項目の更新は src/ と共通（SharedLayer で配布）
+from batch_write import BATCH_WRITE_MAX_ITEMS, write_batch
+from city_registry import load_configured_cities
+from derived_items import (
+    MIN_CITY_ID,
+    RAINFALL_DECIMALS,
+    build_aggregate_deltas,
+    write_aggregates,
+    write_latest_snapshot,
+)
 
 # ロギング設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS クライアント
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
+# メトリクス（API と同じ Metrics で CloudWatch Embedded Metric Format を標準出力に書き出す）
+METRICS = Metrics(
+    namespace=os.environ.get("METRICS_NAMESPACE", "SimpleWeatherNews"),
+    service="csv-ingest",
+    enabled=os.environ.get("METRICS_ENABLED", "true").lower() == "true",
+)
+
+# AWS クライアント（初回呼び出し時に生成し、ウォームコンテナ内で共有）
+_s3 = None
+_dynamodb = None
+_client_lock = threading.Lock()
+
+# 並列処理のワーカースレッドかどうか（入れ子の並列化を防ぐ）
+_worker_state = threading.local()
+
+# 登録済み都市IDのキャッシュ（(読み込んだ時刻, 都市IDの集合)）
+_known_city_ids = None
+_known_city_ids_lock = threading.Lock()
 
 # 環境変数
 TABLE_NAME = os.environ.get("TABLE_NAME", "weather-data")
@@ -24,30 +58,63 @@ TABLE_NAME = os.environ.get("TABLE_NAME", "weather-data")
 # TTL: 24時間
 DEFAULT_TTL_HOURS = 24
 
+# 都市マスター（API と共通の city_registry）に含まれない都市IDの行をエラーにする
+CITY_VALIDATION = os.environ.get("CITY_VALIDATION", "true").lower() == "true"
+# 登録済み都市IDをウォームコンテナ内で再利用する秒数（環境変数 CITY_CACHE_TTL_SECONDS で変更可能）
+CITY_CACHE_TTL_SECONDS = float(os.environ.get("CITY_CACHE_TTL_SECONDS", "300"))
+
+# S3オブジェクトを読み込む単位（ファイルサイズに関係なくメモリ使用量を抑える）
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# バイト範囲の最後の行を読み切るため、範囲の終端を越えて取得するバイト数
+# （最後の行がさらに続く場合のみ、同じ大きさずつ追加で取得する）
+RANGE_READ_SLACK_BYTES = 4 * 1024
+
+# まとめて解析する行数
+PARSE_BLOCK_ROWS = 1000
+
+# 並列取り込み設定（S3レコード・バイト範囲・集計項目の書き込みの同時処理数と範囲サイズ）
+# 並列化するのは最初に複数件を処理する段のみのため、同時スレッド数は INGEST_CONCURRENCY 以下
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+INGEST_RANGE_BYTES = int(os.environ.get("INGEST_RANGE_BYTES", str(16 * 1024 * 1024)))
+
+# クライアントの接続プール（botocore の既定は10。同時スレッド数を下回らないようにする）
+CLIENT_CONFIG = Config(max_pool_connections=max(10, INGEST_CONCURRENCY))
+
+
+def get_s3():
+    """S3クライアントを取得"""
+    global _s3
+    with _client_lock:
+        if _s3 is None:
+            _s3 = boto3.client("s3", config=CLIENT_CONFIG)
+    return _s3
+
+
+def get_dynamodb():
+    """DynamoDBリソースを取得"""
+    global _dynamodb
+    with _client_lock:
+        if _dynamodb is None:
+            _dynamodb = boto3.resource("dynamodb", config=CLIENT_CONFIG)
+    return _dynamodb
+
 
 def lambda_handler(event: dict, context) -> dict:
     """S3イベントトリガーのエントリーポイント"""
-    logger.info(f"Received event: {event}")
+    start = time.perf_counter()
+    request_log = structured_logging.start_request(context)
+    if structured_logging.should_log_event():
+        logger.info("Received event: %s", structured_logging.LazyJson(event))
 
     success_count = 0
     error_count = 0
 
-    for record in event.get("Records", []):
-        try:
-            # S3情報を取得
-            bucket = record["s3"]["bucket"]["name"]
-            key = unquote_plus(record["s3"]["object"]["key"])
-
-            logger.info(f"Processing file: s3://{bucket}/{key}")
-
-            # CSVファイルを処理
-            processed, errors = process_csv_file(bucket, key)
-            success_count += processed
-            error_count += errors
-
-        except Exception as e:
-            logger.error(f"Error processing record: {e}")
-            error_count += 1
+    # 複数レコードは最大 INGEST_CONCURRENCY 件を並列に処理する
+    records = event.get("Records", [])
+    for processed, errors in _map_concurrently(_process_record, records):
+        success_count += processed
+        error_count += errors
 
     result = {
         "statusCode": 200,
@@ -58,58 +125,383 @@ def lambda_handler(event: dict, context) -> dict:
         },
     }
 
-    logger.info(f"Processing result: {result}")
+    duration_seconds = time.perf_counter() - start
+    emit_ingest_metrics(success_count, error_count, duration_seconds)
+
+    # 1リクエストにつき1行のサマリー
+    request_log.set(
+        records=len(records), success_count=success_count, error_count=error_count
+    )
+    request_log.emit(logger)
     return result
 
 
-def process_csv_file(bucket: str, key: str) -> tuple[int, int]:
-    """CSVファイルを処理してDynamoDBに保存"""
-    success_count = 0
-    error_count = 0
+def emit_ingest_metrics(
+    success_count: int, error_count: int, duration_seconds: float
+) -> dict | None:
+    """取り込み件数・スループット・所要時間を、再送回数とあわせてEMFで出力"""
+    METRICS.count("RowsIngested", success_count)
+    METRICS.count("RowErrors", error_count)
+    METRICS.gauge(
+        "RowsPerSecond",
+        round(success_count / duration_seconds, 1) if duration_seconds > 0 else 0.0,
+        "Count/Second",
+    )
+    METRICS.gauge("IngestDuration", round(duration_seconds * 1000, 2), "Milliseconds")
+    return METRICS.flush()
 
+
+def _process_record(record: dict) -> tuple[int, int]:
+    """S3イベントレコード1件を処理（失敗はエラー1件として数える）"""
     try:
-        # S3からファイルを読み込み
-        response = s3.get_object(Bucket=bucket, Key=key)
-        content = response["Body"].read().decode("utf-8")
+        # S3情報を取得
+        bucket = record["s3"]["bucket"]["name"]
+        key = unquote_plus(record["s3"]["object"]["key"])
+
+        logger.debug("Processing file: s3://%s/%s", bucket, key)
+
+        # CSVファイルを処理
+        return process_csv_file(bucket, key)
+
+    except Exception as e:
+        logger.error("Error processing record: %s", e)
+        return 0, 1
+
+
+def _map_concurrently(func, args: list) -> list:
+    """func を最大 INGEST_CONCURRENCY 並列で適用し、入力順に結果を返す
+
+    ワーカースレッド内から呼ばれた場合（レコード→範囲→集計の入れ子）は
+    そのスレッドで順に処理し、同時スレッド数が INGEST_CONCURRENCY を超えないようにする。
+    """
+    if INGEST_CONCURRENCY <= 1 or len(args) <= 1 or getattr(_worker_state, "active", False):
+        return [func(arg) for arg in args]
+
+    with ThreadPoolExecutor(
+        max_workers=min(INGEST_CONCURRENCY, len(args)), initializer=_mark_worker
+    ) as executor:
+        return list(executor.map(func, args))
+
 
-        logger.info(f"Read {len(content)} bytes from S3")
+def _mark_worker() -> None:
+    """_map_concurrently のワーカースレッドであることを記録"""
+    _worker_state.active = True
 
-        # CSVを解析
-        reader = csv.reader(StringIO(content))
 
-        # DynamoDBテーブル
-        table = dynamodb.Table(TABLE_NAME)
+class BatchWriter:
+    """CSV行をBatchWriteItemでまとめて保存するライター
 
-        # タイムスタンプとTTLを設定
+    同一バッチ内で (CityId, timestamp) が重複した行は後勝ちで1項目にまとめ、
+    まとめられた行も含めて行単位で成功/失敗件数を数える。
+    """
+
+    def __init__(self, table_name: str, batch_size: int = BATCH_WRITE_MAX_ITEMS):
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.success_count = 0
+        self.error_count = 0
+        self.retry_count = 0
+        # 書き込みに成功した都市ごとの最新項目（スナップショット更新用）
+        self.latest_items: dict[int, dict] = {}
+        # (CityId, timestamp) -> (項目, 行数)
+        self._pending: dict[tuple, tuple[dict, int]] = {}
+
+    def put(self, item: dict) -> None:
+        """項目を追加し、バッチが満杯になったら書き込む"""
+        key = (item["CityId"], item["timestamp"])
+        _, rows = self._pending.get(key, (None, 0))
+        self._pending[key] = (item, rows + 1)
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """保留中の項目を書き込む"""
+        if not self._pending:
+            return
+
+        pending = self._pending
+        self._pending = {}
+
+        unprocessed = self._write([item for item, _ in pending.values()])
+        failed_keys = {(item["CityId"], item["timestamp"]) for item in unprocessed}
+
+        for key, (item, rows) in pending.items():
+            if key in failed_keys:
+                self.error_count += rows
+            else:
+                self.success_count += rows
+                self.latest_items[item["CityId"]] = item
+
+    def _write(self, items: list[dict]) -> list[dict]:
+        """BatchWriteItemを実行し、最終的に書き込めなかった項目を返す"""
+        return write_batch(
+            get_dynamodb().meta.client.batch_write_item,
+            self.table_name,
+            items,
+            on_retry=self._count_retry,
+        )
+
+    def _count_retry(self) -> None:
+        """UnprocessedItems の再送回数を数える"""
+        self.retry_count += 1
+
+
+def process_csv_file(bucket: str, key: str) -> tuple[int, int]:
+    """CSVファイルを処理してDynamoDBに保存
+
+    INGEST_RANGE_BYTES を超えるファイルは行境界で複数のバイト範囲に分割し、
+    範囲ごとに並列で取得・解析する。
+    """
+    try:
+        size = get_s3().head_object(Bucket=bucket, Key=key)["ContentLength"]
+        ranges = split_byte_ranges(size, INGEST_RANGE_BYTES)
+        logger.debug("Streaming %d bytes from S3 in %d range(s)", size, len(ranges))
+
+        # タイムスタンプとTTLを設定（ファイル内の全行で共通）
         now = datetime.utcnow()
         timestamp = now.isoformat()
         ttl = int((now + timedelta(hours=DEFAULT_TTL_HOURS)).timestamp())
 
-        for row_num, row in enumerate(reader, start=1):
-            try:
-                # 行を処理
-                item = parse_csv_row(row, timestamp, ttl)
-                if item:
-                    # DynamoDBに保存
-                    table.put_item(Item=item)
-                    success_count += 1
-                    logger.info(f"Row {row_num}: Saved city {item['CityId']}")
-                else:
-                    logger.warning(f"Row {row_num}: Invalid format, skipping")
-                    error_count += 1
-
-            except Exception as e:
-                logger.error(f"Row {row_num}: Error processing - {e}")
-                error_count += 1
-                continue
+        known_city_ids = get_known_city_ids() if CITY_VALIDATION else None
+
+        results = _map_concurrently(
+            lambda byte_range: _process_range(
+                bucket, key, byte_range, timestamp, ttl, known_city_ids
+            ),
+            ranges,
+        )
 
     except Exception as e:
-        logger.error(f"Error reading CSV file: {e}")
+        logger.error("Error reading CSV file: %s", e)
         raise
 
+    # 範囲ごとの結果をファイル順にマージ（同じ都市は後ろの範囲が優先）
+    success_count = 0
+    error_count = 0
+    retry_count = 0
+    latest_items = {}
+    for writer, parse_errors in results:
+        success_count += writer.success_count
+        error_count += writer.error_count + parse_errors
+        retry_count += writer.retry_count
+        latest_items.update(writer.latest_items)
+    METRICS.count("WriteRetries", retry_count)
+
+    logger.debug(
+        "Saved %d rows (%d errors, %d retries) from s3://%s/%s",
+        success_count,
+        error_count,
+        retry_count,
+        bucket,
+        key,
+    )
+
+    if latest_items:
+        table = get_dynamodb().Table(TABLE_NAME)
+        try:
+            update_latest_snapshot(table, list(latest_items.values()))
+        except Exception as e:
+            # 観測データは保存済みのため、件数はそのまま返す
+            logger.error("Failed to update latest snapshot: %s", e)
+
+        # ファイル内の行は timestamp が共通のため、都市ごとの最終項目が保存された観測値になる
+        try:
+            update_aggregates(table, list(latest_items.values()))
+        except Exception as e:
+            logger.error("Failed to update aggregates: %s", e)
+
     return success_count, error_count
 
 
+def split_byte_ranges(size: int, range_bytes: int) -> list[tuple[int, int]]:
+    """ファイルサイズを (開始, 終了) の包含バイト範囲に分割"""
+    return [
+        (start, min(start + range_bytes, size) - 1)
+        for start in range(0, size, range_bytes)
+    ]
+
+
+def get_known_city_ids() -> frozenset:
+    """登録済みの都市ID（CITY_CACHE_TTL_SECONDS の間はS3オブジェクトをまたいで再利用する）
+
+    新しく登録した都市は、キャッシュの期限が切れるまで未登録として扱われる。
+    """
+    global _known_city_ids
+
+    # 並列に処理するレコードが同時に読み込まないよう、読み込み中もロックを保持する
+    with _known_city_ids_lock:
+        now = time.monotonic()
+        if _known_city_ids is None or now - _known_city_ids[0] > CITY_CACHE_TTL_SECONDS:
+            _known_city_ids = (now, load_known_city_ids())
+        return _known_city_ids[1]
+
+
+def load_known_city_ids() -> frozenset:
+    """API と同じ都市マスター（CITY_REGISTRY_SOURCE。既定は同梱の cities.csv）から都市IDを読み込む
+
+    都市が1件もない場合は検証できないため、行を受け入れずに取り込みを失敗させる。
+    """
+    cities = load_configured_cities(lambda: get_dynamodb().Table(TABLE_NAME))
+    city_ids = frozenset(city.id for city in cities)
+    if not city_ids:
+        raise ValueError("No cities registered (set CITY_VALIDATION=false to skip validation)")
+    return city_ids
+
+
+def _process_range(
+    bucket: str,
+    key: str,
+    byte_range: tuple[int, int],
+    timestamp: str,
+    ttl: int,
+    known_city_ids: frozenset | None = None,
+) -> tuple[BatchWriter, int]:
+    """バイト範囲内で開始する行を解析・保存し、(ライター, 解析エラー件数) を返す"""
+    start, end = byte_range
+    writer = BatchWriter(TABLE_NAME)
+    error_count = 0
+
+    lines = _RangeLines(bucket, key, start, end)
+    reader = csv.reader(lines)
+
+    try:
+        while True:
+            # 行ごとの先頭のバイト位置（不正な行の位置をログに出すため）
+            row_offsets = [lines.position]
+            rows = []
+            for row in islice(reader, PARSE_BLOCK_ROWS):
+                rows.append(row)
+                row_offsets.append(lines.position)
+            if not rows:
+                break
+
+            block = parse_csv_block(rows, timestamp, ttl, known_city_ids)
+            for index in block.invalid_rows:
+                logger.warning(
+                    "s3://%s/%s byte %d: Invalid format, skipping",
+                    bucket,
+                    key,
+                    row_offsets[index],
+                )
+            error_count += len(block.invalid_rows)
+
+            # DynamoDB項目への変換は書き込み直前にまとめて行う
+            for item in block.to_items():
+                writer.put(item)
+    finally:
+        lines.close()
+
+    writer.flush()
+    return writer, error_count
+
+
+class _RangeLines:
+    """先頭バイトが [start, end] に含まれる行をデコードして順に返す
+
+    直前の1バイトから読み始め、前の範囲に属する行の残りを読み飛ばす。
+    範囲の最後の行は end を越えて最後まで読む。
+    position は次に返す行の先頭のバイト位置（ファイル先頭から）。
+    """
+
+    def __init__(self, bucket: str, key: str, start: int, end: int):
+        fetch_start = max(start - 1, 0)
+        self._lines = _iter_object_lines(
+            bucket, key, fetch_start, end + RANGE_READ_SLACK_BYTES
+        )
+        self._end = end
+        self.position = fetch_start
+        if start > 0:
+            self.position += len(next(self._lines, b""))
+
+    def __iter__(self):
+        # 範囲外の行は読まない（途中で切れていれば追加の取得が必要になるため）
+        lines = self._lines
+        while self.position <= self._end:
+            line = next(lines, None)
+            if line is None:
+                break
+            self.position += len(line)
+            yield line.decode("utf-8")
+
+    def close(self) -> None:
+        self._lines.close()
+
+
+def _iter_object_lines(bucket: str, key: str, start: int, stop: int):
+    """S3オブジェクトの start バイト目以降を、改行付きのバイト列の行として順に返す
+
+    まず [start, stop] を取得し、最後の行が途中で切れている場合のみ
+    続きを RANGE_READ_SLACK_BYTES ずつ追加で取得する。
+    """
+    pending = b""
+    while True:
+        response = get_s3().get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{stop}")
+        size = int(response["ContentRange"].rsplit("/", 1)[1])
+        body = response["Body"]
+        try:
+            for line in iter_byte_lines(body):
+                if not line.endswith(b"\n"):
+                    # 取得範囲の末尾で切れた行（ファイル末尾の場合はそのまま返す）
+                    pending += line
+                    break
+                yield pending + line
+                pending = b""
+        finally:
+            body.close()
+
+        if stop >= size - 1:
+            if pending:
+                yield pending
+            return
+        start, stop = stop + 1, stop + RANGE_READ_SLACK_BYTES
+
+
+def iter_byte_lines(body, chunk_size: int = STREAM_CHUNK_SIZE):
+    """バイトストリームをチャンク単位で読み、改行付きのバイト列の行を順に返す
+
+    UTF-8では改行バイトがマルチバイト文字の途中に現れないため、
+    返した行ごとにデコードすればチャンク境界で文字が壊れることはない。
+    """
+    pending = b""
+
+    for chunk in iter(lambda: body.read(chunk_size), b""):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+
+    if pending:
+        yield pending
+
+
+def _update_item(table):
+    """テーブルの UpdateItem（スレッド間で共有できるクライアント経由）"""
+    return partial(table.meta.client.update_item, TableName=table.name)
+
+
+def update_latest_snapshot(table, items: list[dict]) -> None:
+    """スナップショット項目に各都市の最新値を反映し、versionを加算する"""
+    entries = {
+        item["CityId"]: {k: v for k, v in item.items() if k != "CityId"} for item in items
+    }
+    write_latest_snapshot(_update_item(table), entries)
+
+
+def update_aggregates(table, items: list[dict]) -> None:
+    """時間・日単位の集計項目（都市別と全都市）に観測値を ADD で加算する"""
+    deltas = build_aggregate_deltas(
+        (
+            item["CityId"],
+            item["timestamp"],
+            item["WeatherName"],
+            int(item["RainfallProbability"]),
+        )
+        for item in items
+    )
+    write_aggregates(_update_item(table), deltas, _map_concurrently)
+
+
 def parse_csv_row(row: list, timestamp: str, ttl: int) -> dict | None:
     """CSV行を解析してDynamoDB項目に変換
 
@@ -126,8 +518,8 @@ def parse_csv_row(row: list, timestamp: str, ttl: int) -> dict | None:
         weather_name = row[3].strip()
         rainfall_probability = int(row[4].strip())
 
-        # バリデーション
-        if not city_name or not weather_name:
+        # バリデーション（0 以下の都市IDは派生項目のパーティションと衝突するため不正）
+        if city_id < MIN_CITY_ID or not city_name or not weather_name:
             return None
 
         if rainfall_probability < 0 or rainfall_probability > 100:
@@ -143,10 +535,98 @@ def parse_csv_row(row: list, timestamp: str, ttl: int) -> dict | None:
         }
 
     except (ValueError, IndexError) as e:
-        logger.warning(f"Parse error: {e}")
+        logger.warning("Parse error: %s", e)
         return None
 
 
+@dataclass
+class CsvBlock:
+    """複数行のCSVを列ごとに保持する解析結果"""
+
+    timestamp: str
+    ttl: int
+    city_ids: list[int] = field(default_factory=list)
+    city_names: list[str] = field(default_factory=list)
+    weather_names: list[str] = field(default_factory=list)
+    rainfall_probabilities: list[int] = field(default_factory=list)
+    # 不正な行のブロック内インデックス（0始まり）
+    invalid_rows: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.city_ids)
+
+    def to_items(self) -> list[dict]:
+        """DynamoDB項目のリストに変換"""
+        timestamp = self.timestamp
+        ttl = Decimal(self.ttl)
+        return [
+            {
+                "CityId": city_id,
+                "CityName": city_name,
+                "WeatherName": weather_name,
+                "RainfallProbability": RAINFALL_DECIMALS[rainfall],
+                "timestamp": timestamp,
+                "ttl": ttl,
+            }
+            for city_id, city_name, weather_name, rainfall in zip(
+                self.city_ids,
+                self.city_names,
+                self.weather_names,
+                self.rainfall_probabilities,
+            )
+        ]
+
+
+def parse_csv_block(
+    rows: list[list], timestamp: str, ttl: int, known_city_ids: frozenset | None = None
+) -> CsvBlock:
+    """複数のCSV行を列ごとに解析する（parse_csv_row と同じ判定基準）
+
+    行ごとの辞書・Decimal生成を行わず、有効な値を列リストに詰める。
+    known_city_ids を指定した場合は、含まれない都市IDの行も不正な行とする。
+    """
+    block = CsvBlock(timestamp=timestamp, ttl=ttl)
+    city_ids = block.city_ids
+    city_names = block.city_names
+    weather_names = block.weather_names
+    rainfalls = block.rainfall_probabilities
+    invalid_rows = block.invalid_rows
+
+    for index, row in enumerate(rows):
+        if len(row) < 5:
+            invalid_rows.append(index)
+            continue
+
+        try:
+            city_id = int(row[0].strip())
+            rainfall = int(row[4].strip())
+        except ValueError:
+            invalid_rows.append(index)
+            continue
+
+        city_name = row[1].strip()
+        weather_name = row[3].strip()
+        if (
+            city_id < MIN_CITY_ID
+            or not city_name
+            or not weather_name
+            or not 0 <= rainfall <= 100
+        ):
+            invalid_rows.append(index)
+            continue
+
+        if known_city_ids is not None and city_id not in known_city_ids:
+            invalid_rows.append(index)
+            continue
+
+        city_ids.append(city_id)
+        city_names.append(city_name)
+        weather_names.append(weather_name)
+        rainfalls.append(rainfall)
+
+    return block
+
+
 # テスト用の関数
 def _test_parse_row():
     """パース関数のテスト"""
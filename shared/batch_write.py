@@ -0,0 +1,69 @@
+"""BatchWriteItem による一括書き込み
+
+API（src/）とCSV取り込み（csv_ingest/）で UnprocessedItems の再送方法を揃えるため、
+Lambdaレイヤー（template.yaml の SharedLayer）として両方に配布する。
+boto3 には依存せず、呼び出し側から BatchWriteItem を実行する関数を受け取る。
+"""
+
+import time
+import random
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# BatchWriteItem の1リクエストあたりの最大件数（DynamoDBの上限）
+BATCH_WRITE_MAX_ITEMS = 25
+
+# UnprocessedItems の再送設定
+BATCH_WRITE_MAX_RETRIES = 5
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+BATCH_WRITE_MAX_DELAY_SECONDS = 2.0
+
+
+def write_batch(
+    batch_write_item: Callable,
+    table_name: str,
+    items: list[dict],
+    on_retry: Optional[Callable[[], None]] = None,
+) -> list[dict]:
+    """1回分の BatchWriteItem を実行し、最終的に書き込めなかった項目を返す
+
+    UnprocessedItems は指数バックオフで再送し、再送のたびに on_retry を呼ぶ。
+    items は BATCH_WRITE_MAX_ITEMS 件以下で渡すこと。
+    """
+    requests = [{"PutRequest": {"Item": item}} for item in items]
+
+    for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+        try:
+            response = batch_write_item(RequestItems={table_name: requests})
+        except Exception as e:
+            logger.error("Batch write failed for %d items: %s", len(requests), e)
+            break
+
+        requests = response.get("UnprocessedItems", {}).get(table_name, [])
+        if not requests:
+            break
+
+        if attempt < BATCH_WRITE_MAX_RETRIES:
+            if on_retry is not None:
+                on_retry()
+            logger.warning(
+                "Retrying %d unprocessed items (attempt %d/%d)",
+                len(requests),
+                attempt + 1,
+                BATCH_WRITE_MAX_RETRIES,
+            )
+            time.sleep(backoff_delay(attempt))
+    else:
+        logger.error("Gave up on %d unprocessed items", len(requests))
+
+    return [request["PutRequest"]["Item"] for request in requests]
+
+
+def backoff_delay(attempt: int) -> float:
+    """指数バックオフ（フルジッター）の待機秒数を計算"""
+    ceiling = min(
+        BATCH_WRITE_MAX_DELAY_SECONDS, BATCH_WRITE_BASE_DELAY_SECONDS * (2**attempt)
+    )
+    return random.uniform(0, ceiling)
@@ -0,0 +1,246 @@
+"""都市レジストリモジュール
+
+都市マスターを同梱のCSVファイル、またはテーブルの都市パーティションから読み込み、
+都市ID・都道府県・地方ごとの索引を持つ。読み込みは初回アクセス時まで遅延させる。
+API と CSV取り込みが同じ都市マスターを使うよう、Lambdaレイヤー（SharedLayer）で配布する。
+"""
+
+import csv
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from derived_items import CITY_KEY_PREFIX, METADATA_CITY_ID
+
+logger = logging.getLogger(__name__)
+
+# 同梱の都市マスター（ヘッダー: city_id,name,prefecture,region）
+DEFAULT_CITY_FILE = os.path.join(os.path.dirname(__file__), "data", "cities.csv")
+
+# 都市マスターの読み込み元（file / table）とファイルパス
+CITY_REGISTRY_SOURCE = os.environ.get("CITY_REGISTRY_SOURCE", "file")
+CITY_REGISTRY_FILE = os.environ.get("CITY_REGISTRY_FILE", DEFAULT_CITY_FILE)
+
+
+
+@dataclass(frozen=True, slots=True)
+class City:
+    """都市"""
+
+    id: int
+    name: str
+    prefecture: str = ""
+    region: str = ""
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "prefecture": self.prefecture,
+            "region": self.region,
+        }
+
+
+class CityRegistry(Mapping):
+    """都市ID -> 都市名 の読み取り専用マッピング（都道府県・地方の索引付き）
+
+    従来の CITIES 辞書と同じく `city_id in CITIES`, `CITIES[city_id]`, `CITIES.items()` が使える。
+    loader を渡した場合は初回アクセス時に一度だけ呼び出して都市を読み込む。
+    """
+
+    def __init__(
+        self,
+        cities: Optional[Iterable[City]] = None,
+        loader: Optional[Callable[[], Iterable[City]]] = None,
+    ):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._by_id: dict[int, City] = {}
+        self._by_prefecture: dict[str, list[int]] = {}
+        self._by_region: dict[str, list[int]] = {}
+        self._city_list: list[dict] = []
+        if cities is not None or loader is None:
+            self.replace(cities or ())
+
+    def replace(self, cities: Iterable[City]) -> None:
+        """都市を入れ替えて索引を作り直す（参照中のインスタンスはそのまま使える）"""
+        by_id = {city.id: city for city in cities}
+        by_prefecture: dict[str, list[int]] = {}
+        by_region: dict[str, list[int]] = {}
+        for city in by_id.values():
+            by_prefecture.setdefault(city.prefecture, []).append(city.id)
+            by_region.setdefault(city.region, []).append(city.id)
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_prefecture = by_prefecture
+            self._by_region = by_region
+            self._city_list = [{"id": city.id, "name": city.name} for city in by_id.values()]
+            self._loaded = True
+
+    def _index(self) -> dict[int, City]:
+        if not self._loaded and self._loader is not None:
+            self.replace(self._loader())
+        return self._by_id
+
+    # Mapping
+    def __getitem__(self, city_id: int) -> str:
+        return self._index()[city_id].name
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index())
+
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __contains__(self, city_id) -> bool:
+        return city_id in self._index()
+
+    def get_city(self, city_id: int) -> Optional[City]:
+        """都市を取得（未登録は None）"""
+        return self._index().get(city_id)
+
+    def cities(self) -> list[City]:
+        """全都市（登録順）"""
+        return list(self._index().values())
+
+    def city_list(self) -> list[dict]:
+        """{"id", "name"} のリスト（共有するため変更しないこと）"""
+        self._index()
+        return self._city_list
+
+    def regions(self) -> list[str]:
+        self._index()
+        return list(self._by_region)
+
+    def prefectures(self) -> list[str]:
+        self._index()
+        return list(self._by_prefecture)
+
+    def select(
+        self, region: Optional[str] = None, prefecture: Optional[str] = None
+    ) -> list[int]:
+        """地方・都道府県で絞り込んだ都市IDのリスト（登録順）"""
+        by_id = self._index()
+        if prefecture is not None:
+            city_ids = self._by_prefecture.get(prefecture, [])
+            if region is not None:
+                city_ids = [city_id for city_id in city_ids if by_id[city_id].region == region]
+            return list(city_ids)
+        if region is not None:
+            return list(self._by_region.get(region, []))
+        return list(by_id)
+
+    def page(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        region: Optional[str] = None,
+        prefecture: Optional[str] = None,
+    ) -> tuple[list[int], Optional[int], int]:
+        """絞り込んだ都市IDの1ページ分を (都市IDリスト, 次のoffset, 該当件数) で返す"""
+        city_ids = self.select(region=region, prefecture=prefecture)
+        total = len(city_ids)
+        if limit is None:
+            return city_ids[offset:], None, total
+        end = offset + limit
+        return city_ids[offset:end], (end if end < total else None), total
+
+
+def load_cities_from_file(path: str) -> list[City]:
+    """CSVファイルから都市を読み込む"""
+    with open(path, encoding="utf-8", newline="") as f:
+        return [
+            City(
+                id=int(row["city_id"]),
+                name=row["name"],
+                prefecture=row.get("prefecture", ""),
+                region=row.get("region", ""),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def _default_table(table_name: Optional[str] = None):
+    """テーブル名（省略時は環境変数 TABLE_NAME）の boto3 テーブル"""
+    import boto3
+
+    return boto3.resource("dynamodb").Table(
+        table_name or os.environ.get("TABLE_NAME", "weather-data")
+    )
+
+
+def load_cities_from_table(table_name: Optional[str] = None, table: Any = None) -> list[City]:
+    """テーブルの都市パーティション（CityId=0, timestamp が CITY# で始まる項目）から読み込む
+
+    table を省略した場合は table_name のテーブルを新しく開く。
+    """
+    from boto3.dynamodb.conditions import Key
+
+    if table is None:
+        table = _default_table(table_name)
+    params = {
+        "KeyConditionExpression": Key("CityId").eq(METADATA_CITY_ID)
+        & Key("timestamp").begins_with(CITY_KEY_PREFIX),
+    }
+    cities = []
+    while True:
+        response = table.query(**params)
+        cities.extend(
+            City(
+                id=int(item["timestamp"][len(CITY_KEY_PREFIX) :]),
+                name=item["CityName"],
+                prefecture=item.get("Prefecture", ""),
+                region=item.get("Region", ""),
+            )
+            for item in response.get("Items", [])
+        )
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return cities
+        params["ExclusiveStartKey"] = last_key
+
+
+def save_cities_to_table(cities: Iterable[City], table_name: Optional[str] = None) -> int:
+    """都市をテーブルの都市パーティションに書き込み、件数を返す"""
+    table = _default_table(table_name)
+    count = 0
+    with table.batch_writer() as writer:
+        for city in cities:
+            writer.put_item(
+                Item={
+                    "CityId": METADATA_CITY_ID,
+                    "timestamp": f"{CITY_KEY_PREFIX}{city.id}",
+                    "CityName": city.name,
+                    "Prefecture": city.prefecture,
+                    "Region": city.region,
+                }
+            )
+            count += 1
+    return count
+
+
+def load_configured_cities(get_table: Optional[Callable[[], Any]] = None) -> list[City]:
+    """環境変数 CITY_REGISTRY_SOURCE に従って都市を読み込む
+
+    テーブルの都市パーティションが空の場合は同梱ファイルを使う。
+    get_table は都市パーティションを読むテーブルを返す関数（各Lambdaで共有するクライアントを使う）。
+    """
+    if CITY_REGISTRY_SOURCE == "table":
+        cities = load_cities_from_table(table=get_table() if get_table is not None else None)
+        if cities:
+            return cities
+        logger.warning("City partition is empty, falling back to %s", CITY_REGISTRY_FILE)
+    return load_cities_from_file(CITY_REGISTRY_FILE)
+
+
+if __name__ == "__main__":
+    # CSVファイル（省略時は CITY_REGISTRY_FILE）をテーブルの都市パーティションに登録する
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else CITY_REGISTRY_FILE
+    print(f"Saved {save_cities_to_table(load_cities_from_file(path))} cities from {path}")
@@ -0,0 +1,302 @@
+"""観測データから派生する項目（最新スナップショット・集計）の更新
+
+API（src/）とCSV取り込み（csv_ingest/）の両Lambdaから同じ UpdateItem を発行するため、
+Lambdaレイヤー（template.yaml の SharedLayer）として両方に配布する。
+boto3 には依存せず、呼び出し側から UpdateItem を実行する関数を受け取る。
+"""
+
+import time
+import random
+import hashlib
+from decimal import Decimal
+from typing import Callable, Iterable
+
+# 観測データ以外の項目（スナップショット・バージョン・都市マスター）を置くパーティション
+# （CityId=0 は実在しない都市IDのため、通常の観測データとは衝突しない）
+METADATA_CITY_ID = 0
+
+# 全都市の最新値をまとめたスナップショット項目のキー
+SNAPSHOT_CITY_ID = METADATA_CITY_ID
+SNAPSHOT_TIMESTAMP = "LATEST"
+
+# 都市マスターの項目の timestamp の接頭辞（"CITY#<都市ID>"、city_registry が読み書きする）
+CITY_KEY_PREFIX = "CITY#"
+
+# 観測データに使える都市IDの下限（0 はスナップショット等、負の値は集計項目のパーティション）
+MIN_CITY_ID = 1
+
+# データのバージョン（スナップショット更新ごとに加算）を保持する小さな項目のキー
+# （変更検知のたびに大きなスナップショット項目を読まないよう別項目にする）
+VERSION_TIMESTAMP = "VERSION"
+
+# 1回のUpdateItemで更新する都市数（式の長さ上限 4KB に収めるため）
+SNAPSHOT_UPDATE_CHUNK = 100
+
+# 集計項目
+# 書き込みが1パーティションに集中しないよう、対象（全都市・都市ごと）ごとに
+# 負の CityId のパーティションに分けて保持する（全都市は -1、都市 n は -1 - n）。
+# timestamp は "AGG#<粒度>#<期間>" 形式で、期間の範囲をキー条件で読める
+AGGREGATE_PREFIX = "AGG"
+AGGREGATE_ALL = "ALL"
+AGGREGATE_ALL_PARTITION = -1
+# 粒度 -> (キー上の記号, 期間として使う timestamp の先頭文字数)
+AGGREGATE_GRANULARITIES = {"hour": ("H", 13), "day": ("D", 10)}
+# 集計項目の保持期間（日）
+AGGREGATE_TTL_DAYS = {"hour": 7, "day": 400}
+# 天気タイプ別件数の属性名の接頭辞（例: W_晴れ）
+AGGREGATE_WEATHER_PREFIX = "W_"
+
+# 反映済みの書き込みIDを保持する属性（同じ観測値の再書き込みで二重に加算しない）
+# 書き込み時刻の期間（AGGREGATE_BATCHES_WINDOW_SECONDS）ごとに属性を使い回し、現在と直前の
+# 期間の書き込みIDのみを残す（それより古い属性は書き込みのたびに削除する）。
+# 集計項目の大きさは書き込み回数に比例せず、再送は直前の期間まで判別できる。
+AGGREGATE_BATCHES_ATTRIBUTE = "Batches"
+AGGREGATE_BATCHES_SLOTS = 3
+AGGREGATE_BATCHES_WINDOW_SECONDS = 6 * 3600
+
+# 失敗した集計項目の再送回数と待機秒数（書き込みIDで冪等なため、そのまま再送できる）
+AGGREGATE_WRITE_MAX_RETRIES = 2
+AGGREGATE_WRITE_BASE_DELAY_SECONDS = 0.05
+
+# 降水確率 0〜100 のDecimal（観測項目・集計項目への変換で使い回す）
+RAINFALL_DECIMALS = tuple(Decimal(value) for value in range(101))
+
+
+def rainfall_decimal(value: int) -> Decimal:
+    """降水確率をDecimalに変換（0〜100 は事前生成したものを使う）"""
+    if 0 <= value <= 100:
+        return RAINFALL_DECIMALS[value]
+    return Decimal(value)
+
+
+def snapshot_attribute(city_id: int) -> str:
+    """スナップショット項目内の都市ごとの属性名"""
+    return f"C{city_id}"
+
+
+def snapshot_update_params(entries: dict[int, dict]) -> list[dict]:
+    """都市ID -> 最新値（CityId を除いた項目）から、チャンクごとの UpdateItem パラメータを作る
+
+    都市ごとの属性をSETで更新するため、別の書き込みと同時に実行されても
+    他都市の値は失われない。
+    """
+    city_ids = list(entries.keys())
+    params = []
+    for start in range(0, len(city_ids), SNAPSHOT_UPDATE_CHUNK):
+        chunk = city_ids[start : start + SNAPSHOT_UPDATE_CHUNK]
+        names = {f"#c{i}": snapshot_attribute(city_id) for i, city_id in enumerate(chunk)}
+        values = {f":c{i}": entries[city_id] for i, city_id in enumerate(chunk)}
+        assignments = ", ".join(f"#c{i} = :c{i}" for i in range(len(chunk)))
+        params.append(
+            {
+                "Key": {"CityId": SNAPSHOT_CITY_ID, "timestamp": SNAPSHOT_TIMESTAMP},
+                "UpdateExpression": f"SET {assignments}",
+                "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": values,
+            }
+        )
+    return params
+
+
+def version_update_params() -> dict:
+    """バージョン項目の version を1加算する UpdateItem パラメータ"""
+    return {
+        "Key": {"CityId": SNAPSHOT_CITY_ID, "timestamp": VERSION_TIMESTAMP},
+        "UpdateExpression": "ADD #version :one",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {":one": 1},
+    }
+
+
+def write_latest_snapshot(update_item: Callable, entries: dict[int, dict]) -> None:
+    """スナップショット項目に各都市の最新値を反映し、バージョンを加算する
+
+    バージョンは全チャンクの書き込み後に加算するため、新しいバージョンを読んだ
+    読み手はスナップショットの新しい値を読める。
+    """
+    for params in snapshot_update_params(entries):
+        update_item(**params)
+    update_item(**version_update_params())
+
+
+def aggregate_partition(scope: int | str) -> int:
+    """集計項目のパーティション（CityId）"""
+    if scope == AGGREGATE_ALL:
+        return AGGREGATE_ALL_PARTITION
+    return AGGREGATE_ALL_PARTITION - int(scope)
+
+
+def aggregate_key(granularity: str, bucket: str) -> str:
+    """集計項目のソートキー"""
+    code, _ = AGGREGATE_GRANULARITIES[granularity]
+    return f"{AGGREGATE_PREFIX}#{code}#{bucket}"
+
+
+def aggregate_bucket(granularity: str, timestamp: str) -> str:
+    """timestamp（ISO 8601）が属する期間（例: 2024-01-01T12 / 2024-01-01）"""
+    _, length = AGGREGATE_GRANULARITIES[granularity]
+    return timestamp[:length]
+
+
+def build_aggregate_deltas(
+    readings: Iterable[tuple[int, str, str, int]],
+) -> dict[tuple[int, str], dict]:
+    """(都市ID, timestamp, 天気名, 降水確率) から集計項目ごとの加算値をまとめる
+
+    キーは集計項目の (パーティション, ソートキー)。
+    """
+    deltas: dict[tuple[int, str], dict] = {}
+    for city_id, timestamp, weather_name, rainfall in readings:
+        for granularity in AGGREGATE_GRANULARITIES:
+            bucket = aggregate_bucket(granularity, timestamp)
+            sort_key = aggregate_key(granularity, bucket)
+            for scope in (city_id, AGGREGATE_ALL):
+                key = (aggregate_partition(scope), sort_key)
+                delta = deltas.get(key)
+                if delta is None:
+                    delta = deltas[key] = {
+                        "granularity": granularity,
+                        "scope": str(scope),
+                        "bucket": bucket,
+                        "count": 0,
+                        "rainfall_sum": 0,
+                        "rainfall_values": set(),
+                        "weather": {},
+                        "readings": [],
+                    }
+                delta["count"] += 1
+                delta["rainfall_sum"] += rainfall
+                delta["rainfall_values"].add(rainfall)
+                delta["weather"][weather_name] = delta["weather"].get(weather_name, 0) + 1
+                delta["readings"].append(f"{city_id}|{timestamp}")
+    return deltas
+
+
+def aggregate_batch_id(delta: dict) -> str:
+    """加算値の元になった観測値（都市ID・timestamp）の組から決まる書き込みID"""
+    digest = hashlib.blake2b(digest_size=8)
+    for reading in sorted(delta["readings"]):
+        digest.update(reading.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def aggregate_update_params(
+    key: tuple[int, str], delta: dict, now: int | None = None
+) -> dict:
+    """集計項目1件分の UpdateItem パラメータ
+
+    件数・合計・天気別件数は ADD で加算し、最小・最大は出現した降水確率の
+    数値セット（0〜100 のため高々101要素）に ADD して読み取り時に求める。
+    書き込みIDを条件付きで記録し、同じ観測値の組を再度加算しないようにする。
+    """
+    now = int(time.time()) if now is None else now
+    batch_id = aggregate_batch_id(delta)
+    current, previous, expired = aggregate_batches_attributes(now)
+    names = {
+        "#count": "Count",
+        "#sum": "RainfallSum",
+        "#values": "RainfallValues",
+        "#scope": "Scope",
+        "#granularity": "Granularity",
+        "#bucket": "Bucket",
+        "#ttl": "ttl",
+        "#batches": current,
+        "#previous": previous,
+        "#expired": expired,
+    }
+    values = {
+        ":count": delta["count"],
+        ":sum": delta["rainfall_sum"],
+        ":values": {RAINFALL_DECIMALS[value] for value in delta["rainfall_values"]},
+        ":scope": delta["scope"],
+        ":granularity": delta["granularity"],
+        ":bucket": delta["bucket"],
+        ":ttl": now + AGGREGATE_TTL_DAYS[delta["granularity"]] * 86400,
+        ":batch": batch_id,
+        ":batches": {batch_id},
+    }
+    additions = ["#count :count", "#sum :sum", "#values :values", "#batches :batches"]
+    for index, (weather_name, count) in enumerate(delta["weather"].items()):
+        names[f"#w{index}"] = f"{AGGREGATE_WEATHER_PREFIX}{weather_name}"
+        values[f":w{index}"] = count
+        additions.append(f"#w{index} :w{index}")
+
+    partition, sort_key = key
+    return {
+        "Key": {"CityId": partition, "timestamp": sort_key},
+        "UpdateExpression": (
+            "SET #scope = :scope, #granularity = :granularity, #bucket = :bucket, "
+            f"#ttl = :ttl ADD {', '.join(additions)} REMOVE #expired"
+        ),
+        "ConditionExpression": (
+            "NOT contains(#batches, :batch) AND NOT contains(#previous, :batch)"
+        ),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+
+def aggregate_batches_attributes(now: int) -> tuple[str, str, str]:
+    """書き込み時刻 now の (記録する属性, 直前の期間の属性, 削除する属性)"""
+    slot = now // AGGREGATE_BATCHES_WINDOW_SECONDS
+    return tuple(
+        f"{AGGREGATE_BATCHES_ATTRIBUTE}{(slot - offset) % AGGREGATE_BATCHES_SLOTS}"
+        for offset in range(AGGREGATE_BATCHES_SLOTS)
+    )
+
+
+class AggregateWriteError(Exception):
+    """一部の集計項目を更新できなかった場合のエラー
+
+    反映済みの項目は書き込みIDで判別できるため、同じ観測値で再実行すれば
+    未反映の項目のみが加算される。
+    """
+
+    def __init__(self, failed: dict[tuple[int, str], Exception]):
+        self.failed = failed
+        first = next(iter(failed.values()))
+        super().__init__(f"{len(failed)} aggregate item(s) were not updated: {first}")
+
+
+def write_aggregates(
+    update_item: Callable, deltas: dict[tuple[int, str], dict], map_func: Callable = map
+) -> int:
+    """集計項目ごとに加算値を書き込み、新たに加算した項目数を返す（map_func で並列に実行できる）
+
+    一部が失敗しても残りの項目の書き込みは続け、失敗した項目のみ再送する。
+    再送しても残った場合は AggregateWriteError を送出する。
+    """
+    now = int(time.time())
+
+    def update(entry: tuple[tuple[int, str], dict]) -> Exception | bool:
+        try:
+            update_item(**aggregate_update_params(*entry, now=now))
+        except Exception as e:
+            if _error_code(e) == "ConditionalCheckFailedException":
+                return False  # 反映済み
+            return e
+        return True
+
+    pending = deltas
+    applied = 0
+    for attempt in range(AGGREGATE_WRITE_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, AGGREGATE_WRITE_BASE_DELAY_SECONDS * (2**attempt)))
+        results = list(map_func(update, pending.items()))
+        applied += sum(1 for result in results if result is True)
+        failed = {
+            key: result
+            for key, result in zip(pending.keys(), results)
+            if isinstance(result, Exception)
+        }
+        if not failed:
+            return applied
+        pending = {key: pending[key] for key in failed}
+
+    raise AggregateWriteError(failed)
+
+
+def _error_code(error: Exception) -> str | None:
+    """botocore の ClientError のエラーコード（botocore を import せずに判定する）"""
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
@@ -0,0 +1,172 @@
+"""レイテンシ計測モジュール
+
+処理区間（span）ごとの所要時間をプロセス内ヒストグラムに蓄積し、
+呼び出しごとの値を CloudWatch Embedded Metric Format (EMF) で標準出力に書き出す。
+"""
+
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# ヒストグラムのバケット上限（ミリ秒）
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# EMF の1メトリクスあたりの値の上限
+EMF_MAX_VALUES = 100
+
+
+class Histogram:
+    """固定バケットのレイテンシヒストグラム"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        """値を1件記録"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float:
+        """パーセンタイルの推定値（該当バケットの上限、最終バケットは最大値）"""
+        if self.count == 0:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index < len(self.buckets):
+                    return min(float(self.buckets[index]), self.max)
+                return self.max
+        return self.max
+
+    def summary(self) -> dict:
+        """集計値"""
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "min": round(self.min, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Metrics:
+    """spanの計測とEMF出力"""
+
+    def __init__(self, namespace: str, service: str, enabled: bool = True, stream=None):
+        self.namespace = namespace
+        self.service = service
+        self.enabled = enabled
+        self.histograms: dict[str, Histogram] = {}
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._values: dict[str, list[float]] = {}
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, tuple[float, str]] = {}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """with ブロックの所要時間（ミリ秒）を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def timed(self, name: str) -> Callable:
+        """関数の所要時間を記録するデコレータ"""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name: str, value_ms: float) -> None:
+        """所要時間を記録"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(value_ms)
+            self._values.setdefault(name, []).append(round(value_ms, 3))
+
+    def count(self, name: str, value: float = 1) -> None:
+        """カウンターを加算"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float, unit: str) -> None:
+        """単位付きの値を設定（同じ名前は後勝ち）"""
+        with self._lock:
+            self._gauges[name] = (value, unit)
+
+    def flush(self, **dimensions: str) -> dict | None:
+        """この呼び出しで記録した値をEMFで出力してリセット"""
+        with self._lock:
+            values, self._values = self._values, {}
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+
+        if not self.enabled or not (values or counters or gauges):
+            return None
+
+        dimensions = {"Service": self.service, **dimensions}
+        definitions = (
+            [{"Name": name, "Unit": "Milliseconds"} for name in values]
+            + [{"Name": name, "Unit": "Count"} for name in counters]
+            + [{"Name": name, "Unit": unit} for name, (_, unit) in gauges.items()]
+        )
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(dimensions.keys())],
+                        "Metrics": definitions,
+                    }
+                ],
+            },
+            **dimensions,
+            **{name: samples[:EMF_MAX_VALUES] for name, samples in values.items()},
+            **counters,
+            **{name: value for name, (value, _) in gauges.items()},
+        }
+        stream = self._stream or sys.stdout
+        stream.write(json.dumps(document, ensure_ascii=False) + "\n")
+        return document
+
+    def summary(self) -> dict:
+        """プロセス内ヒストグラムの集計値"""
+        with self._lock:
+            return {name: h.summary() for name, h in self.histograms.items()}
+
+
+# APIハンドラー共通のメトリクス
+METRICS = Metrics(
+    namespace=os.environ.get("METRICS_NAMESPACE", "SimpleWeatherNews"),
+    service="weather-api",
+    enabled=os.environ.get("METRICS_ENABLED", "true").lower() == "true",
+)
@@ -0,0 +1,88 @@
+"""構造化ログモジュール
+
+1リクエストにつき1行のサマリーログ（JSON）を出力する。
+フィールドの値に呼び出し可能オブジェクトを渡すと、ログレベルが
+有効な場合にのみ評価される。
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Optional
+
+# イベント全体をログに出す割合（0.0〜1.0、環境変数 LOG_EVENT_SAMPLE_RATE）
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.0"))
+
+_current_request: contextvars.ContextVar[Optional["RequestLog"]] = (
+    contextvars.ContextVar("current_request", default=None)
+)
+
+
+class LazyJson:
+    """出力時に初めてJSON化されるログ引数"""
+
+    __slots__ = ("_fields",)
+
+    def __init__(self, fields: dict):
+        self._fields = fields
+
+    def __str__(self) -> str:
+        evaluated = {
+            key: value() if callable(value) else value
+            for key, value in self._fields.items()
+        }
+        return json.dumps(evaluated, ensure_ascii=False, default=str)
+
+
+class RequestLog:
+    """1リクエスト分のログ文脈（相関IDとサマリー項目）"""
+
+    def __init__(self, request_id: str, **fields: Any):
+        self.request_id = request_id
+        self.fields = fields
+        self._start = time.perf_counter()
+
+    def set(self, **fields: Any) -> None:
+        """サマリーに項目を追加"""
+        self.fields.update(fields)
+
+    def emit(self, logger: logging.Logger, level: int = logging.INFO) -> None:
+        """サマリーを1行のJSONで出力"""
+        if not logger.isEnabledFor(level):
+            return
+        duration_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        logger.log(
+            level,
+            "%s",
+            LazyJson(
+                {
+                    "type": "request_summary",
+                    "request_id": self.request_id,
+                    **self.fields,
+                    "duration_ms": duration_ms,
+                }
+            ),
+        )
+
+
+def start_request(context, **fields: Any) -> RequestLog:
+    """リクエストのログ文脈を開始（context.aws_request_id で相関付ける）"""
+    request_log = RequestLog(getattr(context, "aws_request_id", None) or "", **fields)
+    _current_request.set(request_log)
+    return request_log
+
+
+def add_fields(**fields: Any) -> None:
+    """処理中リクエストのサマリーに項目を追加（文脈がなければ何もしない）"""
+    request_log = _current_request.get()
+    if request_log is not None:
+        request_log.set(**fields)
+
+
+def should_log_event(sample_rate: Optional[float] = None) -> bool:
+    """イベント全体をログに出すかどうか（サンプリング）"""
+    rate = LOG_EVENT_SAMPLE_RATE if sample_rate is None else sample_rate
+    return rate > 0 and random.random() < rate
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { Authenticator } from '@aws-amplify/ui-react'
 import { fetchAuthSession } from 'aws-amplify/auth'
 import '@aws-amplify/ui-react/styles.css'
@@ -36,6 +36,8 @@ function WeatherContent() {
   const [weatherData, setWeatherData] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
+  // 前回の応答の ETag（データが変わっていなければ 304 が返り、表示中のデータを使う）
+  const weatherEtag = useRef(null)
 
   const fetchWeather = async () => {
     setLoading(true)
@@ -45,18 +47,27 @@ function WeatherContent() {
       const session = await fetchAuthSession()
       const token = session.tokens?.idToken?.toString()
 
-      const response = await fetch(`${config.apiEndpoint}/weather`, {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
-      })
+      // Accept を application/json にすると、圧縮したレスポンスを API Gateway がバイナリで返す
+      const headers = {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+      }
+      if (weatherEtag.current) {
+        headers['If-None-Match'] = weatherEtag.current
+      }
 
+      const response = await fetch(`${config.apiEndpoint}/weather`, { headers })
+
+      if (response.status === 304) {
+        return
+      }
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`)
       }
 
       const data = await response.json()
+      weatherEtag.current = response.headers.get('ETag')
       setWeatherData(data.data || [])
     } catch (err) {
       console.error('Weather fetch error:', err)
@@ -7,6 +7,7 @@ from typing import Callable
 from exceptions import AuthenticationError
 from auth_service import extract_claims_from_event, is_authenticated
 from models import ApiResponse, ErrorResponse
+from metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +25,12 @@ def require_auth(func: Callable) -> Callable:
     @functools.wraps(func)
     def wrapper(event: dict, context) -> dict:
         try:
-            if not is_authenticated(event):
+            with METRICS.span("auth"):
+                authenticated = is_authenticated(event)
+                # クレームを取得してイベントに追加
+                claims = extract_claims_from_event(event) if authenticated else None
+
+            if not authenticated:
                 logger.warning("Unauthenticated access attempt")
                 error = ErrorResponse(
                     code="AUTH_ERROR",
@@ -33,8 +39,6 @@ def require_auth(func: Callable) -> Callable:
                 )
                 return ApiResponse(status_code=401, body=error.to_dict()).to_lambda_response()
 
-            # クレームを取得してイベントに追加
-            claims = extract_claims_from_event(event)
             if not claims:
                 logger.warning("No claims found in authenticated request")
                 error = ErrorResponse(
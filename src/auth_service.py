@@ -4,8 +4,7 @@ import os
 import logging
 from typing import Optional
 
-import boto3
-
+from aws_clients import get_client
 from exceptions import AuthenticationError
 
 logger = logging.getLogger(__name__)
@@ -17,7 +16,11 @@ class AuthService:
     def __init__(self):
         self.user_pool_id = os.environ.get("COGNITO_USER_POOL_ID", "")
         self.client_id = os.environ.get("COGNITO_CLIENT_ID", "")
-        self.cognito = boto3.client("cognito-idp")
+
+    @property
+    def cognito(self):
+        """Cognitoクライアント（トークン検証では使わないため初回アクセス時に生成）"""
+        return get_client("cognito-idp")
 
     def verify_token(self, token: str) -> dict:
         """JWTトークンを検証"""
@@ -0,0 +1,46 @@
+"""AWSクライアント管理モジュール
+
+boto3 の読み込みとクライアント生成は初回利用時まで遅延させ、
+生成したものはウォームコンテナ内で共有する。
+"""
+
+import threading
+
+_lock = threading.Lock()
+_resources: dict = {}
+_clients: dict = {}
+
+
+def get_resource(service_name: str):
+    """boto3 リソースを取得（初回のみ生成）"""
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                import boto3
+
+                resource = boto3.resource(service_name)
+                _resources[service_name] = resource
+    return resource
+
+
+def get_client(service_name: str):
+    """boto3 クライアントを取得（初回のみ生成）"""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3
+
+                client = boto3.client(service_name)
+                _clients[service_name] = client
+    return client
+
+
+def reset() -> None:
+    """生成済みのクライアントを破棄（テスト用）"""
+    with _lock:
+        _resources.clear()
+        _clients.clear()
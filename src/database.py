@@ -1,96 +1,429 @@
 """DynamoDB操作モジュール"""
 
 import os
+import json
+import time
+import base64
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 from decimal import Decimal
 
-import boto3
-from boto3.dynamodb.conditions import Key
-
-from exceptions import DatabaseError
-from models import WeatherData, CITIES
+import structured_logging
+from aws_clients import get_resource
+from metrics import METRICS
+from exceptions import DatabaseError, ValidationError
+from models import WeatherBatch, WeatherData, CITIES
+from batch_write import BATCH_WRITE_MAX_ITEMS, write_batch
+from derived_items import (
+    SNAPSHOT_CITY_ID,
+    SNAPSHOT_TIMESTAMP,
+    VERSION_TIMESTAMP,
+    aggregate_key,
+    aggregate_partition,
+    build_aggregate_deltas,
+    snapshot_attribute,
+    write_aggregates,
+    write_latest_snapshot,
+)
 
 logger = logging.getLogger(__name__)
 
+# 指定都市のみ取得する場合に射影式で読む最大都市数（これを超える場合は項目全体を読む）
+# 射影式は転送量と変換の手間を減らすが、消費RCUは項目全体のサイズで決まる
+SNAPSHOT_PROJECTION_MAX_CITIES = 100
+
+# 全都市取得時の同時クエリ数（環境変数 DB_READ_CONCURRENCY で変更可能）
+DEFAULT_READ_CONCURRENCY = 16
+
+# 履歴クエリで読み出す属性（CityName と ttl は読まない）
+HISTORY_PROJECTION = "#ts, WeatherId, WeatherName, RainfallProbability"
+
 
 class WeatherDatabase:
     """天気データのDynamoDB操作クラス"""
 
-    def __init__(self, table_name: Optional[str] = None):
+    def __init__(
+        self, table_name: Optional[str] = None, read_concurrency: Optional[int] = None
+    ):
         self.table_name = table_name or os.environ.get("TABLE_NAME", "weather-data")
-        self.dynamodb = boto3.resource("dynamodb")
-        self.table = self.dynamodb.Table(self.table_name)
+        self.read_concurrency = read_concurrency or int(
+            os.environ.get("DB_READ_CONCURRENCY", DEFAULT_READ_CONCURRENCY)
+        )
+        self._table = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def dynamodb(self):
+        """DynamoDBリソース（初回アクセス時に生成し、コンテナ内で共有）"""
+        return get_resource("dynamodb")
+
+    @property
+    def table(self):
+        """テーブルリソース"""
+        if self._table is None:
+            self._table = self.dynamodb.Table(self.table_name)
+        return self._table
+
+    @property
+    def client(self):
+        """低レベルクライアント（スレッドセーフなため並列クエリで使用）"""
+        return self.dynamodb.meta.client
 
     def save_weather_data(self, weather_data: WeatherData) -> bool:
         """天気データを保存"""
         try:
-            item = weather_data.to_dict()
-            # Decimal変換（DynamoDB用）
-            item["RainfallProbability"] = Decimal(str(item["RainfallProbability"]))
-            if item.get("ttl"):
-                item["ttl"] = Decimal(str(item["ttl"]))
-
-            self.table.put_item(Item=item)
-            logger.info(f"Saved weather data for city {weather_data.city_id}")
+            item = self._to_item(weather_data)
+            with METRICS.span("db.put_item"):
+                self.table.put_item(Item=item)
+            logger.debug("Saved weather data for city %s", weather_data.city_id)
             return True
         except Exception as e:
-            logger.error(f"Failed to save weather data: {e}")
+            logger.error("Failed to save weather data: %s", e)
             raise DatabaseError(f"データの保存に失敗しました: {str(e)}")
 
     def get_latest_weather(self, city_id: int) -> Optional[WeatherData]:
         """指定都市の最新天気データを取得"""
+        # boto3 の読み込みを初回クエリまで遅延させる
+        from boto3.dynamodb.conditions import Key
+
         try:
-            response = self.table.query(
-                KeyConditionExpression=Key("CityId").eq(city_id),
-                ScanIndexForward=False,  # 降順（最新が先頭）
-                Limit=1,
-            )
+            with METRICS.span("db.query_latest"):
+                response = self.client.query(
+                    TableName=self.table_name,
+                    KeyConditionExpression=Key("CityId").eq(city_id),
+                    ScanIndexForward=False,  # 降順（最新が先頭）
+                    Limit=1,
+                )
             items = response.get("Items", [])
             if items:
                 return WeatherData.from_dict(items[0])
             return None
         except Exception as e:
-            logger.error(f"Failed to get weather data for city {city_id}: {e}")
+            logger.error("Failed to get weather data for city %s: %s", city_id, e)
             raise DatabaseError(f"データの取得に失敗しました: {str(e)}")
 
-    def get_all_cities_latest_weather(self) -> list[WeatherData]:
-        """全都市の最新天気データを取得"""
+    def query_history_page(
+        self,
+        city_id: int,
+        start: str,
+        end: str,
+        limit: int,
+        exclusive_start_key: Optional[dict] = None,
+        newest_first: bool = True,
+    ) -> tuple[list[dict], Optional[dict]]:
+        """指定都市・期間の観測データを1ページ分取得
+
+        timestamp の範囲をキー条件で絞り込み、ProjectionExpression で必要な属性のみ読む。
+        (項目のリスト, LastEvaluatedKey) を返す（続きがない場合は None）。
+        """
+        params = {
+            "TableName": self.table_name,
+            "KeyConditionExpression": "CityId = :city AND #ts BETWEEN :start AND :end",
+            "ProjectionExpression": HISTORY_PROJECTION,
+            "ExpressionAttributeNames": {"#ts": "timestamp"},
+            "ExpressionAttributeValues": {":city": city_id, ":start": start, ":end": end},
+            "ScanIndexForward": not newest_first,
+            "Limit": limit,
+        }
+        if exclusive_start_key:
+            params["ExclusiveStartKey"] = exclusive_start_key
+
+        try:
+            with METRICS.span("db.query_history"):
+                response = self.client.query(**params)
+        except Exception as e:
+            logger.error("Failed to query history for city %s: %s", city_id, e)
+            raise DatabaseError(f"履歴データの取得に失敗しました: {str(e)}")
+
+        return response.get("Items", []), response.get("LastEvaluatedKey")
+
+    def iter_history_pages(
+        self,
+        city_id: int,
+        start: str,
+        end: str,
+        page_size: int,
+        newest_first: bool = True,
+    ) -> Iterator[list[dict]]:
+        """期間内の観測データをページ単位で順に返す（範囲全体をメモリに載せない）"""
+        last_key = None
+        while True:
+            items, last_key = self.query_history_page(
+                city_id, start, end, page_size, last_key, newest_first
+            )
+            if items:
+                yield items
+            if not last_key:
+                return
+
+    def iter_city_histories(
+        self, city_ids: list[int], start: str, end: str, page_size: int
+    ) -> Iterator[tuple[int, list[dict]]]:
+        """都市ごとの期間内の観測データを (都市ID, 古い順の項目リスト) で順に返す
+
+        都市ごとのクエリはスレッドプールで並列実行する（最大 read_concurrency 件）。
+        """
+
+        def fetch(city_id: int) -> tuple[int, list[dict]]:
+            items = []
+            for page in self.iter_history_pages(
+                city_id, start, end, page_size, newest_first=False
+            ):
+                items.extend(page)
+            return city_id, items
+
+        if self.read_concurrency <= 1 or len(city_ids) <= 1:
+            return map(fetch, city_ids)
+        return self._get_executor().map(fetch, city_ids)
+
+    def get_all_cities_latest_weather(
+        self, city_ids: Optional[list[int]] = None
+    ) -> list[WeatherData]:
+        """全都市（city_ids を指定した場合はその都市）の最新天気データを取得
+
+        都市ごとのクエリをスレッドプールで並列実行する（最大 read_concurrency 件）。
+        """
+        if city_ids is None:
+            city_ids = list(CITIES.keys())
         results = []
         errors = []
 
-        for city_id in CITIES.keys():
-            try:
-                weather = self.get_latest_weather(city_id)
-                if weather:
-                    results.append(weather)
-            except DatabaseError as e:
-                logger.warning(f"Failed to get weather for city {city_id}: {e}")
+        for city_id, weather, error in self._fetch_latest(city_ids):
+            if error is not None:
+                logger.warning("Failed to get weather for city %s: %s", city_id, error)
                 errors.append(city_id)
-                continue
+            elif weather:
+                results.append(weather)
 
         if errors and not results:
             raise DatabaseError(f"全てのデータ取得に失敗しました: {errors}")
 
         return results
 
-    def save_multiple_weather_data(
-        self, weather_data_list: list[WeatherData]
-    ) -> tuple[int, int]:
-        """複数の天気データを保存（部分的な失敗を許容）"""
-        success_count = 0
-        error_count = 0
+    def _fetch_latest(self, city_ids: list[int]) -> list[tuple]:
+        """都市ごとの最新データを (city_id, weather, error) のリストで返す（順序は入力通り）"""
 
-        for weather_data in weather_data_list:
+        def fetch(city_id: int) -> tuple:
             try:
-                self.save_weather_data(weather_data)
-                success_count += 1
+                return city_id, self.get_latest_weather(city_id), None
             except DatabaseError as e:
-                logger.error(f"Failed to save weather for city {weather_data.city_id}: {e}")
-                error_count += 1
+                return city_id, None, e
+
+        if self.read_concurrency <= 1 or len(city_ids) <= 1:
+            return [fetch(city_id) for city_id in city_ids]
+
+        return list(self._get_executor().map(fetch, city_ids))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """ウォームコンテナ間で再利用するスレッドプールを取得"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.read_concurrency, thread_name_prefix="dynamodb-read"
+            )
+        return self._executor
+
+    def get_latest_snapshot(
+        self, city_ids: Optional[list[int]] = None
+    ) -> Optional[list[WeatherData]]:
+        """スナップショット項目から全都市の最新天気データを取得（GetItem 1回）
+
+        city_ids を指定した場合はその都市のみを順に返す（少数なら射影式で該当属性だけ読む）。
+        射影式でも消費RCUは項目全体のサイズ分かかるため、ごく少数の都市は
+        get_all_cities_latest_weather で都市ごとに読むほうが安い。
+        スナップショットが未作成の場合は None を返す。
+        TTLを過ぎた都市は観測データと同様に除外する。
+        """
+        params = {"Key": {"CityId": SNAPSHOT_CITY_ID, "timestamp": SNAPSHOT_TIMESTAMP}}
+        if city_ids is not None and len(city_ids) <= SNAPSHOT_PROJECTION_MAX_CITIES:
+            # キーも読むことで、該当都市がなくても項目の有無を判別できる
+            names = {"#ts": "timestamp"}
+            names.update(
+                (f"#c{i}", snapshot_attribute(city_id)) for i, city_id in enumerate(city_ids)
+            )
+            params["ProjectionExpression"] = ", ".join(names)
+            params["ExpressionAttributeNames"] = names
+
+        try:
+            with METRICS.span("db.get_snapshot"):
+                response = self.table.get_item(**params)
+        except Exception as e:
+            logger.error("Failed to get latest snapshot: %s", e)
+            raise DatabaseError(f"データの取得に失敗しました: {str(e)}")
+
+        item = response.get("Item")
+        if item is None:
+            return None
+
+        now = int(time.time())
+        results = []
+        for city_id in CITIES.keys() if city_ids is None else city_ids:
+            entry = item.get(snapshot_attribute(city_id))
+            if not entry:
+                continue
+            if entry.get("ttl") is not None and int(entry["ttl"]) < now:
                 continue
+            results.append(WeatherData.from_dict({**entry, "CityId": city_id}))
+        return results
+
+    def get_snapshot_version(self) -> Optional[int]:
+        """データのバージョンを読む（スナップショット未作成の場合は None）
+
+        観測の保存・CSV取り込みのたびに加算されるため、データの変更検知に使う。
+        スナップショットとは別の小さな項目に保持するため、読み取りは 0.5 RCU で済む。
+        """
+        try:
+            with METRICS.span("db.get_snapshot_version"):
+                response = self.table.get_item(
+                    Key={"CityId": SNAPSHOT_CITY_ID, "timestamp": VERSION_TIMESTAMP}
+                )
+        except Exception as e:
+            logger.error("Failed to get snapshot version: %s", e)
+            raise DatabaseError(f"データの取得に失敗しました: {str(e)}")
+
+        version = response.get("Item", {}).get("version")
+        return None if version is None else int(version)
+
+    def update_latest_snapshot(
+        self, weather_data_list: list[WeatherData] | WeatherBatch
+    ) -> None:
+        """スナップショット項目に各都市の最新値を反映し、versionを加算する
+
+        都市ごとの属性をSETで更新するため、別の書き込みと同時に実行されても
+        他都市の値は失われない。
+        """
+        entries = {}
+        for weather_data in weather_data_list:
+            entry = self._to_item(weather_data)
+            del entry["CityId"]
+            entries[weather_data.city_id] = entry
+
+        try:
+            with METRICS.span("db.update_snapshot"):
+                write_latest_snapshot(self._update_item, entries)
+        except Exception as e:
+            logger.error("Failed to update latest snapshot: %s", e)
+            raise DatabaseError(f"スナップショットの更新に失敗しました: {str(e)}")
+
+    def save_multiple_weather_data(
+        self, weather_data_list: list[WeatherData] | WeatherBatch
+    ) -> tuple[int, int]:
+        """複数の天気データを保存（部分的な失敗を許容）し、(成功件数, 失敗件数) を返す"""
+        saved = self.save_weather_batch(weather_data_list)
+        return len(saved), len(weather_data_list) - len(saved)
+
+    def save_weather_batch(
+        self, weather_data_list: list[WeatherData] | WeatherBatch
+    ) -> WeatherBatch:
+        """複数の天気データを保存（部分的な失敗を許容）し、保存できた行のバッチを返す
+
+        BatchWriteItem で25件ずつまとめて書き込む。
+        スナップショットや集計には戻り値（保存できた行）のみを反映すること。
+        """
+        if not isinstance(weather_data_list, WeatherBatch):
+            weather_data_list = WeatherBatch.from_weather_list(weather_data_list)
+        failed_keys = self.batch_write_items(weather_data_list.to_items())
+        saved = weather_data_list.exclude_keys(failed_keys)
+        structured_logging.add_fields(
+            db_saved=len(saved), db_save_errors=len(weather_data_list) - len(saved)
+        )
+        return saved
+
+    def batch_write_items(self, items: list[dict]) -> set[tuple[int, str]]:
+        """DynamoDB項目をBatchWriteItemでまとめて保存
 
-        return success_count, error_count
+        UnprocessedItems は指数バックオフで再送し、
+        再送しきれなかった項目のキー (CityId, timestamp) を返す。
+        """
+        failed_keys = set()
+        for start in range(0, len(items), BATCH_WRITE_MAX_ITEMS):
+            for item in self._write_chunk(items[start : start + BATCH_WRITE_MAX_ITEMS]):
+                failed_keys.add((int(item["CityId"]), item["timestamp"]))
+        return failed_keys
+
+    def _write_chunk(self, items: list[dict]) -> list[dict]:
+        """1回分のBatchWriteItemを実行し、最終的に書き込めなかった項目を返す"""
+        return write_batch(
+            self._batch_write_item,
+            self.table_name,
+            items,
+            on_retry=lambda: METRICS.count("db.batch_write_retries"),
+        )
+
+    def _batch_write_item(self, **params) -> dict:
+        """BatchWriteItem を実行（所要時間を計測）"""
+        with METRICS.span("db.batch_write"):
+            return self.dynamodb.batch_write_item(**params)
+
+    @staticmethod
+    def _to_item(weather_data: WeatherData) -> dict:
+        """WeatherDataをDynamoDB項目に変換（Decimal変換込み）"""
+        item = weather_data.to_dict()
+        item["RainfallProbability"] = Decimal(item["RainfallProbability"])
+        if item.get("ttl"):
+            item["ttl"] = Decimal(item["ttl"])
+        return item
+
+    def _update_item(self, **params) -> dict:
+        """UpdateItem を実行（スナップショット・集計の共通書き込み関数）"""
+        return self.client.update_item(TableName=self.table_name, **params)
+
+    def update_aggregates(
+        self, weather_data_list: list[WeatherData] | WeatherBatch
+    ) -> int:
+        """時間・日単位の集計項目（都市別と全都市）に観測値を加算し、新たに加算した項目数を返す
+
+        UpdateItem の ADD で加算するため、同時に書き込まれても値は失われない。
+        一部の項目が失敗した場合は DatabaseError を送出する。同じ観測値で再実行しても
+        反映済みの項目は書き込みIDの条件で加算されないため、再実行して補える。
+        """
+        deltas = build_aggregate_deltas(
+            (w.city_id, w.timestamp, w.weather_name, w.rainfall_probability)
+            for w in weather_data_list
+        )
+
+        if self.read_concurrency <= 1 or len(deltas) <= 1:
+            map_func = map
+        else:
+            map_func = self._get_executor().map
+
+        try:
+            with METRICS.span("db.update_aggregates"):
+                return write_aggregates(self._update_item, deltas, map_func)
+        except Exception as e:
+            logger.error("Failed to update aggregates: %s", e)
+            raise DatabaseError(f"集計の更新に失敗しました: {str(e)}")
+
+    def query_aggregates(
+        self, granularity: str, scope: int | str, start_bucket: str, end_bucket: str
+    ) -> list[dict]:
+        """指定した粒度・対象の集計項目を期間の範囲で取得（古い順）"""
+        params = {
+            "TableName": self.table_name,
+            "KeyConditionExpression": "CityId = :partition AND #ts BETWEEN :start AND :end",
+            "ExpressionAttributeNames": {"#ts": "timestamp"},
+            "ExpressionAttributeValues": {
+                ":partition": aggregate_partition(scope),
+                ":start": aggregate_key(granularity, start_bucket),
+                ":end": aggregate_key(granularity, end_bucket),
+            },
+        }
+
+        items = []
+        try:
+            with METRICS.span("db.query_aggregates"):
+                while True:
+                    response = self.client.query(**params)
+                    items.extend(response.get("Items", []))
+                    last_key = response.get("LastEvaluatedKey")
+                    if not last_key:
+                        break
+                    params["ExclusiveStartKey"] = last_key
+        except Exception as e:
+            logger.error("Failed to query aggregates: %s", e)
+            raise DatabaseError(f"集計の取得に失敗しました: {str(e)}")
+
+        return items
 
     def health_check(self) -> bool:
         """データベース接続のヘルスチェック"""
@@ -98,5 +431,32 @@ class WeatherDatabase:
             self.table.table_status
             return True
         except Exception as e:
-            logger.error(f"Database health check failed: {e}")
+            logger.error("Database health check failed: %s", e)
             return False
+
+
+def encode_page_token(last_evaluated_key: Optional[dict]) -> Optional[str]:
+    """LastEvaluatedKey を継続トークン（URLセーフな文字列）に変換"""
+    if not last_evaluated_key:
+        return None
+    payload = {
+        "c": int(last_evaluated_key["CityId"]),
+        "t": str(last_evaluated_key["timestamp"]),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_page_token(token: str, city_id: int) -> dict:
+    """継続トークンを ExclusiveStartKey に戻す（別都市のトークンは不正とする）"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        key = {"CityId": int(payload["c"]), "timestamp": str(payload["t"])}
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValidationError(f"継続トークンが不正です: {e}")
+
+    if key["CityId"] != city_id:
+        raise ValidationError("継続トークンが都市IDと一致しません")
+    return key
+
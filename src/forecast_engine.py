@@ -0,0 +1,237 @@
+"""マルコフ連鎖による天気予報モジュール
+
+都市ごとに、連続する観測の天気タイプの遷移回数と天気タイプ別の降水確率を数え、
+遷移行列（天気タイプ×天気タイプ）に正規化して予報する。
+観測は observe で1件ずつ加算でき、遷移行列は次の予報時にまとめて作り直す。
+NumPy がある場合は全都市の N ステップ予報を行列演算でまとめて計算する。
+"""
+
+from typing import Iterable, Optional
+
+from models import WEATHER_TYPES
+# numpy は weather_generator と同様に予報・再計算の時点で読み込む
+from weather_generator import HAS_NUMPY, RAINFALL_BANDS
+
+# 遷移回数が少ない都市を全都市の遷移行列に寄せる強さ（擬似的な遷移回数）
+DEFAULT_SMOOTHING = 2.0
+
+
+class ForecastEngine:
+    """都市別の遷移行列を保持する予報エンジン
+
+    遷移行列の各行は (都市の遷移回数 + smoothing × 全都市の遷移確率) を正規化したもの。
+    全都市でも遷移がない天気タイプは一様分布とする。
+    """
+
+    def __init__(self, smoothing: float = DEFAULT_SMOOTHING, use_numpy: Optional[bool] = None):
+        if use_numpy is None:
+            use_numpy = HAS_NUMPY
+        if use_numpy and not HAS_NUMPY:
+            raise RuntimeError("numpy がインストールされていません")
+
+        self.smoothing = smoothing
+        self.use_numpy = use_numpy
+        self.weather_ids = list(WEATHER_TYPES)
+        self._state_index = {
+            weather_id: index for index, weather_id in enumerate(self.weather_ids)
+        }
+        self._name_index = {
+            name: self._state_index[weather_id] for weather_id, name in WEATHER_TYPES.items()
+        }
+        self._size = len(self.weather_ids)
+        # 観測がない天気タイプの降水確率は範囲の中央とする
+        self._default_rainfall = [
+            sum(RAINFALL_BANDS[weather_id]) / 2 for weather_id in self.weather_ids
+        ]
+
+        # 都市ID -> 行番号、行ごとの遷移回数・降水確率の合計と件数・最後の観測
+        self._rows: dict[int, int] = {}
+        self._transitions: list[list[list[int]]] = []
+        self._rainfall_sums: list[list[int]] = []
+        self._rainfall_counts: list[list[int]] = []
+        self._last: list[tuple[str, int]] = []
+        self._model = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def state_of(self, weather_id: Optional[int] = None, weather_name: str = "") -> Optional[int]:
+        """天気名（なければ天気ID）から状態番号を求める（不明な場合は None）"""
+        state = self._name_index.get(weather_name)
+        if state is None and weather_id is not None:
+            state = self._state_index.get(int(weather_id))
+        return state
+
+    def observe(self, city_id: int, timestamp: str, state: int, rainfall: int) -> bool:
+        """観測を1件加算する（都市の最後の観測より古い観測は無視し、False を返す）"""
+        row = self._rows.get(city_id)
+        if row is None:
+            row = self._rows[city_id] = len(self._last)
+            self._transitions.append([[0] * self._size for _ in range(self._size)])
+            self._rainfall_sums.append([0] * self._size)
+            self._rainfall_counts.append([0] * self._size)
+            self._last.append(("", -1))
+
+        last_timestamp, last_state = self._last[row]
+        if timestamp <= last_timestamp:
+            return False
+        if last_state >= 0:
+            self._transitions[row][last_state][state] += 1
+        self._rainfall_sums[row][state] += rainfall
+        self._rainfall_counts[row][state] += 1
+        self._last[row] = (timestamp, state)
+        self._model = None
+        return True
+
+    def observe_all(self, readings: Iterable[tuple]) -> int:
+        """(都市ID, timestamp, 天気ID, 天気名, 降水確率) を順に加算し、加算した件数を返す
+
+        都市ごとに timestamp の昇順で渡すこと。
+        """
+        added = 0
+        for city_id, timestamp, weather_id, weather_name, rainfall in readings:
+            state = self.state_of(weather_id, weather_name)
+            if state is not None and self.observe(city_id, timestamp, state, int(rainfall)):
+                added += 1
+        return added
+
+    def last_observation(self, city_id: int) -> Optional[tuple[str, int]]:
+        """都市の最後の観測 (timestamp, 状態番号)"""
+        row = self._rows.get(city_id)
+        return None if row is None else self._last[row]
+
+    def transition_matrix(self, city_id: int) -> list[list[float]]:
+        """都市の遷移行列（未観測の都市は全都市の遷移行列）"""
+        matrices, _, global_matrix = self._fit()
+        row = self._rows.get(city_id)
+        if row is None:
+            return [list(map(float, values)) for values in global_matrix]
+        return [list(map(float, values)) for values in matrices[row]]
+
+    def forecast(
+        self, current: dict[int, int], steps: int
+    ) -> dict[int, tuple[list[list[float]], list[float]]]:
+        """現在の状態から steps ステップ先までの予報を全都市分まとめて計算
+
+        current は 都市ID -> 状態番号。都市ごとに
+        (ステップごとの状態別の確率, ステップごとの降水確率の期待値)（1ステップ先から順）を返す。
+        """
+        if not current:
+            return {}
+        matrices, rainfall, global_matrix = self._fit()
+        compute = self._forecast_numpy if self.use_numpy else self._forecast_python
+        return compute(current, steps, matrices, rainfall, global_matrix)
+
+    def _fit(self):
+        """遷移行列と状態別の平均降水確率を作る（観測が増えるまで再利用する）"""
+        if self._model is None:
+            fit = self._fit_numpy if self.use_numpy else self._fit_python
+            self._model = fit()
+        return self._model
+
+    def _fit_python(self):
+        size = self._size
+        totals = [[0] * size for _ in range(size)]
+        for transitions in self._transitions:
+            for source in range(size):
+                for target in range(size):
+                    totals[source][target] += transitions[source][target]
+        global_matrix = [_normalize(values, [1.0 / size] * size, 0.0) for values in totals]
+
+        matrices = [
+            [
+                _normalize(transitions[source], global_matrix[source], self.smoothing)
+                for source in range(size)
+            ]
+            for transitions in self._transitions
+        ]
+        rainfall = [
+            [
+                sums[state] / counts[state] if counts[state] else self._default_rainfall[state]
+                for state in range(size)
+            ]
+            for sums, counts in zip(self._rainfall_sums, self._rainfall_counts)
+        ]
+        return matrices, rainfall, global_matrix
+
+    def _fit_numpy(self):
+        import numpy as np
+
+        size = self._size
+        transitions = np.array(self._transitions, dtype=np.float64).reshape(-1, size, size)
+        totals = transitions.sum(axis=0)
+        row_totals = totals.sum(axis=1, keepdims=True)
+        global_matrix = np.where(
+            row_totals > 0, totals / np.maximum(row_totals, 1), 1.0 / size
+        )
+
+        smoothed = transitions + self.smoothing * global_matrix
+        smoothed_totals = smoothed.sum(axis=2, keepdims=True)
+        matrices = np.where(
+            smoothed_totals > 0,
+            smoothed / np.where(smoothed_totals > 0, smoothed_totals, 1),
+            global_matrix,
+        )
+
+        sums = np.array(self._rainfall_sums, dtype=np.float64).reshape(-1, size)
+        counts = np.array(self._rainfall_counts, dtype=np.float64).reshape(-1, size)
+        rainfall = np.where(
+            counts > 0, sums / np.maximum(counts, 1), np.array(self._default_rainfall)
+        )
+        return matrices, rainfall, global_matrix
+
+    def _forecast_python(self, current, steps, matrices, rainfall, global_matrix):
+        size = self._size
+        results = {}
+        for city_id, state in current.items():
+            row = self._rows.get(city_id)
+            matrix = global_matrix if row is None else matrices[row]
+            means = self._default_rainfall if row is None else rainfall[row]
+            probabilities = [0.0] * size
+            probabilities[state] = 1.0
+            history = []
+            expected = []
+            for _ in range(steps):
+                probabilities = [
+                    sum(probabilities[source] * matrix[source][target] for source in range(size))
+                    for target in range(size)
+                ]
+                history.append(probabilities)
+                expected.append(sum(p * mean for p, mean in zip(probabilities, means)))
+            results[city_id] = (history, expected)
+        return results
+
+    def _forecast_numpy(self, current, steps, matrices, rainfall, global_matrix):
+        import numpy as np
+
+        city_ids = list(current)
+        size = self._size
+        # 未観測の都市は全都市の遷移行列・既定の降水確率を使う（末尾に1行追加）
+        fallback = len(matrices)
+        stacked = np.concatenate([matrices, global_matrix[np.newaxis]])
+        means = np.concatenate([rainfall, np.array([self._default_rainfall])])
+        rows = np.array([self._rows.get(city_id, fallback) for city_id in city_ids])
+
+        city_matrices = stacked[rows]
+        city_means = means[rows]
+        probabilities = np.zeros((len(city_ids), size))
+        probabilities[np.arange(len(city_ids)), [current[city_id] for city_id in city_ids]] = 1.0
+
+        # 全都市の確率ベクトルに遷移行列を一括で掛ける（ステップごとに都市数×状態数²）
+        history = np.empty((len(city_ids), steps, size))
+        for step in range(steps):
+            probabilities = np.einsum("ck,ckj->cj", probabilities, city_matrices)
+            history[:, step] = probabilities
+        expected = np.einsum("csk,ck->cs", history, city_means)
+
+        # 配列からリストへの変換は都市×ステップ単位ではなくまとめて行う
+        return dict(zip(city_ids, zip(history.tolist(), expected.tolist())))
+
+
+def _normalize(values: list, prior: list, weight: float) -> list[float]:
+    """回数に weight × prior を加えて確率に正規化（合計が0なら prior）"""
+    smoothed = [value + weight * p for value, p in zip(values, prior)]
+    total = sum(smoothed)
+    if total <= 0:
+        return list(prior)
+    return [value / total for value in smoothed]
@@ -1,30 +1,84 @@
 """データモデル定義"""
 
+import base64
+import gzip
 import json
-from dataclasses import dataclass
+import os
+import re
+from array import array
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from functools import partial
+from typing import Iterable, Iterator, Optional
 
+from city_registry import CityRegistry, load_configured_cities
+from derived_items import rainfall_decimal
+from metrics import METRICS
 
-class DecimalEncoder(json.JSONEncoder):
-    """DynamoDBのDecimal型をJSONシリアライズ可能にするエンコーダー"""
 
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return int(obj) if obj % 1 == 0 else float(obj)
-        return super().default(obj)
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson は任意依存
+    orjson = None
 
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli は任意依存
+    brotli = None
 
-# 都市マスターデータ
-CITIES = {
-    1: "札幌",
-    13: "東京",
-    23: "名古屋",
-    27: "大阪",
-    40: "博多",
+
+def _decimal_default(obj):
+    """JSON化できない値の変換（DB読み取り時に正規化されなかったDecimalのみ）"""
+    if isinstance(obj, Decimal):
+        integral = obj.to_integral_value()
+        return int(integral) if integral == obj else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# 使い回すエンコーダー（呼び出しごとのエンコーダー生成を避ける）
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, default=_decimal_default)
+
+
+def encode_json(body) -> str:
+    """レスポンスボディをJSON文字列に変換（orjson があれば使用）"""
+    if orjson is not None:
+        return orjson.dumps(
+            body, default=_decimal_default, option=orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+    return _JSON_ENCODER.encode(body)
+
+
+# 全レスポンス共通のヘッダー（共有するため変更しないこと）
+# 圧縮するかはボディの大きさと Accept・Accept-Encoding で決まるため、小さいボディや 304 にも
+# Vary を付け、キャッシュがこれらのヘッダーごとに区別できるようにする
+DEFAULT_HEADERS = {
+    "Content-Type": "application/json; charset=utf-8",
+    "Vary": "Accept, Accept-Encoding",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+    "Access-Control-Expose-Headers": "ETag",
 }
 
+# 圧縮するレスポンスボディの最小サイズ（バイト。これより小さいボディはそのまま返す）
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+
+# 圧縮レベル（応答時間を優先して最大より低くする）
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _city_table():
+    """都市パーティションを読むテーブル（CITY_REGISTRY_SOURCE=table の場合のみ使う）"""
+    from aws_clients import get_resource
+
+    return get_resource("dynamodb").Table(os.environ.get("TABLE_NAME", "weather-data"))
+
+
+# 都市マスターデータ（都市ID -> 都市名。初回アクセス時に shared/data/cities.csv などから読み込む）
+CITIES = CityRegistry(loader=partial(load_configured_cities, _city_table))
+
 # 天気タイプマスターデータ
 WEATHER_TYPES = {
     1: "晴れ",
@@ -33,7 +87,7 @@ WEATHER_TYPES = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class WeatherData:
     """天気データモデル"""
 
@@ -74,6 +128,134 @@ class WeatherData:
         )
 
 
+@dataclass
+class WeatherBatch:
+    """複数の天気データを列ごとに保持するコンテナ
+
+    数値列は array に格納し、WeatherData を大量に保持する場合より
+    メモリ使用量と変換コストを抑える。ttl が未設定の行は 0 で表す。
+    """
+
+    city_ids: array = field(default_factory=lambda: array("i"))
+    weather_ids: array = field(default_factory=lambda: array("h"))
+    rainfall_probabilities: array = field(default_factory=lambda: array("h"))
+    ttls: array = field(default_factory=lambda: array("q"))
+    city_names: list[str] = field(default_factory=list)
+    weather_names: list[str] = field(default_factory=list)
+    timestamps: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.city_ids)
+
+    def __iter__(self) -> Iterator[WeatherData]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index: int) -> WeatherData:
+        ttl = self.ttls[index]
+        return WeatherData(
+            city_id=self.city_ids[index],
+            city_name=self.city_names[index],
+            weather_id=self.weather_ids[index],
+            weather_name=self.weather_names[index],
+            rainfall_probability=self.rainfall_probabilities[index],
+            timestamp=self.timestamps[index],
+            ttl=ttl or None,
+        )
+
+    def append(self, weather_data: WeatherData) -> None:
+        """1件追加"""
+        self.city_ids.append(weather_data.city_id)
+        self.weather_ids.append(weather_data.weather_id)
+        self.rainfall_probabilities.append(weather_data.rainfall_probability)
+        self.ttls.append(weather_data.ttl or 0)
+        self.city_names.append(weather_data.city_name)
+        self.weather_names.append(weather_data.weather_name)
+        self.timestamps.append(weather_data.timestamp)
+
+    @classmethod
+    def from_weather_list(cls, weather_list: Iterable[WeatherData]) -> "WeatherBatch":
+        """WeatherData のリストから生成"""
+        batch = cls()
+        for weather_data in weather_list:
+            batch.append(weather_data)
+        return batch
+
+    @classmethod
+    def from_items(cls, items: Iterable[dict]) -> "WeatherBatch":
+        """DynamoDB項目（またはAPI辞書）のリストから生成"""
+        batch = cls()
+        for item in items:
+            ttl_value = item.get("ttl")
+            batch.city_ids.append(int(item.get("CityId", 0)))
+            batch.weather_ids.append(int(item.get("WeatherId", 0)))
+            batch.rainfall_probabilities.append(int(item.get("RainfallProbability", 0)))
+            batch.ttls.append(int(ttl_value) if ttl_value is not None else 0)
+            batch.city_names.append(item.get("CityName", ""))
+            batch.weather_names.append(item.get("WeatherName", ""))
+            batch.timestamps.append(item.get("timestamp", ""))
+        return batch
+
+    def exclude_keys(self, keys: set[tuple[int, str]]) -> "WeatherBatch":
+        """(都市ID, timestamp) が keys に含まれる行を除いたバッチ（keys が空ならそのまま）"""
+        if not keys:
+            return self
+        indexes = [
+            index
+            for index, key in enumerate(zip(self.city_ids, self.timestamps))
+            if key not in keys
+        ]
+        return WeatherBatch(
+            city_ids=array("i", (self.city_ids[index] for index in indexes)),
+            weather_ids=array("h", (self.weather_ids[index] for index in indexes)),
+            rainfall_probabilities=array(
+                "h", (self.rainfall_probabilities[index] for index in indexes)
+            ),
+            ttls=array("q", (self.ttls[index] for index in indexes)),
+            city_names=[self.city_names[index] for index in indexes],
+            weather_names=[self.weather_names[index] for index in indexes],
+            timestamps=[self.timestamps[index] for index in indexes],
+        )
+
+    def to_dicts(self) -> list[dict]:
+        """API用の辞書リストに変換（WeatherData.to_dict と同じ形式）"""
+        results = []
+        for city_id, city_name, weather_id, weather_name, rainfall, timestamp, ttl in zip(
+            self.city_ids,
+            self.city_names,
+            self.weather_ids,
+            self.weather_names,
+            self.rainfall_probabilities,
+            self.timestamps,
+            self.ttls,
+        ):
+            result = {
+                "CityId": city_id,
+                "CityName": city_name,
+                "WeatherId": weather_id,
+                "WeatherName": weather_name,
+                "RainfallProbability": rainfall,
+                "timestamp": timestamp,
+            }
+            if ttl:
+                result["ttl"] = ttl
+            results.append(result)
+        return results
+
+    def to_items(self) -> list[dict]:
+        """DynamoDB項目のリストに変換（数値はDecimal）"""
+        ttl_decimals: dict[int, Decimal] = {}
+        items = self.to_dicts()
+        for item in items:
+            item["RainfallProbability"] = rainfall_decimal(item["RainfallProbability"])
+            ttl = item.get("ttl")
+            if ttl:
+                if ttl not in ttl_decimals:
+                    ttl_decimals[ttl] = Decimal(ttl)
+                item["ttl"] = ttl_decimals[ttl]
+        return items
+
+
 @dataclass
 class ApiResponse:
     """APIレスポンスモデル"""
@@ -84,20 +266,164 @@ class ApiResponse:
 
     def to_lambda_response(self) -> dict:
         """Lambda形式のレスポンスに変換"""
+        with METRICS.span("encode"):
+            body = encode_json(self.body)
         response = {
             "statusCode": self.status_code,
-            "body": json.dumps(self.body, ensure_ascii=False, cls=DecimalEncoder),
-            "headers": self.headers
-            or {
-                "Content-Type": "application/json; charset=utf-8",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization",
-                "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
-            },
+            "body": body,
+            "headers": self.headers or DEFAULT_HEADERS,
         }
         return response
 
 
+# API Gateway の BinaryMediaTypes（template.yaml と合わせること）
+# Lambdaプロキシ統合では、リクエストの Accept の先頭のメディアタイプがこれに一致する場合のみ
+# isBase64Encoded のボディをバイナリに戻すため、それ以外のリクエストには圧縮して返さない
+BINARY_MEDIA_TYPES = frozenset({"application/json"})
+
+
+def accepts_binary(accept: Optional[str]) -> bool:
+    """Accept の先頭のメディアタイプが BINARY_MEDIA_TYPES に含まれるか"""
+    if not accept:
+        return False
+    media_type = accept.split(",", 1)[0].split(";", 1)[0].strip().lower()
+    return media_type in BINARY_MEDIA_TYPES
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding から圧縮形式（br / gzip）を選ぶ（圧縮しない場合は None）
+
+    q 値が最も大きい形式を選び、同じ場合は br を優先する（brotli がある場合のみ）。
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress_response(
+    response: dict,
+    accept_encoding: Optional[str],
+    min_bytes: int = COMPRESSION_MIN_BYTES,
+) -> dict:
+    """Lambda形式のレスポンスのボディを圧縮し、base64 にした isBase64Encoded のレスポンスを返す
+
+    min_bytes 未満のボディ、クライアントが圧縮を受け付けない場合、圧縮で小さくならない場合は
+    そのまま返す。圧縮したレスポンスの ETag は弱い ETag にする。
+    """
+    body = response.get("body")
+    # UTF-8 は1文字4バイト以下のため、文字数で明らかに小さいボディはエンコードせずに返す
+    if not body or response.get("isBase64Encoded") or len(body) * 4 < min_bytes:
+        return response
+    data = body.encode("utf-8")
+    if len(data) < min_bytes:
+        return response
+
+    headers = {**response["headers"], "Vary": "Accept, Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return {**response, "headers": headers}
+
+    with METRICS.span("compress"):
+        if encoding == "br":
+            compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(data):
+        return {**response, "headers": headers}
+
+    headers["Content-Encoding"] = encoding
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+    return {
+        **response,
+        "body": base64.b64encode(compressed).decode("ascii"),
+        "headers": headers,
+        "isBase64Encoded": True,
+    }
+
+
+class PrecompiledResponse:
+    """ボディを一度だけJSON化して使い回すレスポンス
+
+    body 内の値に placeholder(name) を置くと、その部分だけをリクエストごとに
+    差し込める（ボディ全体は再エンコードしない）。
+    """
+
+    def __init__(self, status_code: int, body: dict, headers: Optional[dict] = None):
+        self.status_code = status_code
+        self.headers = headers or DEFAULT_HEADERS
+
+        # JSON化した目印 "\u0000name\u0000" の位置で分割する
+        escaped_nul = re.escape(encode_json("\x00")[1:-1])
+        pattern = f'"{escaped_nul}(\\w+){escaped_nul}"'
+        pieces = re.split(pattern, encode_json(body))
+        self._parts: list[str] = pieces[0::2]
+        self._names: list[str] = pieces[1::2]
+
+    @staticmethod
+    def placeholder(name: str) -> str:
+        """リクエストごとに差し込む値の目印"""
+        return f"\x00{name}\x00"
+
+    def to_lambda_response(self, **values) -> dict:
+        """Lambda形式のレスポンスに変換（目印の箇所に values をJSON化して差し込む）"""
+        if self._names:
+            pieces = [self._parts[0]]
+            for name, part in zip(self._names, self._parts[1:]):
+                pieces.append(encode_json(values.get(name)))
+                pieces.append(part)
+            body = "".join(pieces)
+        else:
+            body = self._parts[0]
+
+        return {
+            "statusCode": self.status_code,
+            "body": body,
+            "headers": self.headers,
+        }
+
+    @classmethod
+    def error(cls, status_code: int, code: str, message: str) -> "PrecompiledResponse":
+        """ErrorResponse と同じ形式のエラーレスポンス（timestamp と request_id を差し込む）"""
+        return cls(
+            status_code,
+            {
+                "error": {
+                    "code": code,
+                    "message": message,
+                    "timestamp": cls.placeholder("timestamp"),
+                    "request_id": cls.placeholder("request_id"),
+                }
+            },
+        )
+
+    def to_error_response(self, request_id: Optional[str] = None) -> dict:
+        """エラーレスポンスをLambda形式に変換"""
+        return self.to_lambda_response(
+            timestamp=datetime.utcnow().isoformat(), request_id=request_id or ""
+        )
+
+
 @dataclass
 class ErrorResponse:
     """エラーレスポンスモデル"""
@@ -0,0 +1,69 @@
+"""APIルーティングモジュール"""
+
+import re
+from typing import Callable, Optional
+
+from auth_middleware import require_auth
+
+# パステンプレート中のパラメータ（例: /weather/{city_id}、/weather/{city_id:int}）
+_PARAMETER_PATTERN = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+
+# パラメータの型ごとに一致させるセグメント（型の指定がなければ任意の1セグメント）
+_PARAMETER_TYPES = {"int": r"\d+"}
+
+
+class Router:
+    """メソッドとパスからハンドラーを解決するルーター
+
+    モジュール読み込み時に一度だけ構築する。静的パスは辞書で定数時間に解決し、
+    テンプレート（{name} を含むパス）は静的パスで見つからない場合のみ照合する。
+    """
+
+    def __init__(self):
+        self._static: dict[str, Callable] = {}
+        self._templates: dict[str, list[tuple[re.Pattern, Callable]]] = {}
+
+    def add(
+        self, method: str, path: str, handler: Callable, auth: bool = False
+    ) -> None:
+        """ルートを登録（auth=True の場合は require_auth を適用）"""
+        if auth:
+            handler = require_auth(handler)
+
+        if "{" not in path:
+            self._static[f"{method} {path}"] = handler
+            return
+
+        self._templates.setdefault(method, []).append((_compile(path), handler))
+
+    def resolve(self, method: str, path: str) -> Optional[tuple[Callable, dict]]:
+        """(ハンドラー, パスパラメータ) を返す（該当なしは None）"""
+        handler = self._static.get(f"{method} {path}")
+        if handler is not None:
+            return handler, {}
+
+        for regex, handler in self._templates.get(method, ()):
+            match = regex.match(path)
+            if match:
+                return handler, match.groupdict()
+
+        return None
+
+
+def _compile(path: str) -> re.Pattern:
+    """パステンプレートを正規表現に変換（パラメータは1セグメントに一致）
+
+    {name:int} は数字のみのセグメントに一致し、それ以外のパスは該当なし（404）になる。
+    """
+    segments = []
+    for segment in path.split("/"):
+        match = _PARAMETER_PATTERN.match(segment)
+        if match:
+            name, type_name = match.groups()
+            if type_name is not None and type_name not in _PARAMETER_TYPES:
+                raise ValueError(f"未対応のパラメータ型です: {type_name}")
+            pattern = _PARAMETER_TYPES.get(type_name, r"[^/]+")
+            segments.append(f"(?P<{name}>{pattern})")
+        else:
+            segments.append(re.escape(segment))
+    return re.compile("^" + "/".join(segments) + "$")
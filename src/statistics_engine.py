@@ -0,0 +1,227 @@
+"""列指向の統計計算モジュール
+
+都市ID・天気コード・降水確率の列（array / NumPy 配列）から、全体と都市別の
+天気分布・平均・パーセンタイル・雨の時間数をまとめて計算する。
+NumPy がある場合はベクトル演算で、ない場合は同じ結果になる純Python実装で計算する。
+"""
+
+import importlib.util
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from models import WeatherBatch
+
+# numpy は任意依存（import に 60〜70 ms かかる）。統計を計算しないリクエストの
+# コールドスタートを遅くしないよう、ここでは有無だけを確認し、計算時に読み込む
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+# 雨とみなす降水確率（%）の下限。観測は1時間ごとを想定し、該当する観測数を雨の時間数とする
+RAINY_THRESHOLD = 50
+
+# 算出するパーセンタイル
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class WeatherColumns:
+    """統計計算用の列データ
+
+    weather_codes は labels のインデックス（天気名を出現順に番号付けしたもの）。
+    """
+
+    city_ids: array = field(default_factory=lambda: array("i"))
+    weather_codes: array = field(default_factory=lambda: array("h"))
+    rainfall_probabilities: array = field(default_factory=lambda: array("h"))
+    labels: list[str] = field(default_factory=list)
+    _label_index: dict[str, int] = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.city_ids)
+
+    def _code(self, weather_name: str) -> int:
+        code = self._label_index.get(weather_name)
+        if code is None:
+            code = self._label_index[weather_name] = len(self.labels)
+            self.labels.append(weather_name)
+        return code
+
+    @classmethod
+    def from_batch(cls, batch: WeatherBatch) -> "WeatherColumns":
+        """WeatherBatch から生成（数値列はコピーのみ）"""
+        columns = cls(
+            city_ids=array("i", batch.city_ids),
+            rainfall_probabilities=array("h", batch.rainfall_probabilities),
+        )
+        columns.weather_codes = array("h", map(columns._code, batch.weather_names))
+        return columns
+
+    def extend_items(self, items: Iterable[dict], city_id: Optional[int] = None) -> None:
+        """DynamoDB項目（履歴クエリの1ページなど）を追加
+
+        city_id を指定した場合は項目の CityId の代わりに使う（射影で読まない場合）。
+        """
+        for item in items:
+            self.city_ids.append(city_id if city_id is not None else int(item["CityId"]))
+            self.weather_codes.append(self._code(item.get("WeatherName", "")))
+            self.rainfall_probabilities.append(int(item.get("RainfallProbability", 0)))
+
+
+def compute_statistics(
+    columns: WeatherColumns,
+    percentiles: tuple = DEFAULT_PERCENTILES,
+    per_city: bool = True,
+    use_numpy: Optional[bool] = None,
+) -> dict:
+    """全体（と都市別）の統計を計算
+
+    weather_distribution は天気名の出現順、平均とパーセンタイルは小数第1位に丸める。
+    use_numpy を省略した場合は NumPy があれば使う。
+    """
+    if use_numpy is None:
+        use_numpy = HAS_NUMPY
+    if use_numpy and not HAS_NUMPY:
+        raise RuntimeError("numpy がインストールされていません")
+
+    compute = _compute_numpy if use_numpy else _compute_python
+    return compute(columns, percentiles, per_city)
+
+
+def _summary(
+    count: int,
+    distribution: dict,
+    rainfall_sum: int,
+    percentile_values: dict,
+    rainy: int,
+) -> dict:
+    return {
+        "readings": count,
+        "weather_distribution": distribution,
+        "average_rainfall": round(rainfall_sum / count, 1) if count else 0,
+        "rainfall_percentiles": percentile_values,
+        "rainy_hours": rainy,
+    }
+
+
+def _interpolate(sorted_values, percent: float) -> float:
+    """線形補間によるパーセンタイル（NumPy の既定と同じ定義）"""
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    low_value = sorted_values[lower]
+    return low_value + (sorted_values[upper] - low_value) * (position - lower)
+
+
+def _compute_python(columns: WeatherColumns, percentiles: tuple, per_city: bool) -> dict:
+    labels = columns.labels
+    rainfall = columns.rainfall_probabilities
+    # 天気分布は全体での初出順に並べる（都市別も同じ順序）
+    appearance = list(dict.fromkeys(columns.weather_codes))
+
+    def summarize(codes, values) -> dict:
+        counts = Counter(codes)
+        ordered = sorted(values)
+        return _summary(
+            len(values),
+            {labels[code]: counts[code] for code in appearance if counts[code]},
+            sum(values),
+            {
+                f"p{percent}": round(_interpolate(ordered, percent), 1)
+                for percent in percentiles
+            }
+            if ordered
+            else {},
+            sum(1 for value in values if value >= RAINY_THRESHOLD),
+        )
+
+    result = summarize(columns.weather_codes, rainfall)
+    if per_city:
+        groups: dict[int, tuple[list, list]] = {}
+        for city_id, code, value in zip(columns.city_ids, columns.weather_codes, rainfall):
+            codes, values = groups.setdefault(city_id, ([], []))
+            codes.append(code)
+            values.append(value)
+        result["cities"] = {
+            city_id: summarize(*groups[city_id]) for city_id in sorted(groups)
+        }
+    return result
+
+
+def _compute_numpy(columns: WeatherColumns, percentiles: tuple, per_city: bool) -> dict:
+    import numpy as np
+
+    labels = columns.labels
+    codes = np.frombuffer(columns.weather_codes, dtype=np.int16).astype(np.intp)
+    rainfall = np.frombuffer(columns.rainfall_probabilities, dtype=np.int16).astype(np.int64)
+    count = len(rainfall)
+
+    if count == 0:
+        result = _summary(0, {}, 0, {}, 0)
+        if per_city:
+            result["cities"] = {}
+        return result
+
+    # 天気コードを全体での初出順に並べる（都市別も同じ順序）
+    unique_codes, first_index = np.unique(codes, return_index=True)
+    appearance = unique_codes[np.argsort(first_index)]
+    code_counts = np.bincount(codes, minlength=len(labels))
+    rainy = rainfall >= RAINY_THRESHOLD
+    ordered = np.sort(rainfall)
+
+    result = _summary(
+        count,
+        {labels[code]: int(code_counts[code]) for code in appearance},
+        int(rainfall.sum()),
+        {
+            f"p{percent}": round(float(_interpolate(ordered, percent)), 1)
+            for percent in percentiles
+        },
+        int(rainy.sum()),
+    )
+    if not per_city:
+        return result
+
+    city_ids, city_index, city_counts = np.unique(
+        np.frombuffer(columns.city_ids, dtype=np.int32),
+        return_inverse=True,
+        return_counts=True,
+    )
+    city_total = len(city_ids)
+    label_total = len(labels)
+
+    # 都市×天気コードの件数、都市ごとの降水確率合計・雨の件数
+    pair_counts = np.bincount(
+        city_index * label_total + codes, minlength=city_total * label_total
+    ).reshape(city_total, label_total)
+    rainfall_sums = np.bincount(city_index, weights=rainfall, minlength=city_total)
+    rainy_counts = np.bincount(city_index, weights=rainy, minlength=city_total)
+
+    # 都市ごとに降水確率を昇順に並べ、各都市の区間内で線形補間する
+    grouped = rainfall[np.lexsort((rainfall, city_index))]
+    starts = np.cumsum(city_counts) - city_counts
+    city_percentiles = {}
+    for percent in percentiles:
+        position = (city_counts - 1) * percent / 100
+        lower = position.astype(np.int64)
+        upper = np.minimum(lower + 1, city_counts - 1)
+        low_value = grouped[starts + lower]
+        city_percentiles[percent] = low_value + (grouped[starts + upper] - low_value) * (
+            position - lower
+        )
+
+    cities = {}
+    for row, city_id in enumerate(city_ids.tolist()):
+        city_codes = pair_counts[row]
+        cities[city_id] = _summary(
+            int(city_counts[row]),
+            {labels[code]: int(city_codes[code]) for code in appearance if city_codes[code]},
+            int(rainfall_sums[row]),
+            {
+                f"p{percent}": round(float(values[row]), 1)
+                for percent, values in city_percentiles.items()
+            },
+            int(rainy_counts[row]),
+        )
+    result["cities"] = cities
+    return result
@@ -0,0 +1,223 @@
+"""合成天気データの一括生成モジュール
+
+都市×時刻の観測値を列単位でまとめて生成する。天気タイプは一様に選び、
+降水確率は天気タイプごとの範囲（RAINFALL_BANDS）から選ぶ。
+NumPy がある場合は乱数をベクトル演算で、ない場合は random.Random で生成する
+（同じ seed・同じ実装であれば同じデータになる）。
+"""
+
+import csv
+import importlib.util
+import math
+import os
+import random
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, Mapping, Optional
+
+from models import WEATHER_TYPES, WeatherBatch, WeatherData
+
+# numpy は任意依存。生成器は API の import 時に作られ、numpy の import（60〜70 ms）が
+# コールドスタートに上乗せされるため、ここでは有無だけを確認し、生成時に読み込む
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+# 天気タイプごとの降水確率（%）の範囲（両端を含む）
+RAINFALL_BANDS = {
+    1: (0, 20),  # 晴れ
+    2: (20, 50),  # くもり
+    3: (50, 100),  # 雨
+}
+
+# iter_batches が1バッチに含める最大行数（時刻単位で区切る）
+DEFAULT_BATCH_ROWS = 10000
+
+# CSV出力の1ファイルあたりの行数
+DEFAULT_CSV_ROWS_PER_FILE = 100000
+
+
+class WeatherGenerator:
+    """シード指定可能な合成天気データ生成器"""
+
+    def __init__(self, seed: Optional[int] = None, use_numpy: Optional[bool] = None):
+        if use_numpy is None:
+            use_numpy = HAS_NUMPY
+        if use_numpy and not HAS_NUMPY:
+            raise RuntimeError("numpy がインストールされていません")
+
+        self.use_numpy = use_numpy
+        self._seed = seed
+        # NumPy の乱数生成器は初回の生成時に作る（生成しないLambdaでは numpy を読み込まない）
+        self._rng = None if use_numpy else random.Random(seed)
+        self._weather_ids = list(WEATHER_TYPES)
+        self._weather_names = [WEATHER_TYPES[weather_id] for weather_id in self._weather_ids]
+        self._bands = [RAINFALL_BANDS[weather_id] for weather_id in self._weather_ids]
+        if not use_numpy:
+            self._build_cells()
+
+    def generate(
+        self, cities: Mapping[int, str], timestamp: str, ttl: Optional[int] = None
+    ) -> WeatherBatch:
+        """1時刻分（都市ごとに1件）の観測値を生成"""
+        city_ids = list(cities)
+        return self._build(
+            city_ids, [cities[city_id] for city_id in city_ids], [timestamp], ttl or 0
+        )
+
+    def iter_batches(
+        self,
+        cities: Mapping[int, str],
+        start: datetime,
+        steps: int,
+        interval: timedelta = timedelta(hours=1),
+        ttl: Optional[int] = None,
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+    ) -> Iterator[WeatherBatch]:
+        """start から interval ごとに steps 時刻分の観測値を、時刻単位で区切ったバッチで返す
+
+        1バッチは batch_rows 行以下（都市数が batch_rows を超える場合は1時刻分）。
+        """
+        city_ids = list(cities)
+        city_names = [cities[city_id] for city_id in city_ids]
+        steps_per_batch = max(1, batch_rows // max(1, len(city_ids)))
+
+        for first in range(0, steps, steps_per_batch):
+            timestamps = [
+                (start + interval * step).isoformat()
+                for step in range(first, min(first + steps_per_batch, steps))
+            ]
+            yield self._build(city_ids, city_names, timestamps, ttl or 0)
+
+    def _build(
+        self, city_ids: list[int], city_names: list[str], timestamps: list[str], ttl: int
+    ) -> WeatherBatch:
+        """都市×時刻（時刻が外側）の行を生成"""
+        rows = len(city_ids) * len(timestamps)
+        draw = self._draw_numpy if self.use_numpy else self._draw_python
+        type_indexes, rainfall = draw(rows)
+
+        batch = WeatherBatch(
+            city_ids=array("i", city_ids * len(timestamps)),
+            rainfall_probabilities=rainfall,
+            ttls=array("q", [ttl]) * rows,
+            city_names=city_names * len(timestamps),
+            timestamps=[timestamp for timestamp in timestamps for _ in city_ids],
+        )
+        weather_ids = self._weather_ids
+        weather_names = self._weather_names
+        batch.weather_ids = array("h", [weather_ids[index] for index in type_indexes])
+        batch.weather_names = [weather_names[index] for index in type_indexes]
+        return batch
+
+    def _build_cells(self) -> None:
+        """(天気タイプ, 降水確率) の組を等確率のセルに展開する
+
+        天気タイプは一様、降水確率はタイプの範囲内で一様になるよう、各組を
+        範囲の幅に反比例した数だけ並べる。1行あたり乱数1回で両方を選べる。
+        """
+        spans = [high - low + 1 for low, high in self._bands]
+        cells_per_type = math.lcm(*spans)
+        self._cell_types: list[int] = []
+        self._cell_rainfall: list[int] = []
+        self._cells: list[int] = []
+        for index, (low, high) in enumerate(self._bands):
+            for value in range(low, high + 1):
+                self._cells.extend([len(self._cell_types)] * (cells_per_type // spans[index]))
+                self._cell_types.append(index)
+                self._cell_rainfall.append(value)
+
+    def _draw_python(self, rows: int) -> tuple[list[int], array]:
+        codes = self._rng.choices(self._cells, k=rows)
+        cell_types = self._cell_types
+        cell_rainfall = self._cell_rainfall
+        type_indexes = [cell_types[code] for code in codes]
+        rainfall = array("h", [cell_rainfall[code] for code in codes])
+        return type_indexes, rainfall
+
+    def _draw_numpy(self, rows: int) -> tuple[list[int], array]:
+        import numpy as np
+
+        if self._rng is None:
+            self._rng = np.random.default_rng(self._seed)
+        type_indexes = self._rng.integers(0, len(self._weather_ids), size=rows)
+        bands = np.array(self._bands, dtype=np.int64)
+        values = self._rng.integers(
+            bands[type_indexes, 0], bands[type_indexes, 1], endpoint=True
+        )
+        rainfall = array("h")
+        rainfall.frombytes(values.astype(np.int16).tobytes())
+        return type_indexes.tolist(), rainfall
+
+
+def write_batches(
+    batches: Iterable[WeatherBatch],
+    database,
+    update_snapshot: bool = True,
+    update_aggregates: bool = True,
+) -> tuple[int, int]:
+    """バッチを順に WeatherDatabase へ保存し、(成功件数, 失敗件数) を返す
+
+    集計項目はバッチごとに保存できた行を加算し、スナップショットは最後に
+    都市ごとの保存できた最新の行で更新する（バッチは時刻順に渡すこと）。
+    """
+    success_count = 0
+    error_count = 0
+    latest: dict[int, WeatherData] = {}
+    for batch in batches:
+        saved = database.save_weather_batch(batch)
+        success_count += len(saved)
+        error_count += len(batch) - len(saved)
+        if update_aggregates and saved:
+            database.update_aggregates(saved)
+        if update_snapshot:
+            last_rows = dict(zip(saved.city_ids, range(len(saved))))
+            latest.update((city_id, saved[index]) for city_id, index in last_rows.items())
+
+    if latest:
+        database.update_latest_snapshot(list(latest.values()))
+    return success_count, error_count
+
+
+def write_csv_files(
+    batches: Iterable[WeatherBatch],
+    directory: str,
+    prefix: str = "weather",
+    rows_per_file: int = DEFAULT_CSV_ROWS_PER_FILE,
+) -> list[str]:
+    """バッチを csv_ingest の形式（ヘッダーなし）のCSVファイルに書き出し、パスのリストを返す
+
+    csv_ingest は取り込み時刻を timestamp とするため、生成した時刻は出力しない。
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths: list[str] = []
+    f = None
+    writer = None
+    rows_in_file = 0
+
+    try:
+        for batch in batches:
+            rows = zip(
+                batch.city_ids,
+                batch.city_names,
+                batch.weather_ids,
+                batch.weather_names,
+                batch.rainfall_probabilities,
+            )
+            remaining = len(batch)
+            while remaining:
+                if writer is None or rows_in_file >= rows_per_file:
+                    if f is not None:
+                        f.close()
+                    path = os.path.join(directory, f"{prefix}-{len(paths) + 1:05d}.csv")
+                    f = open(path, "w", encoding="utf-8", newline="")
+                    writer = csv.writer(f, lineterminator="\n")
+                    paths.append(path)
+                    rows_in_file = 0
+                count = min(remaining, rows_per_file - rows_in_file)
+                writer.writerows(islice(rows, count))
+                rows_in_file += count
+                remaining -= count
+    finally:
+        if f is not None:
+            f.close()
+    return paths
@@ -1,13 +1,24 @@
 """Lambda メインハンドラー - APIルーティング"""
 
-import json
+import functools
 import logging
-from typing import Callable
-
-from models import ApiResponse, ErrorResponse
+import zlib
+from typing import Callable, Optional
+
+import structured_logging
+from metrics import METRICS
+from models import (
+    ApiResponse,
+    ErrorResponse,
+    PrecompiledResponse,
+    CITIES,
+    DEFAULT_HEADERS,
+    accepts_binary,
+    compress_response,
+)
 from weather_service import WeatherService
-from auth_middleware import require_auth
-from exceptions import WeatherSystemError, WeatherDataError
+from router import Router
+from exceptions import WeatherSystemError, WeatherDataError, ValidationError
 
 # ロギング設定
 logger = logging.getLogger()
@@ -16,50 +27,193 @@ logger.setLevel(logging.INFO)
 # サービスインスタンス
 weather_service = WeatherService()
 
+# 静的なレスポンス（コンテナごとに一度だけJSON化する）
+_OPTIONS_RESPONSE = PrecompiledResponse(status_code=200, body={})
+_WEATHER_TYPES_RESPONSE = PrecompiledResponse(
+    status_code=200,
+    body={
+        "success": True,
+        "data": WeatherService.get_weather_types(),
+    },
+)
+_NOT_FOUND_RESPONSE = PrecompiledResponse.error(
+    status_code=404,
+    code="NOT_FOUND",
+    message="エンドポイントが見つかりません",
+)
+
+# 都市の絞り込み・ページングのクエリパラメータ
+CITY_FILTER_PARAMS = frozenset({"region", "prefecture"})
+CITY_PAGE_PARAMS = CITY_FILTER_PARAMS | {"offset", "limit"}
+
+# 期間内の集計項目から統計を返すクエリパラメータ（時刻で結果が変わるため ETag を付けない）
+WINDOW_STATISTICS_PARAMS = frozenset({"granularity", "from", "to", "city_id"})
+
 
 def lambda_handler(event: dict, context) -> dict:
     """Lambda エントリーポイント"""
-    logger.info(f"Received event: {json.dumps(event)}")
-
     # パスとメソッドを取得
-    http_method = event.get("httpMethod", "GET")
-    path = event.get("path", "/")
+    http_method, path = _request_line(event)
 
-    # ルーティング
-    route_key = f"{http_method} {path}"
-
-    routes = {
-        "GET /health": handle_health,
-        "GET /weather": handle_get_weather,
-        "POST /weather/generate": handle_generate_weather,
-        "GET /weather/forecast": handle_get_forecast,
-        "GET /weather/statistics": handle_get_statistics,
-        "GET /weather/types": handle_get_weather_types,
-        "OPTIONS /health": handle_options,
-        "OPTIONS /weather": handle_options,
-        "OPTIONS /weather/generate": handle_options,
-        "OPTIONS /weather/forecast": handle_options,
-        "OPTIONS /weather/statistics": handle_options,
-        "OPTIONS /weather/types": handle_options,
-    }
+    request_log = structured_logging.start_request(
+        context, method=http_method, path=path
+    )
+    if structured_logging.should_log_event():
+        logger.info("Received event: %s", structured_logging.LazyJson(event))
 
-    handler = routes.get(route_key, handle_not_found)
+    # ルーティング
+    route = ROUTER.resolve(http_method, path)
+    if route is None:
+        handler = handle_not_found
+    else:
+        handler, path_parameters = route
+        if path_parameters:
+            event = {
+                **event,
+                "pathParameters": {**(event.get("pathParameters") or {}), **path_parameters},
+            }
+
+    request_log.set(handler=handler.__name__)
+    cache_before = weather_service.cache_stats()
 
     try:
-        return handler(event, context)
+        with METRICS.span("handler"):
+            response = handler(event, context)
     except Exception as e:
-        logger.error(f"Unhandled error: {e}")
+        logger.error("Unhandled error: %s", e)
         error = ErrorResponse(
             code="INTERNAL_ERROR",
             message="サーバー内部エラーが発生しました",
             request_id=getattr(context, "aws_request_id", None),
         )
-        return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
+        response = ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
+
+    # 大きいボディは Accept-Encoding に応じて圧縮する
+    # （API Gateway がバイナリに戻せるのは Accept が BINARY_MEDIA_TYPES の場合のみ）
+    if accepts_binary(_request_header(event, "Accept")):
+        response = compress_response(response, _request_header(event, "Accept-Encoding"))
+
+    _record_cache_usage(request_log, cache_before)
+    request_log.set(status=response["statusCode"])
+    request_log.emit(logger)
+    METRICS.flush(Route=handler.__name__)
+    return response
+
+
+def _record_cache_usage(
+    request_log: structured_logging.RequestLog, before: dict
+) -> None:
+    """このリクエストでの読み取りキャッシュのヒット/ミス件数をサマリーとメトリクスに記録"""
+    after = weather_service.cache_stats()
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    request_log.set(cache_hits=hits, cache_misses=misses)
+    if hits:
+        METRICS.count("cache.hits", hits)
+    if misses:
+        METRICS.count("cache.misses", misses)
+
+
+def _request_line(event: dict) -> tuple[str, str]:
+    """メソッドとパスを取得（REST API と HTTP API のペイロード形式に対応）"""
+    if "httpMethod" in event:
+        return event["httpMethod"], event.get("path", "/")
+
+    # HTTP API（ペイロード形式 2.0）
+    http = (event.get("requestContext") or {}).get("http") or {}
+    return (
+        http.get("method", "GET"),
+        event.get("rawPath") or http.get("path") or event.get("path", "/"),
+    )
+
+
+def conditional_get(
+    exclude_params: frozenset = frozenset(),
+    variant: Optional[Callable[[], str]] = None,
+) -> Callable:
+    """データのバージョンから ETag を付け、If-None-Match が一致すれば 304 を返すデコレータ
+
+    ETag はデータのバージョンとパス・クエリパラメータから作るため、
+    観測の保存や CSV 取り込みがあるまでは同じ値になる。
+    データ以外にも応答を変えるもの（予報モデルなど）がある場合は、その版を返す
+    variant を指定して ETag に含める。
+    exclude_params のクエリパラメータを含むリクエストはそのままハンドラーに渡す。
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(event: dict, context) -> dict:
+            params = event.get("queryStringParameters") or {}
+            if params.keys() & exclude_params:
+                return func(event, context)
+
+            etag = _current_etag(event, params, variant)
+            if etag is not None and _etag_matches(_request_header(event, "If-None-Match"), etag):
+                return {
+                    "statusCode": 304,
+                    "body": "",
+                    "headers": {**DEFAULT_HEADERS, "ETag": etag, "Cache-Control": "no-cache"},
+                }
+
+            response = func(event, context)
+            if etag is not None and response["statusCode"] == 200:
+                response["headers"] = {
+                    **response["headers"],
+                    "ETag": etag,
+                    "Cache-Control": "no-cache",
+                }
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _current_etag(
+    event: dict, params: dict, variant: Optional[Callable[[], str]] = None
+) -> Optional[str]:
+    """現在のデータのバージョンに対する ETag（バージョンが取得できない場合は None）"""
+    try:
+        version = weather_service.data_version()
+        if version is not None and variant is not None:
+            version = f"{version}.{variant()}"
+    except WeatherSystemError as e:
+        logger.warning("Data version lookup failed: %s", e)
+        return None
+    if version is None:
+        return None
+
+    _, path = _request_line(event)
+    query = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    return f'"{version}-{zlib.crc32(f"{path}?{query}".encode()):08x}"'
+
+
+def _request_header(event: dict, name: str) -> Optional[str]:
+    """リクエストヘッダーを取得（HTTP API は小文字のため大文字小文字を区別しない）"""
+    headers = event.get("headers") or {}
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, header_value in headers.items():
+            if key.lower() == lowered:
+                return header_value
+    return value
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match（カンマ区切り・弱い比較）が ETag に一致するか"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
 
 
 def handle_options(event: dict, context) -> dict:
     """OPTIONS リクエスト（CORS preflight）"""
-    return ApiResponse(status_code=200, body={}).to_lambda_response()
+    return _OPTIONS_RESPONSE.to_lambda_response()
 
 
 def handle_health(event: dict, context) -> dict:
@@ -77,7 +231,7 @@ def handle_health(event: dict, context) -> dict:
             },
         ).to_lambda_response()
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return ApiResponse(
             status_code=200,
             body={
@@ -88,31 +242,187 @@ def handle_health(event: dict, context) -> dict:
         ).to_lambda_response()
 
 
-@require_auth
+@conditional_get()
 def handle_get_weather(event: dict, context) -> dict:
-    """天気データ取得エンドポイント"""
-    try:
-        weather_data = weather_service.get_current_weather()
+    """天気データ取得エンドポイント
 
-        if not weather_data:
-            # データがない場合は自動生成
-            weather_service.generate_weather_data()
+    クエリパラメータ region, prefecture, offset, limit のいずれかを指定すると、
+    絞り込んだ都市の1ページ分を total（該当都市数）と next_offset 付きで返す。
+    """
+    request_id = getattr(context, "aws_request_id", None)
+    params = event.get("queryStringParameters") or {}
+    try:
+        if params.keys() & CITY_PAGE_PARAMS:
+            page_params = _city_page_params(params)
+            page = weather_service.get_current_weather_page(**page_params)
+            if not page["data"] and not weather_service.get_current_weather():
+                # 全都市のデータがない場合のみ自動生成（範囲外の offset などでは生成しない）
+                weather_service.generate_weather_data()
+                page = weather_service.get_current_weather_page(**page_params)
+            body = {"success": True, **page}
+        else:
             weather_data = weather_service.get_current_weather()
 
+            if not weather_data:
+                # データがない場合は自動生成
+                weather_service.generate_weather_data()
+                weather_data = weather_service.get_current_weather()
+
+            body = {
+                "success": True,
+                "data": weather_data,
+                "count": len(weather_data),
+            }
+
+        return ApiResponse(status_code=200, body=body).to_lambda_response()
+    except ValidationError as e:
+        error = ErrorResponse(code=e.code, message=e.message, request_id=request_id)
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
+    except WeatherDataError as e:
+        logger.error("Weather data error: %s", e)
+        error = ErrorResponse(
+            code=e.code,
+            message=e.message,
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
+
+
+def _city_page_params(params: dict) -> dict:
+    """都市の絞り込み・ページングのクエリパラメータを変換"""
+    raw_offset = params.get("offset") or "0"
+    raw_limit = params.get("limit")
+    if not raw_offset.isdigit() or (raw_limit and not raw_limit.isdigit()):
+        raise ValidationError("開始位置または件数が不正です")
+    return {
+        "region": params.get("region") or None,
+        "prefecture": params.get("prefecture") or None,
+        "offset": int(raw_offset),
+        "limit": int(raw_limit) if raw_limit else None,
+    }
+
+
+def handle_get_weather_by_city(event: dict, context) -> dict:
+    """都市別天気データ取得エンドポイント"""
+    request_id = getattr(context, "aws_request_id", None)
+    raw_city_id = (event.get("pathParameters") or {}).get("city_id", "")
+
+    try:
+        city_id = int(raw_city_id)
+    except ValueError:
+        error = ErrorResponse(
+            code="VALIDATION_ERROR",
+            message=f"都市IDが不正です: {raw_city_id}",
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
+
+    if city_id not in CITIES:
+        error = ErrorResponse(
+            code="NOT_FOUND",
+            message=f"都市が見つかりません: {city_id}",
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=404, body=error.to_dict()).to_lambda_response()
+
+    try:
+        weather = weather_service.get_weather_by_city(city_id)
+
+        if weather is None:
+            error = ErrorResponse(
+                code="NOT_FOUND",
+                message="天気データがありません",
+                request_id=request_id,
+            )
+            return ApiResponse(status_code=404, body=error.to_dict()).to_lambda_response()
+
         return ApiResponse(
             status_code=200,
             body={
                 "success": True,
-                "data": weather_data,
-                "count": len(weather_data),
+                "data": weather,
             },
         ).to_lambda_response()
     except WeatherDataError as e:
-        logger.error(f"Weather data error: {e}")
+        logger.error("Weather data error: %s", e)
         error = ErrorResponse(
             code=e.code,
             message=e.message,
-            request_id=getattr(context, "aws_request_id", None),
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
+
+
+def handle_get_weather_history(event: dict, context) -> dict:
+    """都市別の観測履歴取得エンドポイント（ページング）
+
+    都市IDはパス（/weather/history/{city_id}）またはクエリパラメータ city_id で指定する。
+    クエリパラメータ: from, to, limit, next_token, order（asc / desc）
+    summary=true の場合はページではなく期間全体の統計を返す。
+    """
+    request_id = getattr(context, "aws_request_id", None)
+    params = event.get("queryStringParameters") or {}
+    raw_city_id = (event.get("pathParameters") or {}).get("city_id") or params.get(
+        "city_id", ""
+    )
+
+    try:
+        city_id = int(raw_city_id)
+        limit = int(params["limit"]) if params.get("limit") else None
+    except ValueError:
+        error = ErrorResponse(
+            code="VALIDATION_ERROR",
+            message="都市IDまたは件数が不正です",
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
+
+    if city_id not in CITIES:
+        error = ErrorResponse(
+            code="NOT_FOUND",
+            message=f"都市が見つかりません: {city_id}",
+            request_id=request_id,
+        )
+        return ApiResponse(status_code=404, body=error.to_dict()).to_lambda_response()
+
+    try:
+        if params.get("summary") == "true":
+            statistics = weather_service.get_history_statistics(
+                city_id, start=params.get("from"), end=params.get("to")
+            )
+            return ApiResponse(
+                status_code=200,
+                body={
+                    "success": True,
+                    "data": statistics,
+                },
+            ).to_lambda_response()
+
+        history = weather_service.get_weather_history(
+            city_id,
+            start=params.get("from"),
+            end=params.get("to"),
+            limit=limit,
+            next_token=params.get("next_token"),
+            newest_first=params.get("order", "desc") != "asc",
+        )
+
+        return ApiResponse(
+            status_code=200,
+            body={
+                "success": True,
+                **history,
+            },
+        ).to_lambda_response()
+    except ValidationError as e:
+        error = ErrorResponse(code=e.code, message=e.message, request_id=request_id)
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
+    except WeatherDataError as e:
+        logger.error("Weather history error: %s", e)
+        error = ErrorResponse(
+            code=e.code,
+            message=e.message,
+            request_id=request_id,
         )
         return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
 
@@ -127,12 +437,12 @@ def handle_generate_weather(event: dict, context) -> dict:
             body={
                 "success": True,
                 "message": "天気データを生成しました",
-                "data": [w.to_dict() for w in weather_data],
+                "data": weather_data.to_dicts(),
                 "count": len(weather_data),
             },
         ).to_lambda_response()
     except WeatherDataError as e:
-        logger.error(f"Weather generation error: {e}")
+        logger.error("Weather generation error: %s", e)
         error = ErrorResponse(
             code=e.code,
             message=e.message,
@@ -141,11 +451,27 @@ def handle_generate_weather(event: dict, context) -> dict:
         return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
 
 
-@require_auth
+@conditional_get(variant=lambda: weather_service.forecast_model_version())
 def handle_get_forecast(event: dict, context) -> dict:
-    """天気予報取得エンドポイント"""
+    """天気予報取得エンドポイント
+
+    クエリパラメータ: hours（予報する時間数、既定 24）, region, prefecture
+    """
+    request_id = getattr(context, "aws_request_id", None)
+    params = event.get("queryStringParameters") or {}
     try:
-        forecast = weather_service.get_forecast()
+        raw_hours = params.get("hours")
+        if raw_hours and not raw_hours.isdigit():
+            raise ValidationError(f"予報の時間数が不正です: {raw_hours}")
+        filters = {
+            "region": params.get("region") or None,
+            "prefecture": params.get("prefecture") or None,
+        }
+        forecast = (
+            weather_service.get_forecast(int(raw_hours), **filters)
+            if raw_hours
+            else weather_service.get_forecast(**filters)
+        )
 
         return ApiResponse(
             status_code=200,
@@ -155,21 +481,45 @@ def handle_get_forecast(event: dict, context) -> dict:
                 "count": len(forecast),
             },
         ).to_lambda_response()
+    except ValidationError as e:
+        error = ErrorResponse(code=e.code, message=e.message, request_id=request_id)
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
     except WeatherDataError as e:
-        logger.error(f"Forecast error: {e}")
+        logger.error("Forecast error: %s", e)
         error = ErrorResponse(
             code=e.code,
             message=e.message,
-            request_id=getattr(context, "aws_request_id", None),
+            request_id=request_id,
         )
         return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
 
 
-@require_auth
+@conditional_get(exclude_params=WINDOW_STATISTICS_PARAMS)
 def handle_get_statistics(event: dict, context) -> dict:
-    """統計情報取得エンドポイント"""
+    """統計情報取得エンドポイント
+
+    クエリパラメータ granularity（hour / day）, from, to, city_id のいずれかを指定すると、
+    最新値ではなく期間内の集計項目から統計を返す。
+    それ以外は region, prefecture で最新値を集計する都市を絞り込める。
+    """
+    request_id = getattr(context, "aws_request_id", None)
+    params = event.get("queryStringParameters") or {}
     try:
-        statistics = weather_service.get_statistics()
+        if params.keys() & WINDOW_STATISTICS_PARAMS:
+            raw_city_id = params.get("city_id")
+            if raw_city_id and not raw_city_id.lstrip("-").isdigit():
+                raise ValidationError(f"都市IDが不正です: {raw_city_id}")
+            statistics = weather_service.get_window_statistics(
+                granularity=params.get("granularity") or "hour",
+                start=params.get("from"),
+                end=params.get("to"),
+                city_id=int(raw_city_id) if raw_city_id else None,
+            )
+        else:
+            statistics = weather_service.get_statistics(
+                region=params.get("region") or None,
+                prefecture=params.get("prefecture") or None,
+            )
 
         return ApiResponse(
             status_code=200,
@@ -178,34 +528,72 @@ def handle_get_statistics(event: dict, context) -> dict:
                 "data": statistics,
             },
         ).to_lambda_response()
+    except ValidationError as e:
+        error = ErrorResponse(code=e.code, message=e.message, request_id=request_id)
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
     except WeatherDataError as e:
-        logger.error(f"Statistics error: {e}")
+        logger.error("Statistics error: %s", e)
         error = ErrorResponse(
             code=e.code,
             message=e.message,
-            request_id=getattr(context, "aws_request_id", None),
+            request_id=request_id,
         )
         return ApiResponse(status_code=500, body=error.to_dict()).to_lambda_response()
 
 
 def handle_get_weather_types(event: dict, context) -> dict:
     """天気タイプ一覧取得エンドポイント（認証不要）"""
-    weather_types = weather_service.get_weather_types()
+    return _WEATHER_TYPES_RESPONSE.to_lambda_response()
+
+
+def handle_get_cities(event: dict, context) -> dict:
+    """都市一覧取得エンドポイント（認証不要）
+
+    クエリパラメータ: region, prefecture, offset, limit
+    """
+    params = event.get("queryStringParameters") or {}
+    try:
+        page = weather_service.get_city_page(**_city_page_params(params))
+    except ValidationError as e:
+        error = ErrorResponse(
+            code=e.code,
+            message=e.message,
+            request_id=getattr(context, "aws_request_id", None),
+        )
+        return ApiResponse(status_code=400, body=error.to_dict()).to_lambda_response()
 
     return ApiResponse(
         status_code=200,
         body={
             "success": True,
-            "data": weather_types,
+            **page,
         },
     ).to_lambda_response()
 
 
 def handle_not_found(event: dict, context) -> dict:
     """404 Not Found"""
-    error = ErrorResponse(
-        code="NOT_FOUND",
-        message="エンドポイントが見つかりません",
-        request_id=getattr(context, "aws_request_id", None),
+    return _NOT_FOUND_RESPONSE.to_error_response(
+        request_id=getattr(context, "aws_request_id", None)
     )
-    return ApiResponse(status_code=404, body=error.to_dict()).to_lambda_response()
+
+
+# ルーティングテーブル（モジュール読み込み時に一度だけ構築）
+ROUTES = [
+    # (メソッド, パス, ハンドラー, 認証要否)
+    ("GET", "/health", handle_health, False),
+    ("GET", "/weather", handle_get_weather, True),
+    ("POST", "/weather/generate", handle_generate_weather, False),
+    ("GET", "/weather/forecast", handle_get_forecast, True),
+    ("GET", "/weather/statistics", handle_get_statistics, True),
+    ("GET", "/weather/types", handle_get_weather_types, False),
+    ("GET", "/weather/history", handle_get_weather_history, True),
+    ("GET", "/weather/history/{city_id:int}", handle_get_weather_history, True),
+    ("GET", "/weather/{city_id:int}", handle_get_weather_by_city, True),
+    ("GET", "/cities", handle_get_cities, False),
+]
+
+ROUTER = Router()
+for _method, _path, _handler, _auth in ROUTES:
+    ROUTER.add(_method, _path, _handler, auth=_auth)
+    ROUTER.add("OPTIONS", _path, handle_options)
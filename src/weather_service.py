@@ -1,136 +1,608 @@
 """天気サービスモジュール - ビジネスロジック"""
 
-import random
+import os
+import time
 import logging
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from models import WeatherData, CITIES, WEATHER_TYPES
-from database import WeatherDatabase
-from exceptions import WeatherDataError
+from models import WeatherBatch, WeatherData, CITIES, WEATHER_TYPES
+from database import WeatherDatabase, decode_page_token, encode_page_token
+from derived_items import (
+    AGGREGATE_ALL,
+    AGGREGATE_GRANULARITIES,
+    AGGREGATE_WEATHER_PREFIX,
+    aggregate_bucket,
+)
+from cache import TTLCache
+from forecast_engine import ForecastEngine
+from statistics_engine import WeatherColumns, compute_statistics
+from weather_generator import WeatherGenerator
+from metrics import METRICS
+from exceptions import DatabaseError, ValidationError, WeatherDataError
 
 logger = logging.getLogger(__name__)
 
 # TTL: 24時間
 DEFAULT_TTL_HOURS = 24
 
+# 読み取りキャッシュ（環境変数 CACHE_TTL_SECONDS / CACHE_MAX_ENTRIES で変更可能）
+DEFAULT_CACHE_TTL_SECONDS = 30
+DEFAULT_CACHE_MAX_ENTRIES = 128
+
+# 履歴取得の1ページあたりの件数
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+# 履歴の統計を計算するときに1回のクエリで読む件数
+HISTORY_STATISTICS_PAGE_SIZE = 1000
+
+# 都市単位のページング（最新天気・都市一覧）の1ページあたりの上限
+MAX_CITY_PAGE_SIZE = 500
+
+# 指定都市がこの数以下の場合はスナップショットを読まず、都市ごとのクエリで読む
+# （スナップショットは射影式で一部の都市だけ読んでも項目全体のサイズ分のRCUを消費する）
+SUBSET_QUERY_MAX_CITIES = 16
+
+# 予報の時間数（1ステップ = 観測間隔の1時間）
+DEFAULT_FORECAST_HOURS = 24
+MAX_FORECAST_HOURS = 168
+FORECAST_STEP = timedelta(hours=1)
+
+# 予報モデルを履歴から作り直す間隔（環境変数 FORECAST_REFIT_SECONDS で変更可能）
+# UNIX時刻をこの秒数で区切った期間ごとに作り直すため、全コンテナで作り直す時期が揃う
+DEFAULT_FORECAST_REFIT_SECONDS = 3600
+
+# 期間統計の既定の期間（粒度ごと）
+DEFAULT_STATISTICS_WINDOWS = {"hour": timedelta(hours=24), "day": timedelta(days=7)}
+
+# マスターデータの一覧（共有するため変更しないこと）
+_WEATHER_TYPE_LIST = [
+    {"id": weather_id, "name": name} for weather_id, name in WEATHER_TYPES.items()
+]
+
 
 class WeatherService:
     """天気データのビジネスロジッククラス"""
 
-    def __init__(self, database: Optional[WeatherDatabase] = None):
+    def __init__(
+        self,
+        database: Optional[WeatherDatabase] = None,
+        cache: Optional[TTLCache] = None,
+        generator: Optional[WeatherGenerator] = None,
+    ):
         self.database = database or WeatherDatabase()
+        self.generator = generator or WeatherGenerator()
+        self.forecast_refit_seconds = float(
+            os.environ.get("FORECAST_REFIT_SECONDS", DEFAULT_FORECAST_REFIT_SECONDS)
+        )
+        self._data_version: Optional[int] = None
+        self._forecast_engine: Optional[ForecastEngine] = None
+        self._forecast_period: Optional[int] = None
+        self._forecast_lock = threading.Lock()
+        self.cache = cache or TTLCache(
+            ttl_seconds=float(
+                os.environ.get("CACHE_TTL_SECONDS", DEFAULT_CACHE_TTL_SECONDS)
+            ),
+            max_entries=int(
+                os.environ.get("CACHE_MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES)
+            ),
+        )
 
-    def generate_weather_data(self) -> list[WeatherData]:
+    @METRICS.timed("service.generate_weather_data")
+    def generate_weather_data(self) -> WeatherBatch:
         """全都市のランダム天気データを生成して保存"""
         now = datetime.utcnow()
         timestamp = now.isoformat()
         ttl = int((now + timedelta(hours=DEFAULT_TTL_HOURS)).timestamp())
 
-        weather_data_list = []
-
-        for city_id, city_name in CITIES.items():
-            weather_id = random.choice(list(WEATHER_TYPES.keys()))
-            weather_name = WEATHER_TYPES[weather_id]
-
-            # 天気タイプに応じた降水確率を生成
-            if weather_id == 1:  # 晴れ
-                rainfall = random.randint(0, 20)
-            elif weather_id == 2:  # くもり
-                rainfall = random.randint(20, 50)
-            else:  # 雨
-                rainfall = random.randint(50, 100)
-
-            weather_data = WeatherData(
-                city_id=city_id,
-                city_name=city_name,
-                weather_id=weather_id,
-                weather_name=weather_name,
-                rainfall_probability=rainfall,
-                timestamp=timestamp,
-                ttl=ttl,
-            )
-            weather_data_list.append(weather_data)
+        # 天気タイプに応じた降水確率の範囲から全都市分をまとめて生成
+        weather_data_list = self.generator.generate(CITIES, timestamp, ttl)
 
-        # データベースに保存
-        success, errors = self.database.save_multiple_weather_data(weather_data_list)
-        logger.info(f"Generated weather data: {success} success, {errors} errors")
+        # データベースに保存（同一コンテナ内のキャッシュは破棄）
+        self.cache.clear()
+        saved = self.database.save_weather_batch(weather_data_list)
+        logger.info(
+            "Generated weather data: %d success, %d errors",
+            len(saved),
+            len(weather_data_list) - len(saved),
+        )
 
-        if success == 0:
+        if not saved:
             raise WeatherDataError("天気データの生成に失敗しました")
 
-        return weather_data_list
+        # スナップショットと集計には保存できた行のみを反映する
+        try:
+            self.database.update_latest_snapshot(saved)
+        except DatabaseError as e:
+            # 観測データは保存済みのため、生成自体は成功扱いとする
+            logger.error("Failed to update latest snapshot: %s", e)
 
+        try:
+            self.database.update_aggregates(saved)
+        except DatabaseError as e:
+            logger.error("Failed to update aggregates: %s", e)
+
+        return saved
+
+    @METRICS.timed("service.get_current_weather")
     def get_current_weather(self) -> list[dict]:
         """全都市の最新天気データを取得"""
         try:
-            weather_list = self.database.get_all_cities_latest_weather()
-            return [w.to_dict() for w in weather_list]
+            return self.cache.get_or_load("current", self._load_current_weather)
         except Exception as e:
-            logger.error(f"Failed to get current weather: {e}")
+            logger.error("Failed to get current weather: %s", e)
             raise WeatherDataError(f"天気データの取得に失敗しました: {str(e)}")
 
+    @METRICS.timed("service.get_current_weather_page")
+    def get_current_weather_page(
+        self,
+        region: Optional[str] = None,
+        prefecture: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> dict:
+        """地方・都道府県で絞り込んだ都市の最新天気データを1ページ分取得
+
+        続きがある場合は next_offset を返す（total は絞り込み後の都市数）。
+        """
+        city_ids, next_offset, total = _select_cities(region, prefecture, offset, limit)
+        try:
+            data = self.cache.get_or_load(
+                ("current", region, prefecture, offset, limit),
+                lambda: self._load_current_weather(city_ids),
+            )
+        except Exception as e:
+            logger.error("Failed to get current weather: %s", e)
+            raise WeatherDataError(f"天気データの取得に失敗しました: {str(e)}")
+
+        return {
+            "data": data,
+            "count": len(data),
+            "total": total,
+            "next_offset": next_offset,
+        }
+
+    @METRICS.timed("service.get_weather_by_city")
     def get_weather_by_city(self, city_id: int) -> Optional[dict]:
         """指定都市の最新天気データを取得"""
         if city_id not in CITIES:
             raise WeatherDataError(f"無効な都市ID: {city_id}")
 
         try:
-            weather = self.database.get_latest_weather(city_id)
-            return weather.to_dict() if weather else None
+            return self.cache.get_or_load(
+                ("city", city_id), lambda: self._load_weather_by_city(city_id)
+            )
         except Exception as e:
-            logger.error(f"Failed to get weather for city {city_id}: {e}")
+            logger.error("Failed to get weather for city %s: %s", city_id, e)
             raise WeatherDataError(f"天気データの取得に失敗しました: {str(e)}")
 
-    def get_forecast(self) -> list[dict]:
-        """天気予報を取得（現在は最新データを返す）"""
-        return self.get_current_weather()
+    @METRICS.timed("service.get_weather_history")
+    def get_weather_history(
+        self,
+        city_id: int,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+        next_token: Optional[str] = None,
+        newest_first: bool = True,
+    ) -> dict:
+        """指定都市の観測履歴を1ページ分取得
+
+        期間の既定は直近 DEFAULT_TTL_HOURS 時間。続きがある場合は next_token を返す。
+        """
+        if city_id not in CITIES:
+            raise WeatherDataError(f"無効な都市ID: {city_id}")
+
+        end_time = _parse_time(end) if end else datetime.utcnow()
+        start_time = (
+            _parse_time(start) if start else end_time - timedelta(hours=DEFAULT_TTL_HOURS)
+        )
+        if start_time > end_time:
+            raise ValidationError("期間の開始が終了より後になっています")
+
+        page_size = DEFAULT_HISTORY_PAGE_SIZE if limit is None else limit
+        if page_size < 1:
+            raise ValidationError(f"件数が不正です: {page_size}")
+        page_size = min(page_size, MAX_HISTORY_PAGE_SIZE)
+
+        exclusive_start_key = decode_page_token(next_token, city_id) if next_token else None
 
-    def get_statistics(self) -> dict:
-        """天気統計情報を取得"""
         try:
-            weather_list = self.database.get_all_cities_latest_weather()
-
-            if not weather_list:
-                return {
-                    "total_cities": len(CITIES),
-                    "data_available": 0,
-                    "weather_distribution": {},
-                    "average_rainfall": 0,
-                }
-
-            # 天気タイプ別の分布を計算
-            weather_distribution = {}
-            total_rainfall = 0
-
-            for weather in weather_list:
-                weather_name = weather.weather_name
-                weather_distribution[weather_name] = (
-                    weather_distribution.get(weather_name, 0) + 1
-                )
-                total_rainfall += weather.rainfall_probability
+            items, last_key = self.database.query_history_page(
+                city_id,
+                start_time.isoformat(),
+                end_time.isoformat(),
+                page_size,
+                exclusive_start_key,
+                newest_first,
+            )
+        except DatabaseError as e:
+            logger.error("Failed to get history for city %s: %s", city_id, e)
+            raise WeatherDataError(f"履歴データの取得に失敗しました: {e.message}")
 
-            avg_rainfall = total_rainfall / len(weather_list) if weather_list else 0
+        return {
+            "CityId": city_id,
+            "CityName": CITIES[city_id],
+            "from": start_time.isoformat(),
+            "to": end_time.isoformat(),
+            "items": [_history_entry(item) for item in items],
+            "count": len(items),
+            "next_token": encode_page_token(last_key),
+        }
 
-            return {
-                "total_cities": len(CITIES),
-                "data_available": len(weather_list),
-                "weather_distribution": weather_distribution,
-                "average_rainfall": round(avg_rainfall, 1),
-            }
+    @METRICS.timed("service.get_history_statistics")
+    def get_history_statistics(
+        self, city_id: int, start: Optional[str] = None, end: Optional[str] = None
+    ) -> dict:
+        """指定都市・期間の観測履歴から統計（分布・平均・パーセンタイル・雨の時間数）を計算
+
+        履歴はページ単位で読み、必要な列だけを配列に詰めて一度に計算する。
+        """
+        if city_id not in CITIES:
+            raise WeatherDataError(f"無効な都市ID: {city_id}")
+
+        end_time = _parse_time(end) if end else datetime.utcnow()
+        start_time = (
+            _parse_time(start) if start else end_time - timedelta(hours=DEFAULT_TTL_HOURS)
+        )
+        if start_time > end_time:
+            raise ValidationError("期間の開始が終了より後になっています")
+
+        columns = WeatherColumns()
+        try:
+            for page in self.database.iter_history_pages(
+                city_id,
+                start_time.isoformat(),
+                end_time.isoformat(),
+                HISTORY_STATISTICS_PAGE_SIZE,
+            ):
+                columns.extend_items(page, city_id=city_id)
+        except DatabaseError as e:
+            logger.error("Failed to get history for city %s: %s", city_id, e)
+            raise WeatherDataError(f"履歴データの取得に失敗しました: {e.message}")
+
+        with METRICS.span("service.compute_statistics"):
+            statistics = compute_statistics(columns, per_city=False)
+
+        return {
+            "CityId": city_id,
+            "CityName": CITIES[city_id],
+            "from": start_time.isoformat(),
+            "to": end_time.isoformat(),
+            **statistics,
+        }
+
+    @METRICS.timed("service.get_forecast")
+    def get_forecast(
+        self,
+        hours: int = DEFAULT_FORECAST_HOURS,
+        region: Optional[str] = None,
+        prefecture: Optional[str] = None,
+    ) -> list[dict]:
+        """全都市（地方・都道府県を指定した場合はその都市）の hours 時間先までの天気予報を取得
+
+        都市ごとの最新値に、1時間ごとの予報（最も確率の高い天気・降水確率の期待値・
+        天気ごとの確率）を forecast として付けて返す。
+        """
+        if not 1 <= hours <= MAX_FORECAST_HOURS:
+            raise ValidationError(f"予報の時間数が不正です: {hours}")
+
+        city_ids = (
+            None
+            if region is None and prefecture is None
+            else CITIES.select(region=region, prefecture=prefecture)
+        )
+        try:
+            # 予報モデルの期間ごとに別のキーにし、作り直す前のモデルの予報を返さない
+            return self.cache.get_or_load(
+                ("forecast", self.forecast_period(), hours, region, prefecture),
+                lambda: self._load_forecast(hours, city_ids),
+            )
+        except Exception as e:
+            logger.error("Failed to get forecast: %s", e)
+            raise WeatherDataError(f"天気予報の取得に失敗しました: {str(e)}")
+
+    @METRICS.timed("service.get_statistics")
+    def get_statistics(
+        self, region: Optional[str] = None, prefecture: Optional[str] = None
+    ) -> dict:
+        """天気統計情報を取得（地方・都道府県を指定した場合はその都市のみ）"""
+        if region is None and prefecture is None:
+            key, city_ids = "statistics", None
+        else:
+            key = ("statistics", region, prefecture)
+            city_ids = CITIES.select(region=region, prefecture=prefecture)
+        try:
+            return self.cache.get_or_load(key, lambda: self._load_statistics(city_ids))
         except Exception as e:
-            logger.error(f"Failed to get statistics: {e}")
+            logger.error("Failed to get statistics: %s", e)
             raise WeatherDataError(f"統計情報の取得に失敗しました: {str(e)}")
 
+    @METRICS.timed("service.get_window_statistics")
+    def get_window_statistics(
+        self,
+        granularity: str = "hour",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        city_id: Optional[int] = None,
+    ) -> dict:
+        """期間内の統計情報を時間・日単位の集計項目から取得
+
+        観測データは読まず、期間に含まれる集計項目（時間単位なら最大24件/日）のみを読む。
+        city_id を省略した場合は全都市の集計を返す（結果の city_id は None）。
+        """
+        if granularity not in AGGREGATE_GRANULARITIES:
+            raise ValidationError(f"集計単位が不正です: {granularity}")
+        if city_id is not None and city_id not in CITIES:
+            raise ValidationError(f"無効な都市ID: {city_id}")
+
+        end_time = _parse_time(end) if end else datetime.utcnow()
+        start_time = (
+            _parse_time(start) if start else end_time - DEFAULT_STATISTICS_WINDOWS[granularity]
+        )
+        if start_time > end_time:
+            raise ValidationError("期間の開始が終了より後になっています")
+
+        scope = AGGREGATE_ALL if city_id is None else city_id
+        start_bucket = aggregate_bucket(granularity, start_time.isoformat())
+        end_bucket = aggregate_bucket(granularity, end_time.isoformat())
+
+        def load() -> dict:
+            items = self.database.query_aggregates(granularity, scope, start_bucket, end_bucket)
+            return {
+                "city_id": city_id,
+                "granularity": granularity,
+                "from": start_bucket,
+                "to": end_bucket,
+                **_summarize_aggregates(items),
+                "buckets": [
+                    {"bucket": item["Bucket"], **_summarize_aggregates([item])}
+                    for item in items
+                ],
+            }
+
+        try:
+            return self.cache.get_or_load(
+                ("window_statistics", granularity, scope, start_bucket, end_bucket), load
+            )
+        except DatabaseError as e:
+            logger.error("Failed to get window statistics: %s", e)
+            raise WeatherDataError(f"統計情報の取得に失敗しました: {e.message}")
+
+    def data_version(self) -> Optional[int]:
+        """データのバージョン（スナップショットの version。未作成の場合は None）
+
+        前回から変わっていれば、他のコンテナや CSV 取り込みによる更新とみなして
+        読み取りキャッシュを破棄する（返したバージョン以降のデータを読むため）。
+        """
+        try:
+            version = self.database.get_snapshot_version()
+        except DatabaseError as e:
+            raise WeatherDataError(f"データのバージョンの取得に失敗しました: {e.message}")
+
+        if version != self._data_version:
+            self.cache.clear()
+            self._data_version = version
+        return version
+
+    def forecast_period(self) -> int:
+        """現在の予報モデルの期間（UNIX時刻を FORECAST_REFIT_SECONDS で区切った番号）"""
+        return int(time.time() // self.forecast_refit_seconds)
+
+    def forecast_model_version(self) -> str:
+        """予報モデルのバージョン（現在の期間の番号）
+
+        同じデータのバージョンでもモデルを作り直すと予報が変わるため、予報の ETag に含める。
+        モデルは期間の始まりまでの履歴から作るため、データのバージョンと期間が同じなら
+        どのコンテナでも同じ予報になる。モデルを作らずに求まるため、304 を返す場合は
+        作り直さない。
+        """
+        return f"{self.forecast_period():x}"
+
+    def cache_stats(self) -> dict:
+        """読み取りキャッシュのヒット/ミス件数"""
+        return self.cache.stats()
+
+    def _load_current_weather(self, city_ids: Optional[list[int]] = None) -> list[dict]:
+        """キャッシュミス時の全都市（または指定都市）データ読み込み"""
+        return [w.to_dict() for w in self._get_latest_weather_list(city_ids)]
+
+    def _load_forecast(self, hours: int, city_ids: Optional[list[int]] = None) -> list[dict]:
+        """キャッシュミス時の予報計算
+
+        最新値は予報モデルにも加算する（前回の予報以降に届いた観測を遷移として反映）。
+        """
+        latest = self._get_latest_weather_list(city_ids)
+        with self._forecast_lock:
+            engine = self._get_forecast_engine()
+            engine.observe_all(
+                (w.city_id, w.timestamp, w.weather_id, w.weather_name, w.rainfall_probability)
+                for w in latest
+            )
+            current = {}
+            for weather in latest:
+                state = engine.state_of(weather.weather_id, weather.weather_name)
+                if state is not None:
+                    current[weather.city_id] = state
+            with METRICS.span("service.compute_forecast"):
+                forecasts = engine.forecast(current, hours)
+
+        weather_ids = engine.weather_ids
+        results = []
+        for weather in latest:
+            forecast = forecasts.get(weather.city_id)
+            if forecast is None:
+                continue
+            base_time = _parse_time(weather.timestamp)
+            entries = []
+            for step, (probabilities, rainfall) in enumerate(zip(*forecast), start=1):
+                best = max(range(len(probabilities)), key=probabilities.__getitem__)
+                weather_id = weather_ids[best]
+                entries.append(
+                    {
+                        "timestamp": (base_time + FORECAST_STEP * step).isoformat(),
+                        "WeatherId": weather_id,
+                        "WeatherName": WEATHER_TYPES[weather_id],
+                        "RainfallProbability": round(rainfall),
+                        "probabilities": {
+                            WEATHER_TYPES[state_id]: round(probability, 3)
+                            for state_id, probability in zip(weather_ids, probabilities)
+                        },
+                    }
+                )
+            results.append({**weather.to_dict(), "forecast": entries})
+        return results
+
+    def _get_forecast_engine(self) -> ForecastEngine:
+        """予報モデルを取得（未作成または期間が変わった場合は履歴から作り直す）"""
+        period = self.forecast_period()
+        if self._forecast_engine is None or period != self._forecast_period:
+            self._forecast_engine = self._fit_forecast_engine(period)
+            self._forecast_period = period
+        return self._forecast_engine
+
+    def _fit_forecast_engine(self, period: int) -> ForecastEngine:
+        """期間の始まりまでの DEFAULT_TTL_HOURS 時間の履歴（とそれ以降の観測）から都市ごとの遷移を数える
+
+        履歴の範囲を期間で固定し、同じ期間に作り直したコンテナ間でモデルが揃うようにする。
+        """
+        engine = ForecastEngine()
+        period_start = datetime.utcfromtimestamp(period * self.forecast_refit_seconds)
+        start_time = period_start - timedelta(hours=DEFAULT_TTL_HOURS)
+        end_time = datetime.utcnow()
+        with METRICS.span("service.fit_forecast"):
+            for city_id, items in self.database.iter_city_histories(
+                list(CITIES),
+                start_time.isoformat(),
+                end_time.isoformat(),
+                HISTORY_STATISTICS_PAGE_SIZE,
+            ):
+                engine.observe_all(
+                    (
+                        city_id,
+                        item["timestamp"],
+                        item.get("WeatherId"),
+                        item.get("WeatherName", ""),
+                        item.get("RainfallProbability", 0),
+                    )
+                    for item in items
+                )
+        return engine
+
+    def _load_weather_by_city(self, city_id: int) -> Optional[dict]:
+        """キャッシュミス時の都市別データ読み込み"""
+        weather = self.database.get_latest_weather(city_id)
+        return weather.to_dict() if weather else None
+
+    def _load_statistics(self, city_ids: Optional[list[int]] = None) -> dict:
+        """キャッシュミス時の統計情報計算"""
+        weather_list = self._get_latest_weather_list(city_ids)
+        columns = WeatherColumns.from_batch(WeatherBatch.from_weather_list(weather_list))
+        statistics = compute_statistics(columns, per_city=False)
+
+        return {
+            "total_cities": len(CITIES) if city_ids is None else len(city_ids),
+            "data_available": statistics["readings"],
+            "weather_distribution": statistics["weather_distribution"],
+            "average_rainfall": statistics["average_rainfall"],
+        }
+
+    def _get_latest_weather_list(
+        self, city_ids: Optional[list[int]] = None
+    ) -> list[WeatherData]:
+        """全都市（または指定都市）の最新データを取得（スナップショットがなければ都市ごとに取得）"""
+        if city_ids is not None and not city_ids:
+            return []
+        if city_ids is not None and len(city_ids) <= SUBSET_QUERY_MAX_CITIES:
+            return self.database.get_all_cities_latest_weather(city_ids)
+        snapshot = self.database.get_latest_snapshot(city_ids)
+        if snapshot is not None:
+            return snapshot
+        return self.database.get_all_cities_latest_weather(city_ids)
+
     @staticmethod
     def get_weather_types() -> list[dict]:
-        """天気タイプ一覧を取得"""
-        return [
-            {"id": weather_id, "name": name}
-            for weather_id, name in WEATHER_TYPES.items()
-        ]
+        """天気タイプ一覧を取得（マスターデータから一度だけ生成したものを返す）"""
+        return _WEATHER_TYPE_LIST
 
     @staticmethod
     def get_cities() -> list[dict]:
-        """都市一覧を取得"""
-        return [{"id": city_id, "name": name} for city_id, name in CITIES.items()]
+        """都市一覧を取得（マスターデータから一度だけ生成したものを返す）"""
+        return CITIES.city_list()
+
+    @staticmethod
+    def get_city_page(
+        region: Optional[str] = None,
+        prefecture: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> dict:
+        """地方・都道府県で絞り込んだ都市（都道府県・地方を含む）を1ページ分取得"""
+        city_ids, next_offset, total = _select_cities(region, prefecture, offset, limit)
+        return {
+            "data": [CITIES.get_city(city_id).to_dict() for city_id in city_ids],
+            "count": len(city_ids),
+            "total": total,
+            "next_offset": next_offset,
+        }
+
+
+def _select_cities(
+    region: Optional[str], prefecture: Optional[str], offset: int, limit: Optional[int]
+) -> tuple[list[int], Optional[int], int]:
+    """ページング条件を検証して (都市IDリスト, 次のoffset, 該当件数) を返す"""
+    if offset < 0:
+        raise ValidationError(f"開始位置が不正です: {offset}")
+    if limit is not None:
+        if limit < 1:
+            raise ValidationError(f"件数が不正です: {limit}")
+        limit = min(limit, MAX_CITY_PAGE_SIZE)
+    return CITIES.page(offset=offset, limit=limit, region=region, prefecture=prefecture)
+
+
+def _parse_time(value: str) -> datetime:
+    """ISO 8601 の日時を保存形式（タイムゾーンなしのUTC）に変換"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"日時の形式が不正です: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _summarize_aggregates(items: list[dict]) -> dict:
+    """集計項目をまとめて件数・天気分布・平均/最小/最大降水確率を求める"""
+    count = 0
+    rainfall_sum = 0
+    rainfall_values: set = set()
+    distribution: dict[str, int] = {}
+
+    for item in items:
+        count += int(item.get("Count", 0))
+        rainfall_sum += int(item.get("RainfallSum", 0))
+        rainfall_values.update(int(value) for value in item.get("RainfallValues", ()))
+        for name, value in item.items():
+            if name.startswith(AGGREGATE_WEATHER_PREFIX):
+                weather_name = name[len(AGGREGATE_WEATHER_PREFIX) :]
+                distribution[weather_name] = distribution.get(weather_name, 0) + int(value)
+
+    return {
+        "readings": count,
+        "weather_distribution": distribution,
+        "average_rainfall": round(rainfall_sum / count, 1) if count else 0,
+        "min_rainfall": min(rainfall_values) if rainfall_values else None,
+        "max_rainfall": max(rainfall_values) if rainfall_values else None,
+    }
+
+
+def _history_entry(item: dict) -> dict:
+    """履歴クエリの項目をレスポンス用に変換"""
+    return {
+        "timestamp": item["timestamp"],
+        "WeatherId": int(item.get("WeatherId", 0)),
+        "WeatherName": item.get("WeatherName", ""),
+        "RainfallProbability": int(item.get("RainfallProbability", 0)),
+    }
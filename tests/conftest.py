@@ -6,8 +6,10 @@ import pytest
 import boto3
 from moto import mock_aws
 
-# srcディレクトリをパスに追加
+# src・shared（Lambdaレイヤー）・csv_ingest ディレクトリをパスに追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'csv_ingest'))
 
 # 環境変数設定
 os.environ['TABLE_NAME'] = 'test-weather-table'
@@ -0,0 +1,65 @@
+"""cache のテスト"""
+
+import pytest
+
+from cache import TTLCache
+
+
+class FakeClock:
+    """テスト用の時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+    """TTLCacheのテスト"""
+
+    @pytest.mark.unit
+    def test_hit_and_miss_counters(self):
+        """ヒット/ミスが数えられること"""
+        cache = TTLCache(ttl_seconds=10)
+
+        assert cache.get('key') is None
+        cache.set('key', 'value')
+        assert cache.get('key') == 'value'
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+    @pytest.mark.unit
+    def test_entries_expire_after_ttl(self):
+        """TTLを過ぎたエントリは返されないこと"""
+        clock = FakeClock()
+        cache = TTLCache(ttl_seconds=10, clock=clock)
+        cache.set('key', 'value')
+
+        clock.now = 10.0
+
+        assert cache.get('key') is None
+        assert cache.stats()['size'] == 0
+
+    @pytest.mark.unit
+    def test_evicts_least_recently_used(self):
+        """上限を超えると最も使われていないものから破棄されること"""
+        cache = TTLCache(ttl_seconds=10, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    @pytest.mark.unit
+    def test_zero_ttl_disables_cache(self):
+        """TTLが0の場合はキャッシュされないこと"""
+        cache = TTLCache(ttl_seconds=0)
+        calls = []
+
+        cache.get_or_load('key', lambda: calls.append(1))
+        cache.get_or_load('key', lambda: calls.append(1))
+
+        assert len(calls) == 2
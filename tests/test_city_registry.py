@@ -0,0 +1,110 @@
+"""city_registry のテスト"""
+
+import pytest
+
+import city_registry
+from city_registry import (
+    City,
+    CityRegistry,
+    load_cities_from_file,
+    load_cities_from_table,
+    save_cities_to_table,
+)
+from models import CITIES
+
+SAMPLE_CITIES = [
+    City(1, '札幌', '北海道', '北海道'),
+    City(13, '東京', '東京都', '関東'),
+    City(14, '横浜', '神奈川県', '関東'),
+    City(27, '大阪', '大阪府', '近畿'),
+]
+
+
+@pytest.mark.unit
+class TestCityRegistry:
+    """都市レジストリのテスト"""
+
+    def test_behaves_like_mapping(self):
+        """従来の CITIES 辞書と同じく参照できること"""
+        registry = CityRegistry(SAMPLE_CITIES)
+
+        assert registry[13] == '東京'
+        assert 14 in registry
+        assert 99 not in registry
+        assert list(registry) == [1, 13, 14, 27]
+        assert dict(registry.items())[27] == '大阪'
+        assert registry.city_list()[0] == {'id': 1, 'name': '札幌'}
+
+    def test_select_by_region_and_prefecture(self):
+        """地方・都道府県の索引で絞り込めること"""
+        registry = CityRegistry(SAMPLE_CITIES)
+
+        assert registry.select(region='関東') == [13, 14]
+        assert registry.select(prefecture='神奈川県') == [14]
+        assert registry.select(region='近畿', prefecture='東京都') == []
+        assert registry.select(region='九州') == []
+        assert registry.regions() == ['北海道', '関東', '近畿']
+
+    def test_page(self):
+        """offset と limit でページングし、次の offset と該当件数を返すこと"""
+        registry = CityRegistry(SAMPLE_CITIES)
+
+        assert registry.page(limit=3) == ([1, 13, 14], 3, 4)
+        assert registry.page(offset=3, limit=3) == ([27], None, 4)
+        assert registry.page(region='関東', limit=1) == ([13], 1, 2)
+        assert registry.page() == ([1, 13, 14, 27], None, 4)
+
+    def test_loader_is_called_lazily_once(self):
+        """loader は初回アクセス時に一度だけ呼ばれること"""
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return SAMPLE_CITIES
+
+        registry = CityRegistry(loader=loader)
+        assert calls == []
+
+        assert len(registry) == 4
+        assert registry.get_city(14).prefecture == '神奈川県'
+        assert calls == [1]
+
+    def test_replace_rebuilds_indexes(self):
+        """replace で都市と索引が入れ替わること"""
+        registry = CityRegistry(SAMPLE_CITIES)
+
+        registry.replace([City(40, '博多', '福岡県', '九州')])
+
+        assert list(registry) == [40]
+        assert registry.select(region='関東') == []
+        assert registry.city_list() == [{'id': 40, 'name': '博多'}]
+
+
+@pytest.mark.unit
+def test_bundled_file_matches_default_cities():
+    """同梱ファイルに既存の5都市が地方・都道府県付きで含まれること"""
+    cities = load_cities_from_file(city_registry.DEFAULT_CITY_FILE)
+
+    assert [city.id for city in cities] == list(CITIES)
+    assert all(city.prefecture and city.region for city in cities)
+
+
+@pytest.mark.integration
+def test_table_round_trip(mock_dynamodb):
+    """都市パーティションへの保存と読み込みで同じ都市が得られること"""
+    assert save_cities_to_table(SAMPLE_CITIES) == 4
+
+    cities = load_cities_from_table()
+
+    assert sorted(cities, key=lambda city: city.id) == SAMPLE_CITIES
+
+
+@pytest.mark.integration
+def test_table_source_falls_back_to_file(mock_dynamodb, monkeypatch):
+    """都市パーティションが空の場合は同梱ファイルから読み込むこと"""
+    monkeypatch.setattr(city_registry, 'CITY_REGISTRY_SOURCE', 'table')
+
+    assert len(city_registry.load_configured_cities()) == len(CITIES)
+
+    save_cities_to_table(SAMPLE_CITIES)
+    assert len(city_registry.load_configured_cities()) == 4
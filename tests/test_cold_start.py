@@ -0,0 +1,83 @@
+"""コールドスタートのベンチマークテスト
+
+新しいプロセスで weather_handler を読み込み、初回リクエストまでの時間と
+生成されるAWSクライアントを計測する。
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+# Lambdaレイヤー（/opt/python に展開される）の代わりに PYTHONPATH で読み込む
+SHARED_DIR = os.path.join(os.path.dirname(__file__), '..', 'shared')
+
+# import + 初回 /weather/types 呼び出しの許容時間（秒）
+COLD_START_BUDGET_SECONDS = float(os.environ.get('COLD_START_BUDGET_SECONDS', '0.25'))
+
+# 計測回数（最小値で判定し、CI上のばらつきを抑える）
+COLD_START_RUNS = 3
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import weather_handler
+imported = time.perf_counter()
+response = weather_handler.lambda_handler({'httpMethod': 'GET', 'path': %r}, None)
+done = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_invocation_seconds': done - imported,
+    'status_code': response['statusCode'],
+    'boto3_loaded': 'boto3' in sys.modules,
+    'numpy_loaded': 'numpy' in sys.modules,
+}))
+"""
+
+
+def _measure(path: str) -> dict:
+    """新しいプロセスでコールドスタートを計測"""
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE % path],
+        cwd=SRC_DIR,
+        env={**os.environ, 'PYTHONPATH': os.path.abspath(SHARED_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestColdStart:
+    """コールドスタートのテスト"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('path', ['/weather/types', '/unknown'])
+    def test_static_endpoints_do_not_load_boto3(self, path):
+        """DBを使わないエンドポイントではboto3が読み込まれないこと"""
+        measurement = _measure(path)
+
+        assert measurement['status_code'] in (200, 404)
+        assert measurement['boto3_loaded'] is False
+
+    @pytest.mark.unit
+    def test_import_does_not_load_numpy(self):
+        """numpy は統計・生成・予報の計算時まで読み込まれないこと"""
+        measurement = _measure('/weather/types')
+
+        assert measurement['numpy_loaded'] is False
+
+    @pytest.mark.unit
+    def test_cold_start_within_budget(self):
+        """import + 初回呼び出しが予算内に収まること"""
+        measurements = [_measure('/weather/types') for _ in range(COLD_START_RUNS)]
+        best = min(
+            m['import_seconds'] + m['first_invocation_seconds'] for m in measurements
+        )
+
+        assert best < COLD_START_BUDGET_SECONDS, (
+            f'cold start {best:.3f}s exceeds budget {COLD_START_BUDGET_SECONDS}s'
+        )
@@ -0,0 +1,382 @@
+"""csv_ingest のテスト"""
+
+import io
+import json
+import threading
+
+import boto3
+import pytest
+
+import app as csv_ingest
+import batch_write
+import city_registry
+from metrics import Metrics
+
+
+@pytest.fixture
+def csv_bucket(mock_dynamodb):
+    """CSVアップロード用のS3バケット"""
+    s3 = boto3.client('s3', region_name='ap-northeast-1')
+    s3.create_bucket(
+        Bucket='test-csv-bucket',
+        CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-1'},
+    )
+    return s3
+
+
+def _upload(s3, key: str, content: str) -> None:
+    s3.put_object(Bucket='test-csv-bucket', Key=key, Body=content.encode('utf-8'))
+
+
+@pytest.fixture(autouse=True)
+def _clear_known_city_ids(monkeypatch):
+    """登録済み都市IDのキャッシュをテストごとに破棄する"""
+    monkeypatch.setattr(csv_ingest, '_known_city_ids', None)
+
+
+class TestParseCsvRow:
+    """CSV行パースのテスト"""
+
+    @pytest.mark.unit
+    def test_valid_row(self):
+        """正しい行が項目に変換されること"""
+        item = csv_ingest.parse_csv_row(
+            ['13', '東京', '2', 'くもり', '30'], '2024-01-01T00:00:00', 1704067200
+        )
+
+        assert item['CityId'] == 13
+        assert item['WeatherName'] == 'くもり'
+        assert item['RainfallProbability'] == 30
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('row', [
+        ['13', '東京', '2', 'くもり'],
+        ['x', '東京', '2', 'くもり', '30'],
+        ['13', '', '2', 'くもり', '30'],
+        ['13', '東京', '2', 'くもり', '101'],
+        ['0', '東京', '2', 'くもり', '30'],
+        ['-1', '東京', '2', 'くもり', '30'],
+    ])
+    def test_invalid_rows(self, row):
+        """不正な行はNoneになること"""
+        assert csv_ingest.parse_csv_row(row, '2024-01-01T00:00:00', 1704067200) is None
+
+
+class TestProcessCsvFile:
+    """CSVファイル処理のテスト"""
+
+    @pytest.mark.integration
+    def test_saves_rows_and_updates_snapshot(self, csv_bucket, mock_dynamodb):
+        """行が保存され、スナップショットが更新されること"""
+        _upload(csv_bucket, 'data.csv', '1,札幌,1,晴れ,10\n13,東京,3,雨,80\nbad,row\n')
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        table = mock_dynamodb.Table('test-weather-table')
+        snapshot = table.get_item(Key={'CityId': 0, 'timestamp': 'LATEST'})['Item']
+        version = table.get_item(Key={'CityId': 0, 'timestamp': 'VERSION'})['Item']
+        assert (success, errors) == (2, 1)
+        assert snapshot['C13']['WeatherName'] == '雨'
+        assert version['version'] == 1
+
+    @pytest.mark.integration
+    def test_updates_aggregates(self, csv_bucket, mock_dynamodb):
+        """保存した行が時間・日単位の集計項目に加算されること"""
+        _upload(csv_bucket, 'data.csv', '1,札幌,1,晴れ,10\n13,東京,3,雨,80\n')
+
+        csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        table = mock_dynamodb.Table('test-weather-table')
+        items = table.query(
+            KeyConditionExpression='CityId = :all AND begins_with(#ts, :prefix)',
+            ExpressionAttributeNames={'#ts': 'timestamp'},
+            ExpressionAttributeValues={':all': -1, ':prefix': 'AGG#D#'},
+        )['Items']
+        assert len(items) == 1
+        assert items[0]['Count'] == 2
+        assert items[0]['RainfallSum'] == 90
+        assert items[0]['W_雨'] == 1
+        assert items[0]['RainfallValues'] == {10, 80}
+
+    @pytest.mark.integration
+    def test_rejects_unregistered_cities(self, csv_bucket, mock_dynamodb):
+        """API と同じ都市マスター（既定は同梱の cities.csv）にない都市IDの行はエラーになること"""
+        table = mock_dynamodb.Table('test-weather-table')
+        _upload(csv_bucket, 'data.csv', '1,札幌,1,晴れ,10\n13,東京,3,雨,80\n99,不明,1,晴れ,0\n')
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        assert (success, errors) == (2, 1)
+        assert table.query(
+            KeyConditionExpression='CityId = :city_id',
+            ExpressionAttributeValues={':city_id': 99},
+        )['Items'] == []
+
+    @pytest.mark.integration
+    def test_validates_against_city_partition_when_configured(
+        self, csv_bucket, mock_dynamodb, monkeypatch
+    ):
+        """CITY_REGISTRY_SOURCE=table の場合は API と同じく都市パーティションで検証すること"""
+        monkeypatch.setattr(city_registry, 'CITY_REGISTRY_SOURCE', 'table')
+        mock_dynamodb.Table('test-weather-table').put_item(
+            Item={'CityId': 0, 'timestamp': 'CITY#99', 'CityName': '新都市'}
+        )
+        _upload(csv_bucket, 'data.csv', '13,東京,3,雨,80\n99,新都市,1,晴れ,0\n')
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        assert (success, errors) == (1, 1)
+
+    @pytest.mark.integration
+    def test_empty_city_master_fails_closed(self, csv_bucket, mock_dynamodb, monkeypatch):
+        """都市マスターが空の場合は検証せずに取り込まず、失敗させること"""
+        monkeypatch.setattr(csv_ingest, 'load_configured_cities', lambda get_table: [])
+        _upload(csv_bucket, 'data.csv', '1,札幌,1,晴れ,10\n')
+
+        with pytest.raises(ValueError):
+            csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        assert mock_dynamodb.Table('test-weather-table').scan()['Items'] == []
+
+    @pytest.mark.integration
+    def test_known_city_ids_are_cached_across_files(self, csv_bucket, mock_dynamodb, monkeypatch):
+        """登録済み都市IDはキャッシュ期間中、ファイルごとに読み直さないこと"""
+        _upload(csv_bucket, 'data.csv', '1,札幌,1,晴れ,10\n')
+        load = csv_ingest.load_known_city_ids
+        loads = []
+        monkeypatch.setattr(
+            csv_ingest, 'load_known_city_ids', lambda: loads.append(1) or load()
+        )
+
+        for _ in range(3):
+            csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+        assert len(loads) == 1
+
+        monkeypatch.setattr(csv_ingest, 'CITY_CACHE_TTL_SECONDS', -1)
+        csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+        assert len(loads) == 2
+
+    @pytest.mark.integration
+    def test_rejects_reserved_city_ids(self, csv_bucket, mock_dynamodb):
+        """0以下の都市ID（スナップショット・集計項目のパーティション）の行はエラーになること"""
+        _upload(csv_bucket, 'data.csv', '0,都市,1,晴れ,10\n-1,都市,1,晴れ,10\n13,東京,3,雨,80\n')
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        table = mock_dynamodb.Table('test-weather-table')
+        snapshot = table.get_item(Key={'CityId': 0, 'timestamp': 'LATEST'})['Item']
+        all_scope = table.query(
+            KeyConditionExpression='CityId = :all',
+            ExpressionAttributeValues={':all': -1},
+        )['Items']
+        assert (success, errors) == (1, 2)
+        assert set(snapshot) == {'CityId', 'timestamp', 'C13'}
+        assert all(item['timestamp'].startswith('AGG#') for item in all_scope)
+        assert all(item['Count'] == 1 for item in all_scope)
+
+
+class TestBatchWriter:
+    """バッチ書き込みのテスト"""
+
+    @pytest.mark.integration
+    def test_duplicate_keys_are_merged(self, mock_dynamodb):
+        """同一キーの行は後勝ちで1項目になり、行数分成功と数えられること"""
+        writer = csv_ingest.BatchWriter('test-weather-table')
+        for rainfall in (10, 20, 30):
+            writer.put(csv_ingest.parse_csv_row(
+                ['13', '東京', '1', '晴れ', str(rainfall)], '2024-01-01T00:00:00', 1704067200
+            ))
+        writer.flush()
+
+        items = mock_dynamodb.Table('test-weather-table').scan()['Items']
+        assert writer.success_count == 3
+        assert len(items) == 1
+        assert items[0]['RainfallProbability'] == 30
+
+    @pytest.mark.unit
+    def test_unprocessed_rows_are_retried_then_counted(self, mock_dynamodb, monkeypatch):
+        """未処理項目が再送され、残ったものが失敗と数えられること"""
+        monkeypatch.setattr(batch_write.time, 'sleep', lambda _: None)
+
+        def always_unprocessed(RequestItems):
+            return {'UnprocessedItems': {
+                'test-weather-table': RequestItems['test-weather-table'][:1]
+            }}
+
+        monkeypatch.setattr(
+            csv_ingest.get_dynamodb().meta.client, 'batch_write_item', always_unprocessed
+        )
+        writer = csv_ingest.BatchWriter('test-weather-table')
+        for city_id in range(1, 4):
+            writer.put(csv_ingest.parse_csv_row(
+                [str(city_id), '都市', '1', '晴れ', '10'], '2024-01-01T00:00:00', 1704067200
+            ))
+        writer.flush()
+
+        assert (writer.success_count, writer.error_count) == (2, 1)
+        assert writer.retry_count == batch_write.BATCH_WRITE_MAX_RETRIES
+
+
+class TestParallelIngest:
+    """並列取り込みのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _register_cities(self, monkeypatch):
+        """都市ID 1〜30 を都市マスターに登録済みとする"""
+        monkeypatch.setattr(csv_ingest, 'load_known_city_ids', lambda: frozenset(range(1, 31)))
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('range_bytes', [1, 7, 20, 1024])
+    def test_ranged_processing_reads_each_row_once(
+        self, csv_bucket, mock_dynamodb, monkeypatch, range_bytes
+    ):
+        """範囲分割しても各行がちょうど1回処理されること"""
+        monkeypatch.setattr(csv_ingest, 'INGEST_RANGE_BYTES', range_bytes)
+        rows = [f'{city_id},都市{city_id},1,晴れ,{city_id % 100}' for city_id in range(1, 31)]
+        _upload(csv_bucket, 'data.csv', '\n'.join(rows + ['bad,row']) + '\n')
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        items = mock_dynamodb.Table('test-weather-table').scan()['Items']
+        assert (success, errors) == (30, 1)
+        assert len([item for item in items if item['CityId'] > 0]) == 30
+
+    @pytest.mark.integration
+    def test_ranges_are_fetched_with_bounded_requests(
+        self, csv_bucket, mock_dynamodb, monkeypatch
+    ):
+        """各範囲は終端付きで取得し、最後の行が続く場合のみ追加で取得すること"""
+        monkeypatch.setattr(csv_ingest, 'INGEST_RANGE_BYTES', 64)
+        monkeypatch.setattr(csv_ingest, 'RANGE_READ_SLACK_BYTES', 8)
+        rows = [f'{city_id},都市{city_id},1,晴れ,{city_id % 100}' for city_id in range(1, 31)]
+        content = '\n'.join(rows) + '\n'
+        _upload(csv_bucket, 'data.csv', content)
+        s3 = csv_ingest.get_s3()
+        get_object = s3.get_object
+        requested = []
+
+        def recording_get_object(**kwargs):
+            requested.append(kwargs['Range'])
+            return get_object(**kwargs)
+
+        monkeypatch.setattr(s3, 'get_object', recording_get_object)
+
+        success, errors = csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        assert (success, errors) == (30, 0)
+        assert all(not value.endswith('-') for value in requested)
+        # 行（約25バイト）が余分に読む8バイトに収まらない範囲は続きを取得する
+        ranges = csv_ingest.split_byte_ranges(len(content.encode('utf-8')), 64)
+        assert len(requested) > len(ranges)
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('range_bytes, content', [
+        (7, '1,札幌,1,晴れ,10\n13,東京,3\n27,大阪,2,くもり,x\n'),
+        # 複数行にまたがる行（範囲分割は行単位のため、1範囲の場合のみ）
+        (1024, '1,札幌,1,晴れ,10\n"13,東京\n",3,雨\n27,大阪,2,くもり,x\n'),
+    ])
+    def test_invalid_row_is_logged_with_file_offset(
+        self, csv_bucket, mock_dynamodb, monkeypatch, caplog, range_bytes, content
+    ):
+        """不正な行はファイル先頭からのバイト位置でログに出ること"""
+        monkeypatch.setattr(csv_ingest, 'INGEST_RANGE_BYTES', range_bytes)
+        _upload(csv_bucket, 'data.csv', content)
+
+        with caplog.at_level('WARNING'):
+            csv_ingest.process_csv_file('test-csv-bucket', 'data.csv')
+
+        offsets = sorted(
+            record.args[2] for record in caplog.records if 'Invalid format' in record.msg
+        )
+        # 不正な行は2行目から始まる行と最終行
+        encoded = content.encode('utf-8')
+        assert offsets == [encoded.index(b'\n') + 1, encoded.rindex(b'\n', 0, -1) + 1]
+
+    @pytest.mark.unit
+    def test_nested_mapping_does_not_add_threads(self, monkeypatch):
+        """入れ子の並列処理は呼び出し元のワーカースレッドで順に実行されること"""
+        monkeypatch.setattr(csv_ingest, 'INGEST_CONCURRENCY', 4)
+        threads = set()
+        lock = threading.Lock()
+
+        def inner(value):
+            with lock:
+                threads.add(threading.get_ident())
+            return value
+
+        def outer(values):
+            return csv_ingest._map_concurrently(inner, values)
+
+        results = csv_ingest._map_concurrently(outer, [[1, 2, 3]] * 8)
+
+        assert results == [[1, 2, 3]] * 8
+        assert len(threads) <= 4
+        assert threading.get_ident() not in threads
+
+    @pytest.mark.unit
+    def test_split_byte_ranges(self):
+        """バイト範囲が隙間なく分割されること"""
+        assert csv_ingest.split_byte_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+        assert csv_ingest.split_byte_ranges(0, 4) == []
+
+    @pytest.mark.integration
+    def test_multiple_records_are_merged(self, csv_bucket, mock_dynamodb):
+        """複数レコードの件数が合算されること"""
+        _upload(csv_bucket, 'a.csv', '1,札幌,1,晴れ,10\n')
+        _upload(csv_bucket, 'b.csv', '13,東京,3,雨,80\n27,大阪,2,くもり,x\n')
+        event = {'Records': [
+            {'s3': {'bucket': {'name': 'test-csv-bucket'}, 'object': {'key': key}}}
+            for key in ('a.csv', 'b.csv', 'missing.csv')
+        ]}
+
+        result = csv_ingest.lambda_handler(event, None)
+
+        assert result['body']['success_count'] == 2
+        assert result['body']['error_count'] == 2
+
+    @pytest.mark.integration
+    def test_one_summary_line_per_invocation(
+        self, csv_bucket, mock_dynamodb, lambda_context, caplog
+    ):
+        """呼び出しごとに API と同じ形式のサマリーが1行出力されること"""
+        _upload(csv_bucket, 'a.csv', '1,札幌,1,晴れ,10\n')
+        event = {'Records': [
+            {'s3': {'bucket': {'name': 'test-csv-bucket'}, 'object': {'key': 'a.csv'}}}
+        ]}
+
+        with caplog.at_level('INFO'):
+            csv_ingest.lambda_handler(event, lambda_context)
+
+        summaries = [
+            json.loads(record.getMessage())
+            for record in caplog.records
+            if 'request_summary' in record.getMessage()
+        ]
+        assert len(summaries) == 1
+        assert summaries[0]['request_id'] == 'test-request-id'
+        assert (summaries[0]['records'], summaries[0]['success_count']) == (1, 1)
+
+
+class TestIngestMetrics:
+    """取り込みメトリクスのテスト"""
+
+    @pytest.mark.unit
+    def test_emits_rows_per_second_and_retries(self, monkeypatch):
+        """スループットと再送回数が単位付きでEMFで出力されること"""
+        stream = io.StringIO()
+        metrics = Metrics(namespace='Test', service='csv-ingest', stream=stream)
+        monkeypatch.setattr(csv_ingest, 'METRICS', metrics)
+        metrics.count('WriteRetries', 3)
+
+        csv_ingest.emit_ingest_metrics(100, 2, 0.5)
+
+        document = json.loads(stream.getvalue())
+        units = {
+            m['Name']: m['Unit'] for m in document['_aws']['CloudWatchMetrics'][0]['Metrics']
+        }
+        assert document['RowsPerSecond'] == 200.0
+        assert document['WriteRetries'] == 3
+        assert document['RowErrors'] == 2
+        assert document['Service'] == 'csv-ingest'
+        assert units['RowsPerSecond'] == 'Count/Second'
+        assert units['IngestDuration'] == 'Milliseconds'
@@ -0,0 +1,362 @@
+"""database のテスト"""
+
+import pytest
+
+import batch_write
+import database
+import derived_items
+from database import WeatherDatabase
+from exceptions import DatabaseError, ValidationError
+from models import WeatherData, CITIES
+
+
+def _make_weather(city_id: int, timestamp: str = '2024-01-01T12:00:00') -> WeatherData:
+    return WeatherData(
+        city_id=city_id,
+        city_name=f'都市{city_id}',
+        weather_id=1,
+        weather_name='晴れ',
+        rainfall_probability=10,
+        timestamp=timestamp,
+        ttl=1704153600,
+    )
+
+
+class TestSaveMultipleWeatherData:
+    """一括保存のテスト"""
+
+    @pytest.mark.integration
+    def test_saves_more_than_one_batch(self, mock_dynamodb):
+        """25件を超えるデータが全て保存されること"""
+        db = WeatherDatabase()
+        weather_list = [_make_weather(city_id) for city_id in range(1, 61)]
+
+        success, errors = db.save_multiple_weather_data(weather_list)
+
+        assert (success, errors) == (60, 0)
+        assert db.table.scan()['Count'] == 60
+
+    @pytest.mark.unit
+    def test_retries_unprocessed_items(self, mock_dynamodb, monkeypatch):
+        """UnprocessedItemsが再送されること"""
+        db = WeatherDatabase()
+        monkeypatch.setattr(batch_write.time, 'sleep', lambda _: None)
+
+        real_batch_write = db.dynamodb.batch_write_item
+        calls = []
+
+        def flaky_batch_write(RequestItems):
+            requests = RequestItems[db.table_name]
+            calls.append(len(requests))
+            if len(calls) == 1:
+                # 初回は後半を未処理として返す
+                real_batch_write(RequestItems={db.table_name: requests[:2]})
+                return {'UnprocessedItems': {db.table_name: requests[2:]}}
+            return real_batch_write(RequestItems=RequestItems)
+
+        monkeypatch.setattr(db.dynamodb, 'batch_write_item', flaky_batch_write)
+
+        success, errors = db.save_multiple_weather_data(
+            [_make_weather(city_id) for city_id in range(1, 6)]
+        )
+
+        assert (success, errors) == (5, 0)
+        assert calls == [5, 3]
+
+    @pytest.mark.unit
+    def test_reports_items_that_stay_unprocessed(self, mock_dynamodb, monkeypatch):
+        """再送上限を超えた項目が失敗件数に数えられること"""
+        db = WeatherDatabase()
+        monkeypatch.setattr(batch_write.time, 'sleep', lambda _: None)
+
+        def always_unprocessed(RequestItems):
+            return {'UnprocessedItems': {db.table_name: RequestItems[db.table_name][:1]}}
+
+        monkeypatch.setattr(db.dynamodb, 'batch_write_item', always_unprocessed)
+
+        weather_list = [_make_weather(city_id) for city_id in range(1, 31)]
+
+        # 25件バッチと5件バッチでそれぞれ先頭の1件ずつ失敗する
+        assert db.save_multiple_weather_data(weather_list) == (28, 2)
+        saved = db.save_weather_batch(weather_list)
+        assert len(saved) == 28
+        assert 1 not in saved.city_ids and 26 not in saved.city_ids
+
+
+class TestGetAllCitiesLatestWeather:
+    """全都市取得のテスト"""
+
+    @pytest.mark.integration
+    def test_returns_latest_for_each_city_in_order(self, mock_dynamodb):
+        """各都市の最新データが都市マスター順で返されること"""
+        db = WeatherDatabase(read_concurrency=4)
+        city_ids = list(CITIES.keys())
+        db.save_multiple_weather_data(
+            [_make_weather(city_id, '2024-01-01T00:00:00') for city_id in city_ids]
+            + [_make_weather(city_id, '2024-01-01T06:00:00') for city_id in city_ids]
+        )
+
+        results = db.get_all_cities_latest_weather()
+
+        assert [w.city_id for w in results] == city_ids
+        assert all(w.timestamp == '2024-01-01T06:00:00' for w in results)
+
+    @pytest.mark.unit
+    def test_skips_failed_cities(self, mock_dynamodb, monkeypatch):
+        """一部の都市の取得失敗は他の都市に影響しないこと"""
+        db = WeatherDatabase(read_concurrency=4)
+        failing_city = list(CITIES.keys())[0]
+
+        def get_latest(city_id):
+            if city_id == failing_city:
+                raise DatabaseError('boom')
+            return _make_weather(city_id)
+
+        monkeypatch.setattr(db, 'get_latest_weather', get_latest)
+
+        results = db.get_all_cities_latest_weather()
+
+        assert failing_city not in [w.city_id for w in results]
+        assert len(results) == len(CITIES) - 1
+
+    @pytest.mark.unit
+    def test_raises_when_all_cities_fail(self, mock_dynamodb, monkeypatch):
+        """全都市の取得に失敗した場合はDatabaseErrorになること"""
+        db = WeatherDatabase(read_concurrency=4)
+
+        def get_latest(city_id):
+            raise DatabaseError('boom')
+
+        monkeypatch.setattr(db, 'get_latest_weather', get_latest)
+
+        with pytest.raises(DatabaseError):
+            db.get_all_cities_latest_weather()
+
+
+class TestLatestSnapshot:
+    """最新スナップショット項目のテスト"""
+
+    @pytest.mark.integration
+    def test_returns_none_before_first_write(self, mock_dynamodb):
+        """スナップショット未作成時はNoneを返すこと"""
+        db = WeatherDatabase()
+
+        assert db.get_latest_snapshot() is None
+        assert db.get_snapshot_version() is None
+
+    @pytest.mark.integration
+    def test_update_merges_cities_and_increments_version(self, mock_dynamodb):
+        """都市ごとにマージされ、書き込みごとにversionが増えること"""
+        db = WeatherDatabase()
+        city_ids = list(CITIES.keys())
+        future_ttl = 4102444800  # 2100-01-01
+
+        first = [_make_weather(city_id) for city_id in city_ids]
+        for weather in first:
+            weather.ttl = future_ttl
+        db.update_latest_snapshot(first)
+
+        second = _make_weather(city_ids[0], '2024-01-01T18:00:00')
+        second.ttl = future_ttl
+        db.update_latest_snapshot([second])
+
+        snapshot = db.get_latest_snapshot()
+        item = db.table.get_item(Key={'CityId': 0, 'timestamp': 'LATEST'})['Item']
+        version = db.table.get_item(Key={'CityId': 0, 'timestamp': 'VERSION'})['Item']
+
+        assert [w.city_id for w in snapshot] == city_ids
+        assert snapshot[0].timestamp == '2024-01-01T18:00:00'
+        assert snapshot[1].timestamp == '2024-01-01T12:00:00'
+        assert 'version' not in item
+        assert version == {'CityId': 0, 'timestamp': 'VERSION', 'version': 2}
+        assert db.get_snapshot_version() == 2
+
+    @pytest.mark.integration
+    def test_expired_entries_are_excluded(self, mock_dynamodb):
+        """TTLを過ぎた都市は返されないこと"""
+        db = WeatherDatabase()
+        db.update_latest_snapshot([_make_weather(list(CITIES.keys())[0])])
+
+        assert db.get_latest_snapshot() == []
+
+    @pytest.mark.integration
+    def test_subset_reads_only_requested_cities(self, mock_dynamodb):
+        """city_ids を指定すると指定順にその都市のみ返すこと"""
+        db = WeatherDatabase()
+        weather_list = [_make_weather(city_id) for city_id in CITIES.keys()]
+        for weather in weather_list:
+            weather.ttl = 4102444800  # 2100-01-01
+        db.update_latest_snapshot(weather_list)
+
+        assert [w.city_id for w in db.get_latest_snapshot([27, 13, 99])] == [27, 13]
+        assert db.get_latest_snapshot([99]) == []
+
+    @pytest.mark.integration
+    def test_subset_read_returns_none_before_first_write(self, mock_dynamodb):
+        """射影式で読む場合もスナップショット未作成ならNoneを返すこと"""
+        assert WeatherDatabase().get_latest_snapshot([13]) is None
+
+
+class TestHistory:
+    """履歴クエリのテスト"""
+
+    @staticmethod
+    def _save_hours(db, city_id: int, hours: int) -> None:
+        db.save_multiple_weather_data(
+            [_make_weather(city_id, f'2024-01-01T{hour:02d}:00:00') for hour in range(hours)]
+        )
+
+    @pytest.mark.integration
+    def test_page_is_limited_to_range_and_projected(self, mock_dynamodb):
+        """期間内の項目のみ、必要な属性だけを新しい順に返すこと"""
+        db = WeatherDatabase()
+        self._save_hours(db, 13, 10)
+        self._save_hours(db, 27, 3)
+
+        items, last_key = db.query_history_page(
+            13, '2024-01-01T02:00:00', '2024-01-01T05:00:00', limit=10
+        )
+
+        assert [item['timestamp'] for item in items] == [
+            '2024-01-01T05:00:00', '2024-01-01T04:00:00',
+            '2024-01-01T03:00:00', '2024-01-01T02:00:00',
+        ]
+        assert set(items[0]) == {'timestamp', 'WeatherId', 'WeatherName', 'RainfallProbability'}
+        assert last_key is None
+
+    @pytest.mark.integration
+    def test_iter_pages_follows_last_evaluated_key(self, mock_dynamodb):
+        """LastEvaluatedKey を辿って全ページを順に返すこと"""
+        db = WeatherDatabase()
+        self._save_hours(db, 13, 7)
+
+        pages = list(
+            db.iter_history_pages(
+                13, '2024-01-01T00:00:00', '2024-01-01T23:59:59', page_size=3, newest_first=False
+            )
+        )
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert pages[0][0]['timestamp'] == '2024-01-01T00:00:00'
+        assert pages[-1][-1]['timestamp'] == '2024-01-01T06:00:00'
+
+
+@pytest.mark.unit
+class TestPageToken:
+    """継続トークンのテスト"""
+
+    def test_round_trip(self):
+        """トークンから元のキーに戻せること"""
+        key = {'CityId': 13, 'timestamp': '2024-01-01T12:00:00'}
+
+        token = database.encode_page_token(key)
+
+        assert '=' not in token
+        assert database.decode_page_token(token, 13) == key
+        assert database.encode_page_token(None) is None
+
+    @pytest.mark.parametrize('token', ['not-a-token', 'e30'])
+    def test_rejects_malformed_token(self, token):
+        """不正なトークンはValidationErrorになること"""
+        with pytest.raises(ValidationError):
+            database.decode_page_token(token, 13)
+
+    def test_rejects_token_for_other_city(self):
+        """別都市のトークンは受け付けないこと"""
+        token = database.encode_page_token({'CityId': 27, 'timestamp': '2024-01-01T12:00:00'})
+
+        with pytest.raises(ValidationError):
+            database.decode_page_token(token, 13)
+
+
+class TestAggregates:
+    """時間・日単位の集計項目のテスト"""
+
+    @pytest.mark.integration
+    def test_writes_accumulate_per_city_and_all(self, mock_dynamodb):
+        """書き込みごとに件数・合計・天気別件数・最小/最大が加算されること"""
+        db = WeatherDatabase()
+        first = _make_weather(13, '2024-01-01T12:00:00')
+        second = _make_weather(13, '2024-01-01T12:30:00')
+        second.weather_name = '雨'
+        second.rainfall_probability = 90
+        other = _make_weather(27, '2024-01-01T13:00:00')
+
+        db.update_aggregates([first])
+        db.update_aggregates([second, other])
+
+        city_hour = db.query_aggregates('hour', 13, '2024-01-01T12', '2024-01-01T12')
+        all_day = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')
+        all_hours = db.query_aggregates('hour', 'ALL', '2024-01-01T00', '2024-01-01T23')
+
+        assert len(city_hour) == 1
+        assert city_hour[0]['Count'] == 2
+        assert city_hour[0]['RainfallSum'] == 100
+        assert city_hour[0]['W_晴れ'] == 1
+        assert city_hour[0]['W_雨'] == 1
+        assert city_hour[0]['RainfallValues'] == {10, 90}
+        assert all_day[0]['Count'] == 3
+        assert [item['Bucket'] for item in all_hours] == ['2024-01-01T12', '2024-01-01T13']
+
+    @pytest.mark.integration
+    def test_same_readings_are_not_counted_twice(self, mock_dynamodb):
+        """同じ観測値で再実行しても集計は二重に加算されないこと"""
+        db = WeatherDatabase()
+        readings = [_make_weather(13), _make_weather(27)]
+
+        assert db.update_aggregates(readings) == 6
+        assert db.update_aggregates(readings) == 0
+
+        all_day = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')
+        assert all_day[0]['Count'] == 2
+
+    @pytest.mark.integration
+    def test_write_ids_are_kept_for_two_windows(self, mock_dynamodb, monkeypatch):
+        """書き込みIDは現在と直前の期間の分のみ残り、直前の期間の再送は加算されないこと"""
+        db = WeatherDatabase()
+        window = derived_items.AGGREGATE_BATCHES_WINDOW_SECONDS
+        clock = [1704067200]
+        monkeypatch.setattr(derived_items.time, 'time', lambda: clock[0])
+        first = [_make_weather(13, '2024-01-01T12:00:00')]
+
+        assert db.update_aggregates(first) == 4
+        clock[0] += window
+        assert db.update_aggregates(first) == 0
+        for hour in (13, 14, 15):
+            db.update_aggregates([_make_weather(27, f'2024-01-01T{hour}:00:00')])
+            clock[0] += window
+
+        all_day = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')[0]
+        batches = [name for name in all_day if name.startswith('Batches')]
+        assert all_day['Count'] == 4
+        assert len(batches) == 2
+        assert sum(len(all_day[name]) for name in batches) == 2
+
+    @pytest.mark.integration
+    def test_partial_failure_can_be_retried(self, mock_dynamodb, monkeypatch):
+        """一部の項目が失敗した場合はエラーになり、再実行で未反映の項目のみ加算されること"""
+        monkeypatch.setattr(derived_items.time, 'sleep', lambda _: None)
+        update_item = WeatherDatabase._update_item
+        failing_keys = {(-1, 'AGG#D#2024-01-01')}
+
+        def flaky_update_item(self, **params):
+            key = (params['Key']['CityId'], params['Key']['timestamp'])
+            if key in failing_keys:
+                raise RuntimeError('throttled')
+            return update_item(self, **params)
+
+        monkeypatch.setattr(WeatherDatabase, '_update_item', flaky_update_item)
+        db = WeatherDatabase()
+        readings = [_make_weather(13), _make_weather(27)]
+
+        with pytest.raises(DatabaseError):
+            db.update_aggregates(readings)
+        assert db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01') == []
+
+        failing_keys.clear()
+        assert db.update_aggregates(readings) == 1
+
+        city_hour = db.query_aggregates('hour', 13, '2024-01-01T12', '2024-01-01T12')
+        all_day = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')
+        assert city_hour[0]['Count'] == 1
+        assert all_day[0]['Count'] == 2
@@ -0,0 +1,126 @@
+"""derived_items（API・CSV取り込みで共有する派生項目の更新）のテスト"""
+
+import pytest
+
+import app as csv_ingest
+import derived_items
+from database import WeatherDatabase
+from models import WeatherData
+
+READINGS = [
+    (13, '2024-01-01T12:00:00', '晴れ', 10),
+    (1, '2024-01-01T12:00:00', '雨', 70),
+]
+
+
+def _weather_list() -> list[WeatherData]:
+    return [
+        WeatherData(
+            city_id=city_id,
+            city_name=f'都市{city_id}',
+            weather_id=1,
+            weather_name=weather_name,
+            rainfall_probability=rainfall,
+            timestamp=timestamp,
+            ttl=1704153600,
+        )
+        for city_id, timestamp, weather_name, rainfall in READINGS
+    ]
+
+
+def _csv_items() -> list[dict]:
+    return [
+        csv_ingest.parse_csv_row(
+            [str(city_id), f'都市{city_id}', '1', weather_name, str(rainfall)],
+            timestamp,
+            1704153600,
+        )
+        for city_id, timestamp, weather_name, rainfall in READINGS
+    ]
+
+
+def _record_update_items(monkeypatch) -> tuple[list, list]:
+    """API側・CSV取り込み側それぞれの UpdateItem パラメータを記録する"""
+    monkeypatch.setattr(derived_items.time, 'time', lambda: 1704067200)
+    api_calls, csv_calls = [], []
+    monkeypatch.setattr(
+        WeatherDatabase, '_update_item', lambda self, **params: api_calls.append(params)
+    )
+    monkeypatch.setattr(
+        csv_ingest, '_update_item', lambda table: lambda **params: csv_calls.append(params)
+    )
+    return api_calls, csv_calls
+
+
+def _sorted_by_key(calls: list) -> list:
+    return sorted(calls, key=lambda params: params['Key']['timestamp'])
+
+
+@pytest.mark.unit
+class TestDerivedItems:
+    """派生項目の更新パラメータのテスト"""
+
+    def test_deltas_are_combined_per_bucket(self):
+        """同じ期間・対象の観測値は1件の加算にまとめられること"""
+        deltas = derived_items.build_aggregate_deltas([
+            (13, '2024-01-01T12:00:00', '晴れ', 10),
+            (13, '2024-01-01T12:10:00', '晴れ', 30),
+            (1, '2024-01-01T12:10:00', '雨', 70),
+        ])
+
+        assert len(deltas) == 6  # (都市13, 都市1, ALL) x (時間, 日)
+        assert deltas[(-1, 'AGG#H#2024-01-01T12')]['count'] == 3
+        assert deltas[(-14, 'AGG#D#2024-01-01')]['weather'] == {'晴れ': 2}
+
+    def test_batch_id_depends_only_on_readings(self):
+        """書き込みIDは観測値（都市ID・timestamp）の組で決まり、順序に依存しないこと"""
+        readings = [(13, '2024-01-01T12:00:00', '晴れ', 10), (1, '2024-01-01T12:00:00', '雨', 70)]
+        key = (-1, 'AGG#D#2024-01-01')
+
+        forward = derived_items.build_aggregate_deltas(readings)[key]
+        backward = derived_items.build_aggregate_deltas(readings[::-1])[key]
+        single = derived_items.build_aggregate_deltas(readings[:1])[key]
+
+        assert derived_items.aggregate_batch_id(forward) == (
+            derived_items.aggregate_batch_id(backward)
+        )
+        assert derived_items.aggregate_batch_id(forward) != (
+            derived_items.aggregate_batch_id(single)
+        )
+
+    def test_snapshot_is_split_into_chunks_then_version_is_bumped(self):
+        """都市数が上限を超える場合はチャンクごとに更新し、最後にバージョン項目を1回だけ加算すること"""
+        entries = {city_id: {'WeatherName': '晴れ'} for city_id in range(1, 151)}
+        calls = []
+
+        derived_items.write_latest_snapshot(lambda **params: calls.append(params), entries)
+
+        assert [call['Key']['timestamp'] for call in calls] == ['LATEST', 'LATEST', 'VERSION']
+        assert len(calls[0]['ExpressionAttributeValues']) == 100
+        assert calls[1]['ExpressionAttributeNames']['#c0'] == 'C101'
+        assert calls[2]['UpdateExpression'] == 'ADD #version :one'
+
+    def test_api_and_csv_ingest_issue_identical_aggregate_updates(self, monkeypatch):
+        """同じ観測値から API と CSV取り込みが同一の集計 UpdateItem を発行すること"""
+        api_calls, csv_calls = _record_update_items(monkeypatch)
+
+        WeatherDatabase(read_concurrency=1).update_aggregates(_weather_list())
+        csv_ingest.update_aggregates(None, _csv_items())
+
+        assert len(api_calls) == 6
+        assert _sorted_by_key(api_calls) == _sorted_by_key(csv_calls)
+
+    def test_api_and_csv_ingest_issue_identical_snapshot_updates(self, monkeypatch):
+        """同じ都市の最新値から API と CSV取り込みが同じ形の UpdateItem を発行すること"""
+        api_calls, csv_calls = _record_update_items(monkeypatch)
+
+        WeatherDatabase().update_latest_snapshot(_weather_list())
+        csv_ingest.update_latest_snapshot(None, _csv_items())
+
+        assert len(api_calls) == len(csv_calls) == 2
+        for name in ('Key', 'UpdateExpression', 'ExpressionAttributeNames'):
+            assert api_calls[0][name] == csv_calls[0][name]
+        assert api_calls[0]['ExpressionAttributeValues'].keys() == (
+            csv_calls[0]['ExpressionAttributeValues'].keys()
+        )
+        assert api_calls[1] == csv_calls[1]
@@ -0,0 +1,115 @@
+"""forecast_engine のテスト"""
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import forecast_engine
+from forecast_engine import ForecastEngine
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not forecast_engine.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+SUNNY, CLOUDY, RAINY = 0, 1, 2
+
+
+def _observe_sequence(engine, city_id, states, rainfall=None):
+    for hour, state in enumerate(states):
+        value = rainfall[hour] if rainfall else 10
+        engine.observe(city_id, f'2024-01-01T{hour:02d}:00:00', state, value)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('use_numpy', ENGINES)
+class TestForecastEngine:
+    """予報エンジンのテスト"""
+
+    def test_transition_matrix_from_counts(self, use_numpy):
+        """smoothing=0 では遷移行列が観測した遷移の割合になること"""
+        engine = ForecastEngine(smoothing=0, use_numpy=use_numpy)
+        _observe_sequence(engine, 13, [SUNNY, SUNNY, RAINY, SUNNY, SUNNY])
+
+        matrix = engine.transition_matrix(13)
+
+        assert matrix[SUNNY] == pytest.approx([2 / 3, 0, 1 / 3])
+        assert matrix[RAINY] == pytest.approx([1, 0, 0])
+        # 都市でも全都市でも遷移がない状態は一様分布
+        assert matrix[CLOUDY] == pytest.approx([1 / 3, 1 / 3, 1 / 3])
+
+    def test_older_observations_are_ignored(self, use_numpy):
+        """最後の観測以前の観測は加算しないこと"""
+        engine = ForecastEngine(use_numpy=use_numpy)
+        _observe_sequence(engine, 1, [SUNNY, RAINY])
+
+        assert engine.observe(1, '2024-01-01T01:00:00', SUNNY, 0) is False
+        assert engine.observe(1, '2024-01-01T02:00:00', SUNNY, 0) is True
+        assert engine.last_observation(1) == ('2024-01-01T02:00:00', SUNNY)
+
+    def test_unknown_city_uses_global_matrix(self, use_numpy):
+        """観測のない都市は全都市の遷移行列で予報すること"""
+        engine = ForecastEngine(smoothing=0, use_numpy=use_numpy)
+        _observe_sequence(engine, 1, [SUNNY, RAINY, SUNNY, RAINY])
+
+        forecast = engine.forecast({99: SUNNY}, 2)
+
+        probabilities, _ = forecast[99]
+        assert probabilities[0] == pytest.approx([0, 0, 1])
+        assert probabilities[1] == pytest.approx([1, 0, 0])
+
+    def test_expected_rainfall_uses_observed_means(self, use_numpy):
+        """降水確率の期待値は状態別の平均降水確率で重み付けすること"""
+        engine = ForecastEngine(smoothing=0, use_numpy=use_numpy)
+        _observe_sequence(engine, 13, [SUNNY, RAINY, SUNNY, RAINY], rainfall=[0, 80, 10, 90])
+
+        probabilities, rainfall = engine.forecast({13: SUNNY}, 1)[13]
+
+        assert probabilities[0] == pytest.approx([0, 0, 1])
+        assert rainfall[0] == pytest.approx(85)
+
+    def test_refits_after_new_observations(self, use_numpy):
+        """観測を加算すると次の予報で遷移行列が作り直されること"""
+        engine = ForecastEngine(smoothing=0, use_numpy=use_numpy)
+        _observe_sequence(engine, 1, [SUNNY, SUNNY])
+        assert engine.transition_matrix(1)[SUNNY] == pytest.approx([1, 0, 0])
+
+        engine.observe(1, '2024-01-01T05:00:00', CLOUDY, 30)
+
+        assert engine.transition_matrix(1)[SUNNY] == pytest.approx([0.5, 0.5, 0])
+
+
+@pytest.mark.property
+@pytest.mark.skipif(not forecast_engine.HAS_NUMPY, reason='numpy 未インストール')
+@settings(max_examples=30)
+@given(
+    sequences=st.dictionaries(
+        st.integers(min_value=1, max_value=20),
+        st.lists(st.integers(min_value=0, max_value=2), min_size=1, max_size=24),
+        min_size=1,
+        max_size=8,
+    ),
+    steps=st.integers(min_value=1, max_value=12),
+)
+def test_numpy_and_python_forecasts_match(sequences, steps):
+    """NumPy 実装と純Python実装の予報が一致し、確率の合計が1になること"""
+    engines = [ForecastEngine(use_numpy=False), ForecastEngine(use_numpy=True)]
+    for engine in engines:
+        for city_id, states in sequences.items():
+            _observe_sequence(engine, city_id, states, rainfall=[state * 40 for state in states])
+    current = {city_id: states[-1] for city_id, states in sequences.items()}
+    current[99] = SUNNY
+
+    python_result, numpy_result = (engine.forecast(current, steps) for engine in engines)
+
+    for city_id in current:
+        p_python, r_python = python_result[city_id]
+        p_numpy, r_numpy = numpy_result[city_id]
+        assert len(p_python) == steps
+        assert r_numpy == pytest.approx(r_python)
+        for step_python, step_numpy in zip(p_python, p_numpy):
+            assert step_numpy == pytest.approx(step_python)
+            assert sum(step_python) == pytest.approx(1)
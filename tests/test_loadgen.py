@@ -0,0 +1,89 @@
+"""負荷生成ツールのテスト"""
+
+import json
+
+import pytest
+
+from benchmarks import loadgen
+from weather_handler import lambda_handler
+
+
+@pytest.mark.unit
+class TestEventBuilders:
+    """合成イベントのテスト"""
+
+    def test_rest_event_routes_with_claims(self, mock_dynamodb, lambda_context):
+        """REST API 形式のイベントが認証付きで処理される"""
+        event = loadgen.build_rest_event(
+            'GET', '/weather/13', resource='/weather/{city_id}',
+            claims=loadgen.make_claims(1), path_parameters={'city_id': '13'},
+        )
+
+        response = lambda_handler(event, lambda_context)
+
+        assert event['requestContext']['authorizer']['claims']['cognito:username'] == 'loadtest-user-1'
+        assert response['statusCode'] in (200, 404)
+        assert response['statusCode'] != 401
+
+    def test_http_event_routes_with_jwt_claims(self, mock_dynamodb, lambda_context):
+        """HTTP API 形式（2.0）のイベントもルーティング・認証される"""
+        event = loadgen.build_http_event(
+            'GET', '/weather/types', claims=loadgen.make_claims(2)
+        )
+
+        response = lambda_handler(event, lambda_context)
+
+        assert 'httpMethod' not in event
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['success'] is True
+
+    def test_http_event_without_claims_is_rejected(self, lambda_context):
+        """HTTP API 形式でもクレームがなければ 401"""
+        event = loadgen.build_http_event('GET', '/weather/statistics')
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 401
+
+    def test_generate_events_is_reproducible(self):
+        """シードを固定すると同じルート構成になる"""
+        first = [name for name, _ in loadgen.generate_events(50, seed=7)]
+        second = [name for name, _ in loadgen.generate_events(50, seed=7)]
+
+        assert first == second
+        assert set(first) <= {entry[0] for entry in loadgen.ROUTE_MIX}
+
+
+@pytest.mark.unit
+class TestReport:
+    """集計のテスト"""
+
+    def test_percentiles_and_error_rates(self):
+        """パーセンタイルとエラー率を算出"""
+        report = loadgen.LoadReport(mode='thread', api='rest', concurrency=1, elapsed_seconds=2.0)
+        for latency in range(1, 101):
+            report.record('get_weather', 200, float(latency))
+        report.record('not_found', 404, 1.0)
+        report.record('get_weather', 500, 1.0)
+
+        summary = report.summary()
+        route = summary['routes']['get_weather']
+
+        assert route['requests'] == 101
+        assert route['p50_ms'] == 50.0
+        assert route['p99_ms'] == 99.0
+        assert route['error_rate'] == round(1 / 101, 4)
+        assert summary['routes']['not_found']['client_error_rate'] == 1.0
+        assert summary['total']['throughput_rps'] == 51.0
+        assert 'TOTAL' in report.format_table()
+
+
+@pytest.mark.integration
+def test_run_load_with_threads(mock_dynamodb):
+    """スレッドで並列に処理し、全リクエストを集計する"""
+    events = loadgen.generate_events(40, seed=1)
+
+    report = loadgen.run_load(events, concurrency=4, backend='local')
+
+    assert report.total().summary(report.elapsed_seconds)['requests'] == 40
+    assert report.total().server_errors == 0
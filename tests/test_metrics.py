@@ -0,0 +1,69 @@
+"""metrics のテスト"""
+
+import io
+import json
+
+import pytest
+
+from metrics import Histogram, Metrics
+from weather_handler import lambda_handler
+
+
+class TestHistogram:
+    """Histogramのテスト"""
+
+    @pytest.mark.unit
+    def test_summary(self):
+        """件数・最小・最大・パーセンタイルが集計されること"""
+        histogram = Histogram(buckets=(1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.record(value)
+
+        summary = histogram.summary()
+
+        assert summary['count'] == 5
+        assert summary['min'] == 0.5
+        assert summary['max'] == 500
+        assert summary['p50'] == 10
+        assert summary['p99'] == 500
+
+
+class TestMetrics:
+    """Metricsのテスト"""
+
+    @pytest.mark.unit
+    def test_flush_writes_embedded_metric_format(self):
+        """spanとカウンターがEMFで出力されリセットされること"""
+        stream = io.StringIO()
+        metrics = Metrics(namespace='Test', service='test-api', stream=stream)
+
+        with metrics.span('db.query'):
+            pass
+        with metrics.span('db.query'):
+            pass
+        metrics.count('retries', 2)
+        metrics.flush(Route='handle_test')
+
+        document = json.loads(stream.getvalue())
+        definition = document['_aws']['CloudWatchMetrics'][0]
+        assert definition['Namespace'] == 'Test'
+        assert definition['Dimensions'] == [['Service', 'Route']]
+        assert {m['Name'] for m in definition['Metrics']} == {'db.query', 'retries'}
+        assert len(document['db.query']) == 2
+        assert document['retries'] == 2
+        assert metrics.flush() is None
+        assert metrics.summary()['db.query']['count'] == 2
+
+    @pytest.mark.unit
+    def test_handler_emits_stage_spans(self, authenticated_event, lambda_context, capsys):
+        """ハンドラー呼び出しごとに認証・エンコードの区間が出力されること"""
+        event = {**authenticated_event, 'path': '/weather/999'}
+
+        lambda_handler(event, lambda_context)
+
+        lines = [line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+        document = json.loads(lines[-1])
+        assert document['Route'] == 'handle_get_weather_by_city'
+        assert 'auth' in document
+        assert 'encode' in document
+        assert 'handler' in document
@@ -1,7 +1,16 @@
 """models のテスト"""
 
+import base64
+import gzip
 import pytest
-from models import WeatherData, ApiResponse, ErrorResponse, CITIES, WEATHER_TYPES
+import json
+from decimal import Decimal
+
+import models
+from models import (
+    WeatherData, WeatherBatch, ApiResponse, ErrorResponse, CITIES, WEATHER_TYPES,
+    PrecompiledResponse, encode_json, compress_response, negotiate_encoding, accepts_binary,
+)
 
 
 class TestCities:
@@ -87,6 +96,51 @@ class TestWeatherData:
         assert result['ttl'] == 1704153600
 
 
+class TestWeatherBatch:
+    """WeatherBatchモデルのテスト"""
+
+    @staticmethod
+    def _weather_list():
+        return [
+            WeatherData(
+                city_id=13, city_name='東京', weather_id=1, weather_name='晴れ',
+                rainfall_probability=10, timestamp='2024-01-01T12:00:00',
+                ttl=1704153600,
+            ),
+            WeatherData(
+                city_id=27, city_name='大阪', weather_id=3, weather_name='雨',
+                rainfall_probability=80, timestamp='2024-01-01T12:00:00',
+            ),
+        ]
+
+    @pytest.mark.unit
+    def test_to_dicts_matches_weather_data(self):
+        """to_dictsがWeatherData.to_dictと同じ結果を返すこと"""
+        weather_list = self._weather_list()
+        batch = WeatherBatch.from_weather_list(weather_list)
+
+        assert len(batch) == 2
+        assert batch.to_dicts() == [w.to_dict() for w in weather_list]
+        assert list(batch) == weather_list
+
+    @pytest.mark.unit
+    def test_items_round_trip(self):
+        """DynamoDB項目との相互変換で値が保たれること"""
+        batch = WeatherBatch.from_weather_list(self._weather_list())
+
+        items = batch.to_items()
+
+        assert items[0]['RainfallProbability'] == Decimal(10)
+        assert isinstance(items[0]['ttl'], Decimal)
+        assert 'ttl' not in items[1]
+        assert WeatherBatch.from_items(items).to_dicts() == batch.to_dicts()
+
+    @pytest.mark.unit
+    def test_weather_data_uses_slots(self):
+        """WeatherDataがインスタンス辞書を持たないこと"""
+        assert not hasattr(self._weather_list()[0], '__dict__')
+
+
 class TestApiResponse:
     """ApiResponseモデルのテスト"""
 
@@ -105,6 +159,101 @@ class TestApiResponse:
         assert result['headers']['Content-Type'] == 'application/json; charset=utf-8'
 
 
+class TestCompressResponse:
+    """レスポンス圧縮のテスト"""
+
+    LARGE_BODY = {
+        'data': [{'CityId': i, 'CityName': '東京', 'WeatherName': '晴れ'} for i in range(100)],
+    }
+
+    @pytest.mark.unit
+    def test_large_body_is_gzipped(self):
+        """閾値以上のボディは gzip して base64 で返すこと"""
+        response = ApiResponse(200, self.LARGE_BODY).to_lambda_response()
+        response['headers'] = {**response['headers'], 'ETag': '"3-abc"'}
+
+        result = compress_response(response, 'gzip, deflate')
+
+        assert result['isBase64Encoded'] is True
+        assert result['headers']['Content-Encoding'] == 'gzip'
+        assert result['headers']['Vary'] == 'Accept, Accept-Encoding'
+        assert result['headers']['ETag'] == 'W/"3-abc"'
+        assert gzip.decompress(base64.b64decode(result['body'])).decode() == response['body']
+        assert len(result['body']) < len(response['body'])
+        assert 'Content-Encoding' not in models.DEFAULT_HEADERS
+
+    @pytest.mark.unit
+    def test_small_body_is_unchanged(self):
+        """閾値未満のボディはそのまま返し、Vary は共通ヘッダーに含まれること"""
+        response = ApiResponse(200, {'message': 'test'}).to_lambda_response()
+
+        assert compress_response(response, 'gzip') is response
+        assert response['headers']['Vary'] == 'Accept, Accept-Encoding'
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('accept_encoding', [None, '', 'identity', 'gzip;q=0', 'deflate'])
+    def test_not_accepted(self, accept_encoding):
+        """圧縮を受け付けない場合は Vary のみ付けて非圧縮で返すこと"""
+        response = ApiResponse(200, self.LARGE_BODY).to_lambda_response()
+
+        result = compress_response(response, accept_encoding)
+
+        assert result['body'] == response['body']
+        assert 'isBase64Encoded' not in result
+        assert result['headers']['Vary'] == 'Accept, Accept-Encoding'
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('accept_encoding, with_brotli, expected', [
+        ('gzip, deflate, br', False, 'gzip'),
+        ('gzip, deflate, br', True, 'br'),
+        ('gzip;q=1.0, br;q=0.5', True, 'gzip'),
+        ('*', True, 'br'),
+        ('*;q=0.2, gzip;q=0', False, None),
+        ('GZIP', False, 'gzip'),
+        ('gzip;q=abc', False, None),
+    ])
+    def test_negotiate_encoding(self, monkeypatch, accept_encoding, with_brotli, expected):
+        """q 値が最大の形式を選び、同じ場合は br を優先すること"""
+        monkeypatch.setattr(models, 'brotli', object() if with_brotli else None)
+
+        assert negotiate_encoding(accept_encoding) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('accept, expected', [
+        ('application/json', True),
+        ('Application/JSON; charset=utf-8', True),
+        ('application/json, text/plain, */*', True),
+        ('*/*', False),
+        ('text/html, application/json', False),
+        (None, False),
+    ])
+    def test_accepts_binary(self, accept, expected):
+        """Accept の先頭のメディアタイプで判定すること"""
+        assert accepts_binary(accept) is expected
+
+
+class TestEncodeJson:
+    """encode_jsonのテスト"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_decimals_become_json_numbers(self, monkeypatch, use_orjson):
+        """Decimalは整数値ならint、それ以外はfloatとして出力されること"""
+        if not use_orjson:
+            monkeypatch.setattr(models, 'orjson', None)
+        body = {
+            'data': [{'RainfallProbability': Decimal('10'), 'average': Decimal('12.5')}],
+            'name': '東京',
+        }
+
+        encoded = encode_json(body)
+
+        decoded = json.loads(encoded)
+        assert decoded == {'data': [{'RainfallProbability': 10, 'average': 12.5}], 'name': '東京'}
+        assert isinstance(decoded['data'][0]['RainfallProbability'], int)
+        assert '東京' in encoded
+
+
 class TestErrorResponse:
     """ErrorResponseモデルのテスト"""
 
@@ -123,3 +272,33 @@ class TestErrorResponse:
         assert result['error']['message'] == 'テストエラー'
         assert result['error']['request_id'] == 'test-123'
         assert 'timestamp' in result['error']
+
+
+class TestPrecompiledResponse:
+    """PrecompiledResponseのテスト"""
+
+    @pytest.mark.unit
+    def test_static_body_is_encoded_once(self):
+        """静的ボディがApiResponseと同じ内容になること"""
+        body = {'success': True, 'data': [{'id': 1, 'name': '晴れ'}]}
+        precompiled = PrecompiledResponse(status_code=200, body=body)
+
+        result = precompiled.to_lambda_response()
+
+        assert result['statusCode'] == 200
+        assert json.loads(result['body']) == body
+        assert result['headers'] == ApiResponse(200, body).to_lambda_response()['headers']
+
+    @pytest.mark.unit
+    def test_error_injects_request_values(self):
+        """エラーレスポンスにrequest_idとtimestampが差し込まれること"""
+        precompiled = PrecompiledResponse.error(404, 'NOT_FOUND', '見つかりません')
+
+        first = json.loads(precompiled.to_error_response('req-1')['body'])
+        second = json.loads(precompiled.to_error_response(None)['body'])
+
+        assert first['error']['code'] == 'NOT_FOUND'
+        assert first['error']['message'] == '見つかりません'
+        assert first['error']['request_id'] == 'req-1'
+        assert second['error']['request_id'] == ''
+        assert 'timestamp' in first['error']
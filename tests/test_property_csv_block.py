@@ -0,0 +1,28 @@
+"""parse_csv_block のプロパティテスト"""
+
+import pytest
+from hypothesis import given, strategies as st
+
+import app as csv_ingest
+
+TIMESTAMP = '2024-01-01T00:00:00'
+TTL = 1704067200
+
+cell = st.one_of(
+    st.integers(min_value=-10, max_value=120).map(str),
+    st.sampled_from(['', ' ', ' 13 ', '東京', '晴れ', 'x', '1.5']),
+    st.text(max_size=3),
+)
+rows = st.lists(st.lists(cell, min_size=0, max_size=6), max_size=30)
+
+
+@pytest.mark.property
+@given(rows)
+def test_block_parse_matches_row_parse(csv_rows):
+    """ブロック解析の結果が行ごとの解析と一致すること"""
+    block = csv_ingest.parse_csv_block(csv_rows, TIMESTAMP, TTL)
+
+    expected = [csv_ingest.parse_csv_row(row, TIMESTAMP, TTL) for row in csv_rows]
+
+    assert block.to_items() == [item for item in expected if item is not None]
+    assert block.invalid_rows == [i for i, item in enumerate(expected) if item is None]
@@ -0,0 +1,72 @@
+"""router のテスト"""
+
+import pytest
+
+from router import Router
+
+
+def _handler(event, context):
+    return 'handler'
+
+
+def _other(event, context):
+    return 'other'
+
+
+class TestRouter:
+    """Routerのテスト"""
+
+    @pytest.mark.unit
+    def test_static_route(self):
+        """静的パスが解決されること"""
+        router = Router()
+        router.add('GET', '/weather', _handler)
+
+        assert router.resolve('GET', '/weather') == (_handler, {})
+        assert router.resolve('POST', '/weather') is None
+
+    @pytest.mark.unit
+    def test_template_route_extracts_parameters(self):
+        """テンプレートからパスパラメータが取り出されること"""
+        router = Router()
+        router.add('GET', '/weather/history/{city_id}', _handler)
+
+        assert router.resolve('GET', '/weather/history/13') == (_handler, {'city_id': '13'})
+        assert router.resolve('GET', '/weather/history/13/extra') is None
+        assert router.resolve('GET', '/weather/history/') is None
+
+    @pytest.mark.unit
+    def test_static_route_takes_precedence(self):
+        """静的パスがテンプレートより優先されること"""
+        router = Router()
+        router.add('GET', '/weather/{city_id}', _handler)
+        router.add('GET', '/weather/types', _other)
+
+        assert router.resolve('GET', '/weather/types') == (_other, {})
+        assert router.resolve('GET', '/weather/13') == (_handler, {'city_id': '13'})
+
+    @pytest.mark.unit
+    def test_int_parameter_matches_digits_only(self):
+        """{name:int} は数字のセグメントのみに一致すること"""
+        router = Router()
+        router.add('GET', '/weather/{city_id:int}', _handler)
+
+        assert router.resolve('GET', '/weather/13') == (_handler, {'city_id': '13'})
+        assert router.resolve('GET', '/weather/generate') is None
+        assert router.resolve('GET', '/weather/-1') is None
+
+    @pytest.mark.unit
+    def test_unknown_parameter_type_is_rejected(self):
+        """未対応の型を指定したテンプレートは登録時にエラーになること"""
+        with pytest.raises(ValueError):
+            Router().add('GET', '/weather/{city_id:uuid}', _handler)
+
+    @pytest.mark.unit
+    def test_auth_routes_are_wrapped(self, unauthenticated_event, lambda_context):
+        """auth=True のルートは認証を要求すること"""
+        router = Router()
+        router.add('GET', '/weather', _handler, auth=True)
+
+        handler, _ = router.resolve('GET', '/weather')
+
+        assert handler(unauthenticated_event, lambda_context)['statusCode'] == 401
@@ -0,0 +1,130 @@
+"""statistics_engine のテスト"""
+
+import statistics
+
+import pytest
+from hypothesis import given, strategies as st
+
+import statistics_engine
+from models import WeatherBatch, WeatherData
+from statistics_engine import WeatherColumns, compute_statistics
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not statistics_engine.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+readings = st.lists(
+    st.tuples(
+        st.sampled_from([1, 13, 23, 27, 40]),
+        st.sampled_from(['晴れ', 'くもり', '雨', '雪']),
+        st.integers(min_value=0, max_value=100),
+    ),
+    max_size=60,
+)
+
+
+def _columns(rows) -> WeatherColumns:
+    batch = WeatherBatch.from_weather_list(
+        WeatherData(
+            city_id=city_id,
+            city_name='',
+            weather_id=0,
+            weather_name=weather_name,
+            rainfall_probability=rainfall,
+            timestamp='2024-01-01T00:00:00',
+        )
+        for city_id, weather_name, rainfall in rows
+    )
+    return WeatherColumns.from_batch(batch)
+
+
+def _legacy_statistics(rows) -> dict:
+    """従来の get_statistics のループによる計算"""
+    weather_distribution = {}
+    total_rainfall = 0
+    for _, weather_name, rainfall in rows:
+        weather_distribution[weather_name] = weather_distribution.get(weather_name, 0) + 1
+        total_rainfall += rainfall
+    avg_rainfall = total_rainfall / len(rows) if rows else 0
+    return {
+        'weather_distribution': weather_distribution,
+        'average_rainfall': round(avg_rainfall, 1),
+    }
+
+
+@pytest.mark.property
+@pytest.mark.parametrize('use_numpy', ENGINES)
+@given(rows=readings)
+def test_matches_legacy_statistics(use_numpy, rows):
+    """分布と平均が従来の計算と順序も含めて一致すること"""
+    result = compute_statistics(_columns(rows), per_city=False, use_numpy=use_numpy)
+    expected = _legacy_statistics(rows)
+
+    assert list(result['weather_distribution'].items()) == list(
+        expected['weather_distribution'].items()
+    )
+    assert result['average_rainfall'] == expected['average_rainfall']
+    assert result['readings'] == len(rows)
+
+
+@pytest.mark.property
+@pytest.mark.skipif(not statistics_engine.HAS_NUMPY, reason='numpy 未インストール')
+@given(rows=readings)
+def test_numpy_and_python_results_are_identical(rows):
+    """NumPy 実装と純Python実装の結果（都市別を含む）が一致すること"""
+    columns = _columns(rows)
+
+    assert compute_statistics(columns, use_numpy=True) == compute_statistics(
+        columns, use_numpy=False
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('use_numpy', ENGINES)
+class TestComputeStatistics:
+    """統計計算のテスト"""
+
+    def test_per_city_statistics(self, use_numpy):
+        """都市別の分布・平均・パーセンタイル・雨の時間数を計算すること"""
+        rows = [
+            (13, '晴れ', 10), (13, '雨', 80), (13, '雨', 60),
+            (27, 'くもり', 30),
+        ]
+
+        result = compute_statistics(_columns(rows), use_numpy=use_numpy)
+
+        tokyo = result['cities'][13]
+        assert tokyo['readings'] == 3
+        assert tokyo['weather_distribution'] == {'晴れ': 1, '雨': 2}
+        assert tokyo['average_rainfall'] == 50.0
+        assert tokyo['rainfall_percentiles']['p50'] == 60.0
+        assert tokyo['rainy_hours'] == 2
+        assert result['cities'][27]['rainy_hours'] == 0
+        assert result['rainy_hours'] == 2
+        assert list(result['cities']) == [13, 27]
+
+    def test_percentiles_use_linear_interpolation(self, use_numpy):
+        """パーセンタイルは線形補間（statistics.quantiles の inclusive と同じ）"""
+        values = [5, 17, 42, 43, 90, 100]
+        rows = [(1, '晴れ', value) for value in values]
+
+        result = compute_statistics(_columns(rows), percentiles=(25, 50, 75), use_numpy=use_numpy)
+
+        expected = statistics.quantiles(values, n=4, method='inclusive')
+        assert list(result['rainfall_percentiles'].values()) == [
+            round(value, 1) for value in expected
+        ]
+
+    def test_empty_columns(self, use_numpy):
+        """データがない場合は0件の統計を返すこと"""
+        result = compute_statistics(WeatherColumns(), use_numpy=use_numpy)
+
+        assert result['readings'] == 0
+        assert result['weather_distribution'] == {}
+        assert result['average_rainfall'] == 0
+        assert result['cities'] == {}
@@ -0,0 +1,64 @@
+"""structured_logging のテスト"""
+
+import json
+import logging
+
+import pytest
+
+import structured_logging
+from weather_handler import lambda_handler
+
+
+class TestLazyFields:
+    """遅延評価のテスト"""
+
+    @pytest.mark.unit
+    def test_fields_not_evaluated_when_level_disabled(self):
+        """ログレベルが無効な場合はフィールドが評価されないこと"""
+        logger = logging.getLogger('test-lazy')
+        logger.setLevel(logging.WARNING)
+        calls = []
+
+        logger.info('%s', structured_logging.LazyJson({'expensive': lambda: calls.append(1)}))
+
+        assert calls == []
+
+    @pytest.mark.unit
+    def test_fields_evaluated_when_logged(self, caplog):
+        """出力される場合は呼び出し可能なフィールドが評価されること"""
+        with caplog.at_level(logging.INFO, logger='test-lazy'):
+            logging.getLogger('test-lazy').info(
+                '%s', structured_logging.LazyJson({'rows': lambda: 3, 'path': '/health'})
+            )
+
+        assert json.loads(caplog.records[-1].getMessage()) == {'rows': 3, 'path': '/health'}
+
+
+class TestRequestSummary:
+    """リクエストサマリーのテスト"""
+
+    @pytest.mark.unit
+    def test_one_summary_line_per_request(self, lambda_context, caplog):
+        """1リクエストにつき1行のサマリーが相関ID付きで出力されること"""
+        with caplog.at_level(logging.INFO):
+            lambda_handler({'httpMethod': 'GET', 'path': '/weather/types'}, lambda_context)
+
+        summaries = [
+            json.loads(record.getMessage())
+            for record in caplog.records
+            if 'request_summary' in record.getMessage()
+        ]
+        assert len(summaries) == 1
+        assert summaries[0]['request_id'] == 'test-request-id'
+        assert summaries[0]['status'] == 200
+        assert summaries[0]['path'] == '/weather/types'
+
+    @pytest.mark.unit
+    def test_event_dump_is_sampled(self, lambda_context, caplog, monkeypatch):
+        """サンプリング率0ではイベント全体が出力されないこと"""
+        monkeypatch.setattr(structured_logging, 'LOG_EVENT_SAMPLE_RATE', 0.0)
+
+        with caplog.at_level(logging.INFO):
+            lambda_handler({'httpMethod': 'GET', 'path': '/weather/types'}, lambda_context)
+
+        assert not any('Received event' in r.getMessage() for r in caplog.records)
@@ -0,0 +1,150 @@
+"""weather_generator のテスト"""
+
+import csv
+from datetime import datetime
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import app as csv_ingest
+import batch_write
+import weather_generator
+from benchmarks import datagen
+from database import WeatherDatabase
+from models import CITIES
+from weather_generator import (
+    RAINFALL_BANDS,
+    WeatherGenerator,
+    write_batches,
+    write_csv_files,
+)
+
+ENGINES = [
+    pytest.param(False, id='python'),
+    pytest.param(
+        True,
+        id='numpy',
+        marks=pytest.mark.skipif(not weather_generator.HAS_NUMPY, reason='numpy 未インストール'),
+    ),
+]
+
+CITY_NAMES = {city_id: f'都市{city_id}' for city_id in range(1, 31)}
+
+
+@pytest.mark.property
+@pytest.mark.parametrize('use_numpy', ENGINES)
+@settings(max_examples=20)
+@given(seed=st.integers(min_value=0, max_value=2**32 - 1))
+def test_rainfall_within_weather_band(use_numpy, seed):
+    """降水確率が天気タイプごとの範囲に収まること"""
+    batch = WeatherGenerator(seed=seed, use_numpy=use_numpy).generate(CITY_NAMES, 't')
+
+    for weather_id, rainfall in zip(batch.weather_ids, batch.rainfall_probabilities):
+        low, high = RAINFALL_BANDS[weather_id]
+        assert low <= rainfall <= high
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('use_numpy', ENGINES)
+class TestWeatherGenerator:
+    """生成器のテスト"""
+
+    def test_same_seed_gives_same_data(self, use_numpy):
+        """同じシードなら同じデータになること"""
+        first = WeatherGenerator(seed=42, use_numpy=use_numpy).generate(CITY_NAMES, 't')
+        second = WeatherGenerator(seed=42, use_numpy=use_numpy).generate(CITY_NAMES, 't')
+
+        assert first.to_dicts() == second.to_dicts()
+
+    def test_batches_cover_cities_by_timestamps(self, use_numpy):
+        """都市×時刻の行を時刻単位で区切ったバッチで返すこと"""
+        generator = WeatherGenerator(seed=1, use_numpy=use_numpy)
+
+        batches = list(
+            generator.iter_batches(CITY_NAMES, datetime(2024, 1, 1), 5, ttl=100, batch_rows=60)
+        )
+
+        assert [len(batch) for batch in batches] == [60, 60, 30]
+        assert batches[0].timestamps[29:31] == ['2024-01-01T00:00:00', '2024-01-01T01:00:00']
+        assert batches[2][0].timestamp == '2024-01-01T04:00:00'
+        assert list(batches[1].city_ids[:30]) == list(CITY_NAMES)
+        assert batches[0][5].city_name == '都市6'
+        assert batches[0][0].ttl == 100
+
+
+@pytest.mark.unit
+def test_csv_files_are_ingestible(tmp_path):
+    """書き出したCSVが csv_ingest でエラーなく解析でき、ファイルが分割されること"""
+    batches = WeatherGenerator(seed=3).iter_batches(CITY_NAMES, datetime(2024, 1, 1), 4)
+
+    paths = write_csv_files(batches, str(tmp_path), rows_per_file=50)
+
+    assert len(paths) == 3
+    rows = []
+    for path in paths:
+        with open(path, encoding='utf-8', newline='') as f:
+            rows.extend(csv.reader(f))
+    block = csv_ingest.parse_csv_block(rows, '2024-01-01T00:00:00', 0)
+    assert len(block) == 120
+    assert block.invalid_rows == []
+
+
+@pytest.mark.integration
+def test_write_batches_to_database(mock_dynamodb):
+    """バッチを保存し、最新スナップショットと集計項目を更新すること"""
+    db = WeatherDatabase()
+    batches = WeatherGenerator(seed=5).iter_batches(
+        CITIES, datetime(2024, 1, 1), 3, ttl=4102444800, batch_rows=len(CITIES)
+    )
+
+    success, errors = write_batches(batches, db)
+
+    assert (success, errors) == (3 * len(CITIES), 0)
+    snapshot = db.get_latest_snapshot()
+    assert {weather.timestamp for weather in snapshot} == {'2024-01-01T02:00:00'}
+    aggregates = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')
+    assert aggregates[0]['Count'] == 3 * len(CITIES)
+
+
+@pytest.mark.integration
+def test_write_batches_skips_unsaved_rows(mock_dynamodb, monkeypatch):
+    """保存できなかった行は集計に加えず、スナップショットは保存できた最新の行にすること"""
+    db = WeatherDatabase()
+    monkeypatch.setattr(batch_write.time, 'sleep', lambda _: None)
+    real_batch_write = db.dynamodb.batch_write_item
+    failing_city = next(iter(CITIES))
+
+    def drop_city_in_last_batch(RequestItems):
+        requests = RequestItems[db.table_name]
+        if requests[0]['PutRequest']['Item']['timestamp'] < '2024-01-01T02':
+            return real_batch_write(RequestItems=RequestItems)
+        failed = [r for r in requests if r['PutRequest']['Item']['CityId'] == failing_city]
+        real_batch_write(RequestItems={db.table_name: [r for r in requests if r not in failed]})
+        return {'UnprocessedItems': {db.table_name: failed}}
+
+    monkeypatch.setattr(db.dynamodb, 'batch_write_item', drop_city_in_last_batch)
+    batches = WeatherGenerator(seed=5).iter_batches(
+        CITIES, datetime(2024, 1, 1), 3, ttl=4102444800, batch_rows=len(CITIES)
+    )
+
+    success, errors = write_batches(batches, db)
+
+    assert (success, errors) == (3 * len(CITIES) - 1, 1)
+    timestamps = {w.city_id: w.timestamp for w in db.get_latest_snapshot()}
+    assert timestamps[failing_city] == '2024-01-01T01:00:00'
+    assert set(timestamps.values()) == {'2024-01-01T01:00:00', '2024-01-01T02:00:00'}
+    aggregates = db.query_aggregates('day', 'ALL', '2024-01-01', '2024-01-01')
+    assert aggregates[0]['Count'] == 3 * len(CITIES) - 1
+
+
+@pytest.mark.unit
+def test_datagen_cli_writes_csv(tmp_path, capsys):
+    """CLIで指定した都市数×時刻数のCSVを書き出すこと"""
+    exit_code = datagen.main(
+        ['--cities', '8', '--hours', '3', '--seed', '1', '--csv', str(tmp_path)]
+    )
+
+    assert exit_code == 0
+    assert '"rows": 24' in capsys.readouterr().out
+    with open(tmp_path / 'weather-00001.csv', encoding='utf-8') as f:
+        assert len(f.readlines()) == 24
@@ -1,9 +1,13 @@
 """weather_handler のテスト"""
 
+import base64
+import gzip
 import json
+import logging
 import pytest
 from moto import mock_aws
 
+import weather_handler
 from weather_handler import lambda_handler, handle_health, handle_get_weather_types
 
 
@@ -94,3 +98,474 @@ class TestOptionsRequest:
         response = lambda_handler(event, lambda_context)
 
         assert response['statusCode'] == 200
+
+
+class TestWeatherByCityEndpoint:
+    """都市別天気エンドポイントのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        weather_handler.weather_service.cache.clear()
+
+    @pytest.mark.integration
+    def test_returns_single_city(self, mock_dynamodb, authenticated_event, lambda_context):
+        """指定した都市のデータのみ返されること"""
+        weather_handler.weather_service.generate_weather_data()
+        event = {**authenticated_event, 'path': '/weather/13'}
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['data']['CityId'] == 13
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('path, status', [
+        ('/weather/abc', 404), ('/weather/generate', 404), ('/weather/999', 404)
+    ])
+    def test_invalid_city(self, authenticated_event, lambda_context, path, status):
+        """数字でないパスは該当なし、未知の都市IDは都市が見つからないエラーになること"""
+        event = {**authenticated_event, 'path': path}
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == status
+
+    @pytest.mark.unit
+    def test_requires_authentication(self, unauthenticated_event, lambda_context):
+        """未認証リクエストは401を返すこと"""
+        event = {**unauthenticated_event, 'path': '/weather/13'}
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 401
+
+    @pytest.mark.integration
+    def test_summary_reports_cache_usage(
+        self, mock_dynamodb, authenticated_event, lambda_context, caplog
+    ):
+        """リクエストサマリーにそのリクエストでのキャッシュのヒット/ミス件数が出力されること"""
+        weather_handler.weather_service.generate_weather_data()
+        event = {**authenticated_event, 'path': '/weather/13'}
+
+        with caplog.at_level(logging.INFO):
+            lambda_handler(event, lambda_context)
+            lambda_handler(event, lambda_context)
+
+        summaries = [
+            json.loads(record.getMessage())
+            for record in caplog.records
+            if 'request_summary' in record.getMessage()
+        ]
+        assert [s['cache_misses'] for s in summaries] == [1, 0]
+        assert [s['cache_hits'] for s in summaries] == [0, 1]
+
+
+class TestWeatherHistoryEndpoint:
+    """観測履歴エンドポイントのテスト"""
+
+    @pytest.mark.integration
+    def test_pages_through_history(self, mock_dynamodb, authenticated_event, lambda_context):
+        """next_token で続きのページを取得できること"""
+        service = weather_handler.weather_service
+        for _ in range(3):
+            service.generate_weather_data()
+        event = {
+            **authenticated_event,
+            'path': '/weather/history',
+            'queryStringParameters': {'city_id': '13', 'limit': '2'},
+        }
+
+        first = json.loads(lambda_handler(event, lambda_context)['body'])
+        event['queryStringParameters']['next_token'] = first['next_token']
+        second = json.loads(lambda_handler(event, lambda_context)['body'])
+
+        assert first['CityId'] == 13
+        assert first['count'] == 2
+        assert first['next_token']
+        assert second['count'] >= 1
+        assert 'CityName' not in first['items'][0]
+
+    @pytest.mark.integration
+    def test_summary_returns_statistics_for_range(
+        self, mock_dynamodb, authenticated_event, lambda_context
+    ):
+        """summary=true の場合は期間全体の統計を返すこと"""
+        for _ in range(3):
+            weather_handler.weather_service.generate_weather_data()
+        event = {
+            **authenticated_event,
+            'path': '/weather/history',
+            'queryStringParameters': {'city_id': '13', 'summary': 'true'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        data = json.loads(response['body'])['data']
+        assert data['CityId'] == 13
+        assert data['readings'] == 3
+        assert sum(data['weather_distribution'].values()) == 3
+        assert set(data['rainfall_percentiles']) == {'p50', 'p90', 'p99'}
+
+    @pytest.mark.integration
+    def test_city_id_in_path(self, mock_dynamodb, authenticated_event, lambda_context):
+        """/weather/history/{city_id} でもクエリパラメータと同じ履歴を返すこと"""
+        weather_handler.weather_service.generate_weather_data()
+        by_query = {
+            **authenticated_event,
+            'path': '/weather/history',
+            'queryStringParameters': {'city_id': '13'},
+        }
+        by_path = {**authenticated_event, 'path': '/weather/history/13'}
+
+        responses = [lambda_handler(event, lambda_context) for event in (by_query, by_path)]
+
+        bodies = [json.loads(response['body']) for response in responses]
+        assert [response['statusCode'] for response in responses] == [200, 200]
+        assert bodies[1]['CityId'] == 13
+        assert bodies[1]['items'] == bodies[0]['items']
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('path, status', [
+        ('/weather/history/999', 404), ('/weather/history/abc', 404)
+    ])
+    def test_invalid_city_in_path(self, authenticated_event, lambda_context, path, status):
+        """パスの都市IDが数字でない・未知の場合は404になること"""
+        event = {**authenticated_event, 'path': path}
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == status
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('params, status', [
+        ({}, 400),
+        ({'city_id': '13', 'limit': 'x'}, 400),
+        ({'city_id': '999'}, 404),
+        ({'city_id': '13', 'from': 'yesterday'}, 400),
+        ({'city_id': '13', 'next_token': '!!!'}, 400),
+    ])
+    def test_invalid_parameters(self, authenticated_event, lambda_context, params, status):
+        """不正なパラメータはエラーになること"""
+        event = {
+            **authenticated_event,
+            'path': '/weather/history',
+            'queryStringParameters': params,
+        }
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == status
+
+    @pytest.mark.unit
+    def test_requires_authentication(self, unauthenticated_event, lambda_context):
+        """未認証リクエストは401を返すこと"""
+        event = {
+            **unauthenticated_event,
+            'path': '/weather/history',
+            'queryStringParameters': {'city_id': '13'},
+        }
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 401
+
+
+class TestWindowStatisticsEndpoint:
+    """期間統計（集計項目）のテスト"""
+
+    @pytest.mark.integration
+    def test_granularity_returns_window_statistics(
+        self, mock_dynamodb, authenticated_event, lambda_context
+    ):
+        """granularity を指定すると集計項目から統計を返すこと"""
+        weather_handler.weather_service.cache.clear()
+        weather_handler.weather_service.generate_weather_data()
+        event = {
+            **authenticated_event,
+            'path': '/weather/statistics',
+            'queryStringParameters': {'granularity': 'day', 'city_id': '13'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        data = json.loads(response['body'])['data']
+        assert data['city_id'] == 13
+        assert data['readings'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('params', [{'granularity': 'week'}, {'city_id': 'abc'}])
+    def test_invalid_parameters(self, authenticated_event, lambda_context, params):
+        """不正なパラメータは400を返すこと"""
+        event = {
+            **authenticated_event,
+            'path': '/weather/statistics',
+            'queryStringParameters': params,
+        }
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 400
+
+
+class TestCityFilters:
+    """地方・都道府県での絞り込みとページングのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        weather_handler.weather_service.cache.clear()
+
+    @pytest.mark.integration
+    def test_weather_filtered_by_region(self, mock_dynamodb, authenticated_event, lambda_context):
+        """region を指定するとその地方の都市のみ返すこと"""
+        event = {**authenticated_event, 'queryStringParameters': {'region': '関東'}}
+
+        response = lambda_handler(event, lambda_context)
+
+        body = json.loads(response['body'])
+        assert response['statusCode'] == 200
+        assert [item['CityId'] for item in body['data']] == [13]
+        assert body['total'] == 1
+        assert body['next_offset'] is None
+
+    @pytest.mark.integration
+    def test_weather_pages_with_offset(self, mock_dynamodb, authenticated_event, lambda_context):
+        """limit と offset で都市をページングできること"""
+        weather_handler.weather_service.generate_weather_data()
+        event = {**authenticated_event, 'queryStringParameters': {'limit': '2'}}
+
+        first = json.loads(lambda_handler(event, lambda_context)['body'])
+        event['queryStringParameters'] = {'limit': '2', 'offset': str(first['next_offset'])}
+        second = json.loads(lambda_handler(event, lambda_context)['body'])
+
+        assert [item['CityId'] for item in first['data']] == [1, 13]
+        assert [item['CityId'] for item in second['data']] == [23, 27]
+        assert second['next_offset'] == 4
+        assert second['total'] == 5
+
+    @pytest.mark.integration
+    def test_offset_past_end_does_not_generate(
+        self, mock_dynamodb, authenticated_event, lambda_context, monkeypatch
+    ):
+        """範囲外の offset では空のページを返し、データを生成しないこと"""
+        service = weather_handler.weather_service
+        service.generate_weather_data()
+        writes = []
+        monkeypatch.setattr(
+            service.database, 'save_weather_batch', lambda *args: writes.append(args)
+        )
+        event = {**authenticated_event, 'queryStringParameters': {'offset': '10', 'limit': '2'}}
+
+        responses = [lambda_handler(event, lambda_context) for _ in range(2)]
+
+        bodies = [json.loads(response['body']) for response in responses]
+        assert [response['statusCode'] for response in responses] == [200, 200]
+        assert bodies[0]['data'] == [] and bodies[0]['total'] == 5
+        assert writes == []
+
+    @pytest.mark.integration
+    def test_statistics_filtered_by_prefecture(
+        self, mock_dynamodb, authenticated_event, lambda_context
+    ):
+        """統計も都道府県で絞り込めること"""
+        weather_handler.weather_service.generate_weather_data()
+        event = {
+            **authenticated_event,
+            'path': '/weather/statistics',
+            'queryStringParameters': {'prefecture': '大阪府'},
+        }
+
+        data = json.loads(lambda_handler(event, lambda_context)['body'])['data']
+
+        assert data['total_cities'] == 1
+        assert data['data_available'] == 1
+
+    @pytest.mark.unit
+    def test_cities_endpoint_without_auth(self, lambda_context):
+        """都市一覧は認証不要で、都道府県・地方を含むこと"""
+        event = {
+            'httpMethod': 'GET',
+            'path': '/cities',
+            'queryStringParameters': {'region': '九州'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+
+        body = json.loads(response['body'])
+        assert response['statusCode'] == 200
+        assert body['data'] == [{'id': 40, 'name': '博多', 'prefecture': '福岡県', 'region': '九州'}]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('params', [{'offset': '-1'}, {'limit': '0'}, {'limit': 'abc'}])
+    def test_invalid_paging(self, mock_dynamodb, authenticated_event, lambda_context, params):
+        """不正な offset / limit は400を返すこと"""
+        event = {**authenticated_event, 'queryStringParameters': params}
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 400
+
+
+class TestForecastEndpoint:
+    """天気予報エンドポイントのテスト"""
+
+    @pytest.mark.integration
+    def test_returns_requested_hours(self, mock_dynamodb, authenticated_event, lambda_context):
+        """hours で指定した時間数の予報を返すこと"""
+        weather_handler.weather_service.cache.clear()
+        weather_handler.weather_service.generate_weather_data()
+        event = {
+            **authenticated_event,
+            'path': '/weather/forecast',
+            'queryStringParameters': {'hours': '6'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+        event['queryStringParameters'] = {'region': '近畿'}
+        regional = json.loads(lambda_handler(event, lambda_context)['body'])
+
+        body = json.loads(response['body'])
+        assert response['statusCode'] == 200
+        assert body['count'] == 5
+        assert all(len(entry['forecast']) == 6 for entry in body['data'])
+        assert [entry['CityId'] for entry in regional['data']] == [27]
+        assert len(regional['data'][0]['forecast']) == 24
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('hours', ['abc', '0', '1000'])
+    def test_invalid_hours(self, mock_dynamodb, authenticated_event, lambda_context, hours):
+        """不正な hours は400を返すこと"""
+        event = {
+            **authenticated_event,
+            'path': '/weather/forecast',
+            'queryStringParameters': {'hours': hours},
+        }
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 400
+
+
+class TestConditionalGet:
+    """ETag と If-None-Match による条件付きGETのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _generate(self, mock_dynamodb):
+        weather_handler.weather_service.cache.clear()
+        weather_handler.weather_service.generate_weather_data()
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('path', ['/weather', '/weather/forecast', '/weather/statistics'])
+    def test_matching_etag_returns_304(self, authenticated_event, lambda_context, path):
+        """前回の ETag を If-None-Match に送ると本文なしの304を返すこと"""
+        event = {**authenticated_event, 'path': path}
+        first = lambda_handler(event, lambda_context)
+        etag = first['headers']['ETag']
+
+        event['headers'] = {'If-None-Match': etag}
+        response = lambda_handler(event, lambda_context)
+
+        assert first['statusCode'] == 200
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['headers']['ETag'] == etag
+        assert response['headers']['Vary'] == 'Accept, Accept-Encoding'
+
+    @pytest.mark.integration
+    def test_new_data_changes_etag(self, authenticated_event, lambda_context):
+        """データの生成後は古い ETag でも200と新しい ETag を返すこと"""
+        etag = lambda_handler(authenticated_event, lambda_context)['headers']['ETag']
+        weather_handler.weather_service.generate_weather_data()
+
+        event = {**authenticated_event, 'headers': {'If-None-Match': etag}}
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        assert response['headers']['ETag'] != etag
+
+    @pytest.mark.integration
+    def test_forecast_refit_changes_etag(self, authenticated_event, lambda_context, monkeypatch):
+        """同じデータでも予報モデルを作り直した後は古い ETag で304を返さないこと"""
+        service = weather_handler.weather_service
+        event = {**authenticated_event, 'path': '/weather/forecast'}
+        etag = lambda_handler(event, lambda_context)['headers']['ETag']
+
+        # 次の期間に進める（データのバージョンは変わらない）
+        period = service.forecast_period()
+        monkeypatch.setattr(service, 'forecast_period', lambda: period + 1)
+        event['headers'] = {'If-None-Match': etag}
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        assert response['headers']['ETag'] != etag
+
+    @pytest.mark.integration
+    def test_etag_depends_on_query(self, authenticated_event, lambda_context):
+        """クエリパラメータが異なれば ETag も異なること"""
+        etag = lambda_handler(authenticated_event, lambda_context)['headers']['ETag']
+        event = {**authenticated_event, 'queryStringParameters': {'region': '関東'}}
+
+        assert lambda_handler(event, lambda_context)['headers']['ETag'] != etag
+
+    @pytest.mark.integration
+    def test_http_api_lowercase_header(self, authenticated_event, lambda_context):
+        """HTTP API の小文字ヘッダー・弱い比較・カンマ区切りでも一致すること"""
+        etag = lambda_handler(authenticated_event, lambda_context)['headers']['ETag']
+        event = {**authenticated_event, 'headers': {'if-none-match': f'"other", W/{etag}'}}
+
+        assert lambda_handler(event, lambda_context)['statusCode'] == 304
+
+    @pytest.mark.integration
+    def test_window_statistics_have_no_etag(self, authenticated_event, lambda_context):
+        """期間指定の統計には ETag を付けないこと"""
+        event = {
+            **authenticated_event,
+            'path': '/weather/statistics',
+            'queryStringParameters': {'granularity': 'day'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+
+        assert response['statusCode'] == 200
+        assert 'ETag' not in response['headers']
+
+
+class TestCompression:
+    """レスポンス圧縮のテスト"""
+
+    @pytest.mark.integration
+    def test_large_response_is_compressed(self, mock_dynamodb, authenticated_event, lambda_context):
+        """Accept-Encoding に gzip を含む場合、大きいレスポンスを gzip で返すこと"""
+        weather_handler.weather_service.cache.clear()
+        weather_handler.weather_service.generate_weather_data()
+        event = {**authenticated_event, 'path': '/weather/forecast'}
+        plain = lambda_handler(event, lambda_context)
+
+        event['headers'] = {'accept': 'application/json', 'accept-encoding': 'gzip, deflate'}
+        response = lambda_handler(event, lambda_context)
+
+        assert response['isBase64Encoded'] is True
+        assert response['headers']['Content-Encoding'] == 'gzip'
+        body = json.loads(gzip.decompress(base64.b64decode(response['body'])))
+        assert body == json.loads(plain['body'])
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('accept', [None, '*/*', 'text/html, application/json'])
+    def test_not_compressed_unless_accept_is_binary_media_type(
+        self, mock_dynamodb, authenticated_event, lambda_context, accept
+    ):
+        """Accept の先頭が BinaryMediaTypes でない場合は圧縮しないこと（API Gateway が復元しないため）"""
+        weather_handler.weather_service.cache.clear()
+        weather_handler.weather_service.generate_weather_data()
+        headers = {'Accept-Encoding': 'gzip'}
+        if accept is not None:
+            headers['Accept'] = accept
+        event = {**authenticated_event, 'path': '/weather/forecast', 'headers': headers}
+
+        response = lambda_handler(event, lambda_context)
+
+        assert 'isBase64Encoded' not in response
+        assert 'Content-Encoding' not in response['headers']
+        assert json.loads(response['body'])['success'] is True
+
+    @pytest.mark.unit
+    def test_small_response_is_not_compressed(self, lambda_context):
+        """小さいレスポンスは圧縮しないこと"""
+        event = {
+            'httpMethod': 'GET',
+            'path': '/weather/types',
+            'headers': {'Accept': 'application/json', 'Accept-Encoding': 'gzip'},
+        }
+
+        response = lambda_handler(event, lambda_context)
+
+        assert 'isBase64Encoded' not in response
+        assert json.loads(response['body'])['success'] is True
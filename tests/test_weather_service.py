@@ -0,0 +1,238 @@
+"""weather_service のテスト"""
+
+import pytest
+
+import batch_write
+from database import WeatherDatabase
+from exceptions import ValidationError
+import weather_service
+from models import CITIES
+from weather_service import WeatherService
+
+
+@pytest.fixture
+def service(mock_dynamodb):
+    """moto上のテーブルを使うサービス"""
+    return WeatherService(database=WeatherDatabase())
+
+
+class TestLatestSnapshotReads:
+    """スナップショット経由の読み取りのテスト"""
+
+    @pytest.mark.integration
+    def test_generate_then_read_uses_snapshot(self, service, monkeypatch):
+        """生成後の読み取りが都市ごとのクエリを使わないこと"""
+        generated = service.generate_weather_data()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('per-city query should not be used')
+
+        monkeypatch.setattr(service.database, 'get_all_cities_latest_weather', fail)
+
+        current = service.get_current_weather()
+        statistics = service.get_statistics()
+
+        assert current == [w.to_dict() for w in generated]
+        assert statistics['data_available'] == len(CITIES)
+
+    @pytest.mark.integration
+    def test_falls_back_without_snapshot(self, service):
+        """スナップショットがない場合は都市ごとに取得すること"""
+        generated = service.generate_weather_data()
+        service.database.table.delete_item(Key={'CityId': 0, 'timestamp': 'LATEST'})
+
+        assert service.get_current_weather() == [w.to_dict() for w in generated]
+
+    @pytest.mark.integration
+    def test_small_page_reads_cities_without_snapshot(self, service, monkeypatch):
+        """少数の都市のページはスナップショット全体を読まず都市ごとに取得すること"""
+        generated = service.generate_weather_data()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('snapshot should not be read')
+
+        monkeypatch.setattr(service.database, 'get_latest_snapshot', fail)
+
+        page = service.get_current_weather_page(limit=2)
+
+        assert page['data'] == [w.to_dict() for w in generated][:2]
+
+
+class TestPartialWrites:
+    """一部の行が保存できなかった場合のテスト"""
+
+    @pytest.mark.integration
+    def test_unsaved_rows_are_not_reflected(self, service, monkeypatch):
+        """保存できなかった都市はスナップショット・集計・戻り値に含めないこと"""
+        monkeypatch.setattr(batch_write.time, 'sleep', lambda _: None)
+        real_batch_write = service.database.dynamodb.batch_write_item
+        table_name = service.database.table_name
+
+        def drop_first(RequestItems):
+            requests = RequestItems[table_name]
+            real_batch_write(RequestItems={table_name: requests[1:]})
+            return {'UnprocessedItems': {table_name: requests[:1]}}
+
+        monkeypatch.setattr(service.database.dynamodb, 'batch_write_item', drop_first)
+        first_city = next(iter(CITIES))
+
+        generated = service.generate_weather_data()
+
+        bucket = generated.timestamps[0][:10]
+        day = service.database.query_aggregates('day', 'ALL', bucket, bucket)
+        assert first_city not in generated.city_ids
+        assert len(generated) == len(CITIES) - 1
+        assert first_city not in [w['CityId'] for w in service.get_current_weather()]
+        assert day[0]['Count'] == len(CITIES) - 1
+
+
+class TestReadCache:
+    """読み取りキャッシュのテスト"""
+
+    @pytest.mark.integration
+    def test_repeated_reads_are_served_from_cache(self, service, monkeypatch):
+        """2回目以降の読み取りがDBを使わないこと"""
+        service.generate_weather_data()
+        first = service.get_current_weather()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('database should not be used')
+
+        monkeypatch.setattr(service.database, 'get_latest_snapshot', fail)
+
+        assert service.get_current_weather() == first
+        assert service.cache_stats()['hits'] == 1
+
+    @pytest.mark.integration
+    def test_generate_invalidates_cache(self, service):
+        """生成時にキャッシュが破棄されること"""
+        service.generate_weather_data()
+        service.get_statistics()
+
+        generated = service.generate_weather_data()
+
+        assert service.get_current_weather() == [w.to_dict() for w in generated]
+
+    @pytest.mark.integration
+    def test_data_version_change_invalidates_cache(self, service):
+        """他のコンテナ等の書き込みでバージョンが変わるとキャッシュが破棄されること"""
+        service.generate_weather_data()
+        version = service.data_version()
+        service.get_current_weather()
+
+        other = WeatherService(database=WeatherDatabase())
+        generated = other.generate_weather_data()
+
+        assert service.data_version() == version + 1
+        assert service.get_current_weather() == [w.to_dict() for w in generated]
+        assert service.cache_stats()['hits'] == 0
+
+
+class TestWindowStatistics:
+    """集計項目を使う期間統計のテスト"""
+
+    @pytest.mark.integration
+    def test_generate_updates_hourly_and_daily_statistics(self, service):
+        """生成したデータが時間・日単位の統計に反映されること"""
+        service.generate_weather_data()
+        service.generate_weather_data()
+
+        hourly = service.get_window_statistics('hour')
+        daily_city = service.get_window_statistics('day', city_id=13)
+
+        assert hourly['city_id'] is None
+        assert daily_city['city_id'] == 13
+        assert hourly['readings'] == 2 * len(CITIES)
+        assert sum(hourly['weather_distribution'].values()) == 2 * len(CITIES)
+        assert 0 <= hourly['min_rainfall'] <= hourly['max_rainfall'] <= 100
+        assert daily_city['readings'] == 2
+        assert len(daily_city['buckets']) == 1
+
+    @pytest.mark.integration
+    def test_does_not_read_observations(self, service, monkeypatch):
+        """観測データのクエリやスナップショットを使わないこと"""
+        service.generate_weather_data()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('observations should not be read')
+
+        monkeypatch.setattr(service.database, 'get_latest_snapshot', fail)
+        monkeypatch.setattr(service.database, 'query_history_page', fail)
+
+        assert service.get_window_statistics('hour')['readings'] == len(CITIES)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('kwargs', [
+        {'granularity': 'week'},
+        {'city_id': 999},
+        {'start': '2024-01-02T00:00:00', 'end': '2024-01-01T00:00:00'},
+    ])
+    def test_rejects_invalid_parameters(self, kwargs):
+        """不正な粒度・都市・期間はValidationErrorになること"""
+        with pytest.raises(ValidationError):
+            WeatherService(database=WeatherDatabase()).get_window_statistics(**kwargs)
+
+
+class TestForecast:
+    """天気予報のテスト"""
+
+    @pytest.mark.integration
+    def test_forecast_for_all_cities(self, service):
+        """全都市の最新値に指定時間数の予報が付くこと"""
+        generated = service.generate_weather_data()
+
+        forecast = service.get_forecast(hours=3)
+
+        assert [entry['CityId'] for entry in forecast] == list(CITIES)
+        first = forecast[0]
+        assert first['timestamp'] == generated[0].timestamp
+        assert len(first['forecast']) == 3
+        assert sum(first['forecast'][0]['probabilities'].values()) == pytest.approx(1, abs=0.01)
+        assert 0 <= first['forecast'][2]['RainfallProbability'] <= 100
+
+    @pytest.mark.integration
+    def test_new_readings_update_model_incrementally(self, service, monkeypatch):
+        """履歴からの作り直しは1回で、その後の観測は最新値から加算されること"""
+        service.generate_weather_data()
+        service.get_forecast(hours=1)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('history should not be refitted')
+
+        monkeypatch.setattr(service.database, 'iter_city_histories', fail)
+        latest = service.generate_weather_data()
+        service.get_forecast(hours=1)
+
+        assert service._forecast_engine.last_observation(13)[0] == latest[1].timestamp
+
+    @pytest.mark.unit
+    def test_model_version_is_shared_across_containers_without_refit(self, monkeypatch):
+        """モデルのバージョンは期間のみで決まり、モデルを作らずに求まること"""
+        monkeypatch.setenv('FORECAST_REFIT_SECONDS', '3600')
+        monkeypatch.setattr(weather_service.time, 'time', lambda: 7200.5)
+        first = WeatherService(database=object())
+        second = WeatherService(database=object())
+
+        assert first.forecast_model_version() == second.forecast_model_version() == '2'
+        assert first._forecast_engine is None
+
+    @pytest.mark.integration
+    def test_new_period_refits_model(self, service, monkeypatch):
+        """期間が変わると履歴から作り直し、前の期間の予報をキャッシュから返さないこと"""
+        service.generate_weather_data()
+        before = service.get_forecast(hours=1)
+        engine = service._forecast_engine
+        period = service.forecast_period()
+        monkeypatch.setattr(service, 'forecast_period', lambda: period + 1)
+
+        after = service.get_forecast(hours=1)
+
+        assert service._forecast_engine is not engine
+        assert after is not before
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('hours', [0, 1000])
+    def test_rejects_invalid_hours(self, hours):
+        """予報の時間数が範囲外の場合は ValidationError"""
+        with pytest.raises(ValidationError):
+            WeatherService(database=object()).get_forecast(hours=hours)